@@ -1,9 +1,24 @@
 import streamlit as st
 import os
-import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime, time as clock, timedelta
 import tempfile
 import base64
+import time
+
+import numpy as np
+
+from modules.database import DatabaseError, UserDatabase
+from modules.recommender import CODE_BADGES, SemesterPlanner, StudyRecommender, effective_progress, subject_columns
+from modules.spaced_repetition import DEFAULT_GRADE, GRADES as REVIEW_GRADES
+from modules.timeslots import export_ics, parse_ics, schedule_plan
+from utils.helpers import (
+    calculate_days_until,
+    format_date_readable,
+    format_duration,
+    get_difficulty_badge,
+    get_subject_color,
+    save_stream_by_hash,
+)
 
 # Custom CSS for beautiful styling
 def load_css():
@@ -130,142 +145,162 @@ def load_css():
     </style>
     """
 
-# Simple implementations that work without external modules
-class UserDatabase:
-    def __init__(self, db_path="data/study_planner.db"):
-        self.db_path = db_path
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.create_tables()
-    
-    def create_tables(self):
-        self.conn.execute('''
-            CREATE TABLE IF NOT EXISTS subjects (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT,
-                exam_date DATE,
-                difficulty TEXT,
-                color TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        self.conn.commit()
-    
-    def add_subject(self, name, exam_date, difficulty, color):
-        try:
-            self.conn.execute(
-                "INSERT INTO subjects (name, exam_date, difficulty, color) VALUES (?, ?, ?, ?)",
-                (name, exam_date, difficulty, color)
-            )
-            self.conn.commit()
-            return True
-        except:
-            return False
-    
-    def delete_subject(self, subject_name):
-        try:
-            self.conn.execute("DELETE FROM subjects WHERE name = ?", (subject_name,))
-            self.conn.commit()
-            return True
-        except:
-            return False
+# How often the document list polls the jobs table while uploads are processing
+PROGRESS_REFRESH_SECONDS = 1.5
+UPLOAD_DIR = "data/uploaded_docs"
+# Items per page in the subject, progress and document lists
+PAGE_SIZE = 20
 
-class RAGPipeline:
-    def __init__(self):
-        self.vector_store = None
-    
-    def process_document(self, file_path, subject):
-        return True
-    
-    def explain_topic(self, topic):
-        explanations = {
-            "machine learning": "Machine Learning is a subset of artificial intelligence that enables computers to learn and make decisions from data without being explicitly programmed. It's like teaching computers to recognize patterns and make predictions.",
-            "neural networks": "Neural Networks are computing systems inspired by the human brain. They consist of interconnected nodes (neurons) that process information and learn to perform tasks by analyzing examples.",
-            "database systems": "Database Systems are organized collections of data that allow efficient storage, retrieval, and manipulation of information. They use structured query language (SQL) for operations.",
-            "linear algebra": "Linear Algebra is the branch of mathematics concerning linear equations, linear functions, and their representations through matrices and vector spaces.",
-            "calculus": "Calculus is the mathematical study of continuous change, dealing with derivatives (rates of change) and integrals (accumulation of quantities)."
-        }
-        return explanations.get(topic.lower(), f"This is a comprehensive explanation for '{topic}'. In a full implementation, AI would analyze your study materials to provide personalized insights and examples.")
-
-class StudyRecommender:
-    def __init__(self, database):
-        self.db = database
-    
-    def generate_daily_plan(self):
-        return [
-            {
-                "subject": "Machine Learning",
-                "topic": "Neural Networks",
-                "duration": 90,
-                "priority": 0.8,
-                "reason": "High priority for upcoming exam"
-            },
-            {
-                "subject": "Database Systems",
-                "topic": "SQL Optimization", 
-                "duration": 60,
-                "priority": 0.6,
-                "reason": "Important for practical applications"
-            }
-        ]
+DEFAULT_PREFERENCES = {
+    'daily_goal': 4,
+    'preferred_times': ['Morning', 'Evening'],
+    'break_frequency': '45 min',
+    'intensity': 'Moderate'
+}
+
+# Created once per server process and shared by every browser session
+@st.cache_resource
+def get_database():
+    return UserDatabase()
+
+# Document parsing, the vector store and the LLM client are imported on first
+# use, so pages that don't need them (the Dashboard) start without them
+@st.cache_resource
+def get_rag_pipeline():
+    from modules.rag_pipeline import RAGPipeline
+    return RAGPipeline()
+
+@st.cache_resource
+def get_recommender():
+    return StudyRecommender(get_database())
+
+@st.cache_resource
+def get_ingestion_service():
+    from modules.ingestion import IngestionService
+    service = IngestionService(get_database(), get_rag_pipeline())
+    # Pick up uploads that were still queued or processing when the server stopped
+    service.resume()
+    return service
 
 # Helper functions
 def init_session_state():
+    # Sessions only hold references to the shared resources; user_data is their own
+    # The RAG pipeline and ingestion service are fetched with their getters where needed
     if 'db' not in st.session_state:
-        st.session_state.db = UserDatabase()
-    if 'rag' not in st.session_state:
-        st.session_state.rag = RAGPipeline()
+        st.session_state.db = get_database()
+        if st.session_state.db.load_unfinished_jobs():
+            # Uploads interrupted by a restart continue without waiting for a visit to Study Materials
+            get_ingestion_service()
     if 'recommender' not in st.session_state:
-        st.session_state.recommender = StudyRecommender(st.session_state.db)
+        st.session_state.recommender = get_recommender()
+    if 'user' not in st.session_state:
+        # Until someone signs in, the session uses the local account
+        st.session_state.user = st.session_state.db.get_user(st.session_state.db.local_user_id)
     if 'user_data' not in st.session_state:
-        st.session_state.user_data = {
-            'subjects': [],
-            'uploaded_docs': [],
-            'today_plan': [],
-            'study_preferences': {
-                'daily_goal': 4,
-                'preferred_times': ['Morning', 'Evening'],
-                'break_frequency': '45 min',
-                'intensity': 'Moderate'
-            }
-        }
+        st.session_state.user_data = load_user_data(st.session_state.db, current_user_id())
+        user_data_changed()
 
-def format_duration(minutes):
-    if minutes < 60:
-        return f"{minutes} min"
-    else:
-        hours = minutes // 60
-        mins = minutes % 60
-        return f"{hours}h {mins}m"
+def current_user_id():
+    return st.session_state.user['id']
 
-def calculate_days_until(target_date):
-    if isinstance(target_date, str):
-        try:
-            target_date = datetime.strptime(target_date, '%Y-%m-%d').date()
-        except:
-            return 999
-    today = datetime.now().date()
-    return (target_date - today).days
+def user_data_changed():
+    # Call after every change to user_data; it invalidates the memoized views
+    st.session_state.data_version = st.session_state.get('data_version', 0) + 1
+
+def memoized_view(name, build):
+    # Reruns reuse build()'s result until user_data changes (or the day does, for day counts)
+    key = (st.session_state.get('data_version', 0), datetime.now().date())
+    views = st.session_state.setdefault('views', {})
+    cached = views.get(name)
+    if cached is None or cached[0] != key:
+        cached = views[name] = (key, build())
+    return cached[1]
+
+def reload_documents():
+    st.session_state.user_data['uploaded_docs'] = st.session_state.db.load_documents(current_user_id())
+    user_data_changed()
+
+def reload_subjects():
+    st.session_state.user_data['subjects'] = st.session_state.db.load_subjects(current_user_id())
+    user_data_changed()
+
+def find_subject(name):
+    for subject in st.session_state.user_data['subjects']:
+        if subject['name'] == name:
+            return subject
+    return None
 
-def format_date_readable(date_str):
+def write_saved(future):
+    # Queued writes are applied by the database's writer thread; show the error here if one was rejected
     try:
-        date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-        return date_obj.strftime("%B %d, %Y")
-    except:
-        return date_str
-
-def get_subject_color(subject_name):
-    colors = ['#667eea', '#764ba2', '#f093fb', '#f5576c', '#4facfe', '#00f2fe']
-    return colors[hash(subject_name) % len(colors)]
-
-def get_difficulty_badge(difficulty):
-    difficulty = difficulty.lower()
-    if difficulty in ['easy', 'beginner']:
-        return "🟢 Easy"
-    elif difficulty in ['medium', 'intermediate']:
-        return "🟡 Medium" 
+        future.result()
+    except DatabaseError as e:
+        st.error(f"❌ {e}")
+        return False
+    return True
+
+def reset_page(list_key):
+    st.session_state.pop(f"{list_key}_page", None)
+
+def paginate(list_key, total, page_size=PAGE_SIZE):
+    # Lists only render one page per rerun; returns (limit, offset) of that page for the query
+    pages = max(1, -(-total // page_size))
+    page_key = f"{list_key}_page"
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    page = st.session_state.get(page_key, 1)
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=page_key)
+    offset = (page - 1) * page_size
+    if total:
+        st.caption(f"Showing {offset + 1}-{min(offset + page_size, total)} of {total}")
+    return page_size, offset
+
+def switch_user(user):
+    # Drop everything that belonged to the previous account
+    for key in ('user_data', 'current_topic', 'current_explanation', 'active_session'):
+        st.session_state.pop(key, None)
+    st.session_state.user = user
+
+def load_user_data(db, user_id):
+    # Everything the UI keeps in session state is read back from the database
+    preferences = dict(DEFAULT_PREFERENCES)
+    preferences.update(db.load_preferences(user_id))
+    user_data = {
+        'subjects': db.load_subjects(user_id),
+        'uploaded_docs': db.load_documents(user_id),
+        'today_plan': [],
+        'semester_plan': None,
+        'study_preferences': preferences
+    }
+    today = datetime.now().date()
+    saved = db.load_latest_plan(user_id, 'semester')
+    if saved is not None:
+        _, _, settings = saved
+        subjects = [s for s in user_data['subjects'] if s['name'] in settings['subjects']]
+        planner = SemesterPlanner(settings['daily_minutes'], settings['intensity']).build(subjects)
+        user_data['semester_plan'] = planner
+        user_data['today_plan'] = planner.plan_for(today)
     else:
-        return "🔴 Hard"
+        saved = db.load_plan(user_id, today, 'daily')
+        if saved is not None:
+            user_data['today_plan'] = saved[0]
+    return user_data
+
+def save_plans():
+    user_data = st.session_state.user_data
+    db = st.session_state.db
+    user_id = current_user_id()
+    planner = user_data.get('semester_plan')
+    db.delete_plans(user_id, 'semester')
+    if planner is not None:
+        db.save_plan(user_id, planner.start, 'semester', planner.summary(), settings={
+            'daily_minutes': planner.daily_minutes,
+            'intensity': planner.intensity,
+            'subjects': list(planner.subjects)
+        })
+    db.save_plan(user_id, datetime.now().date(), 'daily', user_data['today_plan'])
+    user_data_changed()
 
 def display_metric_card(title, value, subtitle, metric_class):
     st.markdown(f"""
@@ -276,22 +311,99 @@ def display_metric_card(title, value, subtitle, metric_class):
     </div>
     """, unsafe_allow_html=True)
 
-def display_study_task(task, task_num):
+def study_task_html(task, task_num):
     priority_class = "card-high" if task['priority'] > 0.7 else "card-medium" if task['priority'] > 0.4 else "card-low"
     
-    st.markdown(f"""
+    return f"""
     <div class="study-card {priority_class}">
         <div style="display: flex; justify-content: space-between; align-items: start;">
             <div style="flex: 1;">
                 <h4 style="margin:0; color: #495057;">{task_num}. {task['subject']} - {task['topic']}</h4>
                 <p style="margin:0.5rem 0; color: #6c757d; font-size: 0.9rem;">
-                    ⏰ {format_duration(task['duration'])} • 🎯 Priority: {task['priority']:.1f}
+                    ⏰ {format_duration(task['duration'])} • 🎯 Priority: {task['priority']:.1f}{f" • ☕ {task['break_after']} min break" if task.get('break_after') else ""}
                 </p>
                 <p style="margin:0; color: #868e96; font-size: 0.8rem;">{task.get('reason', '')}</p>
             </div>
         </div>
     </div>
-    """, unsafe_allow_html=True)
+    """
+
+def refresh_today_plan():
+    # With a semester plan, today's tasks are that plan's entry for today
+    user_data = st.session_state.user_data
+    planner = user_data.get('semester_plan')
+    if planner is None:
+        return
+    today = datetime.now().date()
+    if planner.start != today:
+        # Only the subjects the plan was made for, as when it is loaded
+        subjects = [s for s in user_data['subjects'] if s['name'] in planner.subjects]
+        planner = SemesterPlanner(planner.daily_minutes, planner.intensity).build(subjects)
+        user_data['semester_plan'] = planner
+    user_data['today_plan'] = planner.plan_for(today)
+    save_plans()
+
+def log_study_event(subject_name, topic, kind, minutes=0):
+    if not write_saved(st.session_state.db.log_event(current_user_id(), subject_name, topic, kind, minutes)):
+        return
+    subject = find_subject(subject_name)
+    if subject is not None and kind != 'start':
+        # Same totals the rollups now hold, without reloading the subjects
+        subject['minutes_studied'] = subject.get('minutes_studied', 0) + minutes
+        subject['sessions'] = subject.get('sessions', 0) + 1
+        subject['last_studied'] = str(datetime.now().date())
+        user_data_changed()
+
+def end_study_session():
+    # Returns the subject, topic and length in minutes of the running session
+    active = st.session_state.pop('active_session')
+    return active['subject'], active['topic'], max(1, round((time.time() - active['started']) / 60))
+
+def stop_study_session():
+    subject_name, topic, minutes = end_study_session()
+    log_study_event(subject_name, topic, 'stop', minutes)
+    return minutes
+
+def start_study_session(task):
+    if 'active_session' in st.session_state:
+        stop_study_session()
+    log_study_event(task['subject'], task['topic'], 'start')
+    st.session_state.active_session = {'subject': task['subject'], 'topic': task['topic'], 'started': time.time()}
+
+def mark_topic_complete(subject_name, topic, minutes=0):
+    if not write_saved(st.session_state.db.set_topic_completed(current_user_id(), subject_name, topic)):
+        return
+    for subject in st.session_state.user_data['subjects']:
+        if subject['name'] == subject_name:
+            completed = subject.setdefault('completed_topics', [])
+            if topic not in completed:
+                completed.append(topic)
+    log_study_event(subject_name, topic, 'complete', minutes)
+    planner = st.session_state.user_data.get('semester_plan')
+    if planner is not None:
+        planner.complete_topic(subject_name, topic)
+        refresh_today_plan()
+    else:
+        st.session_state.user_data['today_plan'] = [
+            t for t in st.session_state.user_data['today_plan']
+            if (t['subject'], t['topic']) != (subject_name, topic)
+        ]
+        save_plans()
+
+def render_stream(tokens, refresh_seconds=0.05):
+    # Show text as it arrives, redrawing at most every refresh_seconds
+    placeholder = st.empty()
+    placeholder.markdown("🔍 *Researching...*")
+    text = ""
+    last_draw = 0.0
+    for token in tokens:
+        text += token
+        now = time.monotonic()
+        if now - last_draw >= refresh_seconds:
+            placeholder.markdown(text + "▌")
+            last_draw = now
+    placeholder.markdown(text)
+    return text
 
 def main():
     st.set_page_config(
@@ -322,6 +434,8 @@ def main():
             ["🏠 Dashboard", "📅 Study Planner", "📚 Study Materials", "❓ Study Assistant", "⚙️ Settings"],
             label_visibility="collapsed"
         )
+        
+        st.caption(f"👤 {st.session_state.user.get('display_name') or st.session_state.user['username']}")
     
     # Display selected page
     if page == "🏠 Dashboard":
@@ -335,27 +449,82 @@ def main():
     elif page == "⚙️ Settings":
         settings_page()
 
+def complete_review(subject_name, topic, quality, minutes=0):
+    # Reschedules the topic and returns its next due date
+    due = st.session_state.db.record_review(current_user_id(), subject_name, topic, quality)
+    log_study_event(subject_name, topic, 'review', minutes)
+    user_data = st.session_state.user_data
+    user_data['today_plan'] = [
+        t for t in user_data['today_plan']
+        if not (t.get('review') and (t['subject'], t['topic']) == (subject_name, topic))
+    ]
+    save_plans()
+    return due
+
+def build_dashboard_view():
+    user_data = st.session_state.user_data
+    subjects = user_data['subjects']
+    columns = subject_columns(subjects)
+    days_until = columns['days']
+    upcoming = np.flatnonzero(days_until <= 30)
+    upcoming = upcoming[np.argsort(days_until[upcoming], kind='stable')]
+    return {
+        'subjects': len(subjects),
+        'upcoming_count': len(upcoming),
+        # One markdown element for the whole list instead of one per exam
+        'upcoming': "\n\n".join(
+            f"**{subjects[i]['name']}** - {days_until[i]} days {CODE_BADGES[columns['difficulty'][i]]}"
+            for i in upcoming.tolist()
+        ),
+        'study_time': format_duration(sum(t.get('duration', 0) for t in user_data['today_plan'])),
+        'documents': len(user_data['uploaded_docs']),
+    }
+
+def build_schedule():
+    # Today's tasks (and, with a semester plan, every later day's) in clock time around the busy calendar
+    user_data = st.session_state.user_data
+    today = datetime.now().date()
+    days = [(today, user_data['today_plan'])]
+    planner = user_data.get('semester_plan')
+    if planner is not None:
+        for offset in range(planner.days):
+            day = planner.start + timedelta(days=offset)
+            if day > today:
+                days.append((day, planner.plan_for(day)))
+    busy = st.session_state.db.load_busy_blocks(
+        current_user_id(), datetime.combine(today, clock()), datetime.combine(days[-1][0] + timedelta(days=2), clock())
+    )
+    entries, unscheduled = schedule_plan(days, user_data['study_preferences'], busy)
+    return {
+        'today': [e for e in entries if e['start'].date() == today],
+        'entries': len(entries),
+        'days': len({e['start'].date() for e in entries}),
+        'unscheduled': unscheduled,
+        'ics': export_ics(entries) if entries else None,
+    }
+
+def build_task_cards():
+    return [study_task_html(task, i) for i, task in enumerate(st.session_state.user_data['today_plan'], 1)]
+
 def dashboard_page():
     st.markdown("## 📊 Study Dashboard")
     
+    view = memoized_view('dashboard', build_dashboard_view)
+    
     # Quick stats in beautiful cards
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        subjects_count = len(st.session_state.user_data['subjects'])
-        display_metric_card("SUBJECTS", subjects_count, "Total enrolled", "metric-1")
+        display_metric_card("SUBJECTS", view['subjects'], "Total enrolled", "metric-1")
     
     with col2:
-        upcoming = sum(1 for s in st.session_state.user_data['subjects'] if calculate_days_until(s.get('exam_date', '')) <= 30)
-        display_metric_card("UPCOMING EXAMS", upcoming, "Next 30 days", "metric-2")
+        display_metric_card("UPCOMING EXAMS", view['upcoming_count'], "Next 30 days", "metric-2")
     
     with col3:
-        total_time = sum(t.get('duration', 0) for t in st.session_state.user_data['today_plan'])
-        display_metric_card("TODAY'S STUDY", format_duration(total_time), "Planned time", "metric-3")
+        display_metric_card("TODAY'S STUDY", view['study_time'], "Planned time", "metric-3")
     
     with col4:
-        docs_count = len(st.session_state.user_data['uploaded_docs'])
-        display_metric_card("DOCUMENTS", docs_count, "Uploaded files", "metric-4")
+        display_metric_card("DOCUMENTS", view['documents'], "Uploaded files", "metric-4")
     
     st.markdown("---")
     
@@ -368,8 +537,16 @@ def dashboard_page():
         action_col1, action_col2 = st.columns(2)
         with action_col1:
             if st.button("🔄 Generate Plan", use_container_width=True, type="primary"):
-                plan = st.session_state.recommender.generate_daily_plan()
+                preferences = st.session_state.user_data['study_preferences']
+                plan = st.session_state.recommender.generate_daily_plan(
+                    st.session_state.user_data['subjects'],
+                    available_hours=preferences['daily_goal'],
+                    intensity=preferences['intensity'],
+                    user_id=current_user_id()
+                )
+                st.session_state.user_data['semester_plan'] = None
                 st.session_state.user_data['today_plan'] = plan
+                save_plans()
                 st.success("✨ Study plan generated successfully!")
                 
         with action_col2:
@@ -381,37 +558,60 @@ def dashboard_page():
     
     with col2:
         st.markdown("### 📅 Upcoming Exams")
-        upcoming = []
-        for subject in st.session_state.user_data['subjects']:
-            days = calculate_days_until(subject.get('exam_date', ''))
-            if days <= 30:
-                upcoming.append((subject['name'], days, subject.get('difficulty', 'Medium')))
-        
-        if upcoming:
-            for name, days, difficulty in sorted(upcoming, key=lambda x: x[1]):
-                badge = get_difficulty_badge(difficulty)
-                st.write(f"**{name}** - {days} days {badge}")
+        
+        if view['upcoming']:
+            st.markdown(view['upcoming'])
         else:
             st.info("🎉 No upcoming exams in the next 30 days!")
     
     # Today's study plan
     st.markdown("### 📖 Today's Study Plan")
+    active = st.session_state.get('active_session')
+    if active is not None:
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.info(f"⏱️ Studying **{active['topic']}** ({active['subject']}) since "
+                    f"{datetime.fromtimestamp(active['started']).strftime('%H:%M')}")
+        with col2:
+            if st.button("⏹️ Stop", key="stop_session", use_container_width=True):
+                st.success(f"Logged {format_duration(stop_study_session())} of study")
+                active = None
     if st.session_state.user_data['today_plan']:
-        for i, task in enumerate(st.session_state.user_data['today_plan'], 1):
-            display_study_task(task, i)
+        # Looked up here, not with the stats above: the buttons above may just have changed the plan
+        task_cards = memoized_view('task_cards', build_task_cards)
+        for i, (task, card) in enumerate(zip(st.session_state.user_data['today_plan'], task_cards), 1):
+            st.markdown(card, unsafe_allow_html=True)
             
             # Action buttons for each task
             col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+            if task.get('review'):
+                with col1:
+                    grade = st.select_slider(
+                        "How well did you recall it?", options=list(REVIEW_GRADES), value=DEFAULT_GRADE,
+                        key=f"recall_{i}", label_visibility="collapsed"
+                    )
             with col2:
                 if st.button("📝 Study", key=f"study_{i}", use_container_width=True):
-                    st.info(f"Starting study session: {task['topic']}")
+                    start_study_session(task)
+                    st.rerun()
             with col3:
                 if st.button("❓ Explain", key=f"explain_{i}", use_container_width=True):
                     st.session_state.current_topic = task['topic']
-                    st.session_state.current_explanation = st.session_state.rag.explain_topic(task['topic'])
+                    st.session_state.current_explanation = get_rag_pipeline().explain_topic(
+                        task['topic'], subject=task['subject'], user_id=current_user_id()
+                    )
             with col4:
                 if st.button("✅ Complete", key=f"complete_{i}", use_container_width=True):
-                    st.success(f"Great job completing: {task['topic']}!")
+                    # A running session on this task counts its real length, otherwise the planned one
+                    minutes = task.get('duration', 0)
+                    if active is not None and (active['subject'], active['topic']) == (task['subject'], task['topic']):
+                        minutes = end_study_session()[2]
+                    if task.get('review'):
+                        due = complete_review(task['subject'], task['topic'], REVIEW_GRADES[grade], minutes)
+                        st.success(f"Reviewed {task['topic']} - next review {format_date_readable(str(due))}")
+                    else:
+                        mark_topic_complete(task['subject'], task['topic'], minutes)
+                        st.success(f"Great job completing: {task['topic']}!")
             st.markdown("---")
     else:
         st.info("🌟 No study plan generated yet. Click 'Generate Plan' to get started!")
@@ -448,29 +648,102 @@ def study_planner_page():
                     help="Light: More breaks | Moderate: Balanced | Intensive: Focused deep work"
                 )
                 
-                include_review = st.checkbox("🔄 Include review sessions", value=True)
+                include_review = st.checkbox(
+                    "🔄 Include review sessions", value=True,
+                    help=f"{st.session_state.db.count_due_reviews(current_user_id())} completed topics are due for review"
+                )
                 include_breaks = st.checkbox("☕ Include break times", value=True)
+                plan_horizon = st.radio(
+                    "📆 Plan for:",
+                    ["Today", "Until last exam"],
+                    horizontal=True
+                )
         
         if st.button("🚀 Generate Smart Plan", type="primary", use_container_width=True):
             if st.session_state.user_data['subjects']:
                 with st.spinner("🎯 Generating your personalized study plan..."):
-                    plan = []
-                    for subject in st.session_state.user_data['subjects']:
-                        if focus_subject != "All subjects" and subject['name'] != focus_subject:
-                            continue
-                        for topic in subject.get('topics', [])[:2]:
-                            plan.append({
-                                'subject': subject['name'],
-                                'topic': topic,
-                                'duration': 60,
-                                'priority': 0.7,
-                                'reason': f"Upcoming exam in {calculate_days_until(subject['exam_date'])} days"
-                            })
-                    st.session_state.user_data['today_plan'] = plan
+                    subjects = st.session_state.user_data['subjects']
+                    focus = focus_subject if focus_subject != "All subjects" else None
+                    if plan_horizon == "Today":
+                        plan = st.session_state.recommender.generate_daily_plan(
+                            subjects,
+                            available_hours=available_hours,
+                            intensity=study_intensity,
+                            include_breaks=include_breaks,
+                            focus_subject=focus,
+                            user_id=current_user_id() if include_review else None
+                        )
+                        st.session_state.user_data['semester_plan'] = None
+                        st.session_state.user_data['today_plan'] = plan
+                        save_plans()
+                    else:
+                        if focus is not None:
+                            subjects = [s for s in subjects if s['name'] == focus]
+                        planner = SemesterPlanner(available_hours * 60, study_intensity).build(subjects)
+                        st.session_state.user_data['semester_plan'] = planner
+                        refresh_today_plan()
                     st.success("✅ Study plan generated successfully!")
                     st.balloons()
             else:
                 st.error("❌ Please add subjects first in the 'Manage Subjects' tab!")
+        
+        planner = st.session_state.user_data.get('semester_plan')
+        if planner is not None and planner.days:
+            st.markdown("### 🗓️ Plan Until Your Last Exam")
+            st.dataframe(
+                [
+                    {
+                        'Date': format_date_readable(row['date'].strftime('%Y-%m-%d')),
+                        'Study time': format_duration(row['minutes']),
+                        'Subjects': ", ".join(row['subjects'])
+                    }
+                    for row in planner.summary()
+                ],
+                use_container_width=True,
+                hide_index=True
+            )
+    
+        st.markdown("### 🕐 Study Schedule")
+        st.caption("Your tasks placed in your preferred study times (⚙️ Settings), around busy times from your calendar.")
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            calendar = st.file_uploader("Busy times (.ics calendar export)", type=['ics'], key="busy_calendar")
+        with col2:
+            st.write(f"📆 {st.session_state.db.count_busy_blocks(current_user_id())} busy blocks imported")
+            if calendar is not None and st.button("📆 Import Calendar", use_container_width=True):
+                blocks = parse_ics(calendar.getvalue().decode('utf-8', errors='replace'))
+                try:
+                    st.session_state.db.replace_busy_blocks(current_user_id(), blocks)
+                    user_data_changed()
+                    st.success(f"✅ Imported {len(blocks)} busy blocks")
+                except DatabaseError as e:
+                    st.error(f"❌ {e}")
+        
+        schedule = memoized_view('schedule', build_schedule)
+        if schedule['today']:
+            st.dataframe(
+                [
+                    {
+                        'Time': f"{e['start']:%H:%M}-{e['end']:%H:%M}",
+                        'Subject': e['subject'],
+                        'Topic': f"🔄 {e['topic']}" if e['review'] else e['topic'],
+                        'Break after': f"{e['break_after']} min" if e['break_after'] else "",
+                    }
+                    for e in schedule['today']
+                ],
+                use_container_width=True,
+                hide_index=True
+            )
+        if schedule['ics']:
+            st.download_button(
+                f"📥 Export {schedule['entries']} sessions over {schedule['days']} days (.ics)",
+                schedule['ics'], file_name="study_plan.ics", mime="text/calendar", use_container_width=True
+            )
+        if schedule['unscheduled']:
+            st.warning(
+                f"⚠️ {format_duration(sum(t['duration'] for t in schedule['unscheduled']))} of study did not fit "
+                f"your free preferred study times - add more study times in Settings or reduce the daily hours."
+            )
     
     with tab2:
         st.markdown("### Manage Your Subjects")
@@ -526,25 +799,40 @@ def study_planner_page():
                         'added_date': datetime.now().strftime('%Y-%m-%d')
                     }
                     
-                    success = st.session_state.db.add_subject(
-                        subject_name, 
-                        exam_date.strftime('%Y-%m-%d'), 
-                        difficulty,
-                        color
-                    )
-                    
-                    if success:
+                    try:
+                        st.session_state.db.add_subject(
+                            current_user_id(),
+                            subject_name, 
+                            exam_date.strftime('%Y-%m-%d'), 
+                            difficulty,
+                            color,
+                            new_subject['topics']
+                        )
+                    except DatabaseError as e:
+                        st.error(f"❌ {e}")
+                    else:
                         st.session_state.user_data['subjects'].append(new_subject)
+                        user_data_changed()
+                        if st.session_state.user_data.get('semester_plan') is not None:
+                            st.session_state.user_data['semester_plan'].add_subject(new_subject)
+                            refresh_today_plan()
                         st.success(f"✅ Subject '{subject_name}' added successfully!")
-                    else:
-                        st.error("❌ Failed to add subject to database.")
                 else:
                     st.error("❌ Please enter a subject name")
         
         # Display current subjects
         st.markdown("### 📚 Your Subjects")
         if st.session_state.user_data['subjects']:
-            for i, subject in enumerate(st.session_state.user_data['subjects']):
+            db = st.session_state.db
+            search = st.text_input(
+                "🔍 Search subjects", key="subject_search", placeholder="Filter by name",
+                on_change=reset_page, args=("subjects",)
+            )
+            total = db.count_subjects(current_user_id(), search)
+            limit, offset = paginate("subjects", total)
+            if not total:
+                st.info("🔍 No subjects match your search.")
+            for subject in db.load_subjects(current_user_id(), search, limit, offset):
                 with st.expander(
                     f"📘 {subject['name']} - Exam: {format_date_readable(subject['exam_date'])} {get_difficulty_badge(subject['difficulty'])}",
                     expanded=False
@@ -557,21 +845,47 @@ def study_planner_page():
                         
                         if subject.get('topics'):
                             st.write("**Topics to study:**")
-                            for topic in subject['topics']:
-                                st.write(f"• {topic}")
+                            st.markdown("\n".join(f"- {topic}" for topic in subject['topics']))
                     
                     with col2:
                         progress = st.slider(
                             "Progress",
-                            min_value=0, max_value=100, value=0,
-                            key=f"progress_{i}",
+                            min_value=0, max_value=100, value=subject.get('progress', 0),
+                            key=f"progress_{subject['name']}",
                             label_visibility="collapsed"
                         )
+                        if (progress != subject.get('progress', 0)
+                                and write_saved(db.update_progress(current_user_id(), subject['name'], progress))):
+                            cached = find_subject(subject['name'])
+                            if cached is None:
+                                # Added in another session since this one loaded its subjects
+                                reload_subjects()
+                            else:
+                                cached['progress'] = progress
+                                user_data_changed()
                         st.write(f"**Progress:** {progress}%")
                         
-                        if st.button("🗑️ Delete", key=f"delete_{i}", use_container_width=True):
-                            st.session_state.db.delete_subject(subject['name'])
-                            st.session_state.user_data['subjects'].pop(i)
+                        if st.button("🗑️ Delete", key=f"delete_{subject['name']}", use_container_width=True):
+                            try:
+                                db.delete_subject(current_user_id(), subject['name'])
+                            except DatabaseError as e:
+                                st.error(f"❌ {e}")
+                                st.stop()
+                            cached = find_subject(subject['name'])
+                            if cached is None:
+                                reload_subjects()
+                            else:
+                                st.session_state.user_data['subjects'].remove(cached)
+                                user_data_changed()
+                            if st.session_state.user_data.get('semester_plan') is not None:
+                                st.session_state.user_data['semester_plan'].remove_subject(subject['name'])
+                                refresh_today_plan()
+                            else:
+                                st.session_state.user_data['today_plan'] = [
+                                    t for t in st.session_state.user_data['today_plan']
+                                    if t['subject'] != subject['name']
+                                ]
+                                save_plans()
                             st.rerun()
         else:
             st.info("📝 No subjects added yet. Add your first subject above!")
@@ -579,17 +893,51 @@ def study_planner_page():
     with tab3:
         st.markdown("### 📊 Study Progress")
         
+        stats = st.session_state.db.load_study_stats(current_user_id(), datetime.now().date())
+        today = stats['daily'][-1]
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            display_metric_card("STREAK", f"{stats['streak']} 🔥", f"Best: {stats['best_streak']} days", "metric-1")
+        with col2:
+            display_metric_card("TIME STUDIED", format_duration(stats['minutes']), "All sessions", "metric-2")
+        with col3:
+            display_metric_card("SESSIONS", stats['sessions'], "Stopped or completed", "metric-3")
+        with col4:
+            display_metric_card("TODAY", format_duration(today['minutes']),
+                                f"of {format_duration(today['planned'])} planned", "metric-4")
+        
+        if any(d['minutes'] or d['planned'] for d in stats['daily']):
+            st.markdown("#### Planned vs. studied (last 14 days)")
+            # A plain Vega-Lite spec: st.bar_chart would build it through Altair and pandas on every rerun
+            st.vega_lite_chart({
+                'data': {'values': [
+                    {'day': d['day'][5:], 'kind': kind, 'minutes': d[key]}
+                    for d in stats['daily'] for kind, key in (("Planned", 'planned'), ("Studied", 'minutes'))
+                ]},
+                'mark': 'bar',
+                'encoding': {
+                    'x': {'field': 'day', 'type': 'ordinal', 'title': None},
+                    'xOffset': {'field': 'kind'},
+                    'y': {'field': 'minutes', 'type': 'quantitative', 'title': "Minutes"},
+                    'color': {'field': 'kind', 'type': 'nominal', 'title': None},
+                },
+            }, use_container_width=True)
+        
         if st.session_state.user_data['subjects']:
-            for subject in st.session_state.user_data['subjects']:
-                days_until = calculate_days_until(subject['exam_date'])
-                progress = max(0, min(100, 100 - (days_until / 30 * 100)))
-                
+            limit, offset = paginate("progress", len(st.session_state.user_data['subjects']))
+            subjects = st.session_state.db.load_subjects(current_user_id(), limit=limit, offset=offset)
+            days_until = subject_columns(subjects)['days']
+            for subject, days in zip(subjects, days_until.tolist()):
                 col1, col2 = st.columns([3, 1])
                 with col1:
                     st.write(f"**{subject['name']}**")
-                    st.progress(progress / 100)
+                    st.progress(
+                        effective_progress(subject) / 100,
+                        text=f"{len(subject['completed_topics'])}/{len(subject['topics'])} topics"
+                    )
                 with col2:
-                    st.write(f"{days_until} days left")
+                    st.write(f"{format_duration(subject['minutes_studied'])} in {subject['sessions']} sessions")
+                    st.caption(f"{days} days left")
         else:
             st.info("📈 Add subjects to track your progress!")
 
@@ -603,58 +951,232 @@ def study_materials_page():
         
         st.info("""
         📖 **Upload your study materials** to enable smart topic explanations and better study recommendations.
-        Supported formats: PDF, TXT, DOCX
+        Supported formats: PDF, TXT, DOCX - or a ZIP of them to import a whole course pack
         """)
         
-        uploaded_file = st.file_uploader(
-            "Choose a document",
-            type=['pdf', 'txt', 'docx'],
+        uploaded_files = st.file_uploader(
+            "Choose documents",
+            type=['pdf', 'txt', 'docx', 'zip'],
+            accept_multiple_files=True,
             help="Upload your syllabus, notes, or textbook chapters"
         )
         
-        if uploaded_file is not None:
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.write(f"**File:** {uploaded_file.name}")
-            with col2:
-                file_size = uploaded_file.size / 1024 / 1024
-                st.write(f"**Size:** {file_size:.2f} MB")
-            with col3:
-                st.write(f"**Type:** {uploaded_file.type}")
+        if uploaded_files:
+            bulk = len(uploaded_files) > 1 or uploaded_files[0].name.lower().endswith('.zip')
+            if bulk:
+                total_size = sum(f.size for f in uploaded_files) / 1024 / 1024
+                st.write(f"**Files:** {len(uploaded_files)} • **Total size:** {total_size:.2f} MB")
+            else:
+                uploaded_file = uploaded_files[0]
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.write(f"**File:** {uploaded_file.name}")
+                with col2:
+                    file_size = uploaded_file.size / 1024 / 1024
+                    st.write(f"**Size:** {file_size:.2f} MB")
+                with col3:
+                    st.write(f"**Type:** {uploaded_file.type}")
             
-            if st.button("📥 Process Document", type="primary", use_container_width=True):
-                with st.spinner("🔄 Processing your document..."):
-                    try:
-                        file_path = save_uploaded_file(uploaded_file)
-                        st.session_state.rag.process_document(file_path, "General")
-                        st.session_state.user_data['uploaded_docs'].append({
-                            'name': uploaded_file.name,
-                            'path': file_path,
-                            'upload_date': datetime.now().strftime('%Y-%m-%d %H:%M'),
-                            'size': f"{file_size:.2f} MB"
-                        })
-                        st.success("✅ Document processed successfully!")
-                    except Exception as e:
-                        st.error(f"❌ Error: {str(e)}")
+            doc_subject = st.selectbox(
+                "📘 Subject:",
+                options=["General"] + [s['name'] for s in st.session_state.user_data['subjects']],
+                help="Which subject does this document belong to?"
+            )
+            share_document = st.checkbox(
+                "📢 Share with everyone as course material",
+                help="Shared documents are searchable by every student; others stay private to you"
+            )
+            
+            if bulk and st.button("📦 Import All", type="primary", use_container_width=True):
+                try:
+                    from modules.ingestion import stage_files
+                    files = stage_files(uploaded_files, UPLOAD_DIR)
+                    st.session_state.bulk_import = get_ingestion_service().import_files(
+                        current_user_id(), files, doc_subject, shared=share_document
+                    )
+                    st.success(f"📦 Importing {len(files)} documents in the background - follow the progress under 'Your Documents'.")
+                except Exception as e:
+                    st.error(f"❌ Error: {str(e)}")
+            
+            if not bulk and st.button("📥 Process Document", type="primary", use_container_width=True):
+                try:
+                    db = st.session_state.db
+                    user_id = current_user_id()
+                    # Shared material goes to the common partition, the rest to the user's own
+                    partition = None if share_document else user_id
+                    doc_id, file_path = save_uploaded_file(uploaded_file)
+                    if db.has_document(user_id, doc_id) or get_rag_pipeline().has_document(doc_id, user_id=partition):
+                        st.info("📎 This document is already in your library, nothing to process.")
+                    else:
+                        db.add_document(user_id, doc_id, uploaded_file.name, file_path, doc_subject,
+                                        uploaded_file.size, shared=share_document)
+                        get_ingestion_service().submit(
+                            user_id, doc_id, file_path, uploaded_file.name, doc_subject, shared=share_document
+                        )
+                        reload_documents()
+                        st.success("📥 Document queued! It is processed in the background - follow its progress under 'Your Documents'.")
+                except Exception as e:
+                    st.error(f"❌ Error: {str(e)}")
     
     with tab2:
         st.markdown("### Your Documents")
         
-        if st.session_state.user_data['uploaded_docs']:
-            for i, doc in enumerate(st.session_state.user_data['uploaded_docs']):
-                with st.expander(f"📄 {doc['name']}"):
-                    col1, col2 = st.columns([3, 1])
-                    with col1:
-                        st.write(f"**Uploaded:** {doc['upload_date']}")
-                        st.write(f"**Size:** {doc['size']}")
-                    with col2:
-                        if st.button("🗑️ Remove", key=f"remove_{i}", use_container_width=True):
-                            if os.path.exists(doc['path']):
-                                os.remove(doc['path'])
-                            st.session_state.user_data['uploaded_docs'].pop(i)
-                            st.rerun()
+        if documents_processing():
+            live_document_list()
         else:
-            st.info("📭 No documents uploaded yet.")
+            document_list()
+
+def documents_processing():
+    bulk = st.session_state.get('bulk_import')
+    if bulk is not None and not bulk['finished']:
+        return True
+    return st.session_state.db.has_unfinished_jobs(current_user_id())
+
+def document_list():
+    user_data = st.session_state.user_data
+    bulk = st.session_state.get('bulk_import')
+    if bulk is not None:
+        processed = bulk['done'] + bulk['skipped'] + bulk['failed']
+        throughput = f"{bulk['pages_per_second']:.1f} pages/s • {bulk['chunks_per_second']:.1f} chunks/s"
+        if bulk['finished']:
+            st.success(
+                f"📦 Bulk import finished: {bulk['done']} imported, {bulk['skipped']} already present, "
+                f"{bulk['failed']} failed - {bulk['pages']} pages and {bulk['chunks']} chunks "
+                f"in {bulk['seconds']:.1f}s ({throughput})"
+            )
+            for error in bulk['errors']:
+                st.warning(f"⚠️ {error}")
+        else:
+            st.progress(
+                processed / bulk['files'] if bulk['files'] else 0.0,
+                text=f"📦 Importing {processed} of {bulk['files']} files • {throughput}"
+            )
+    
+    if not user_data['uploaded_docs']:
+        st.info("📭 No documents uploaded yet.")
+        return
+    
+    db = st.session_state.db
+    user_id = current_user_id()
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        search = st.text_input(
+            "🔍 Search documents", key="document_search", placeholder="Filter by file name",
+            on_change=reset_page, args=("documents",)
+        )
+    with col2:
+        subject = st.selectbox(
+            "📘 Subject",
+            ["All subjects"] + sorted({doc['subject'] for doc in user_data['uploaded_docs'] if doc['subject']}),
+            key="document_subject", on_change=reset_page, args=("documents",)
+        )
+    subject = None if subject == "All subjects" else subject
+    total = db.count_documents(user_id, search, subject)
+    limit, offset = paginate("documents", total)
+    if not total:
+        st.info("🔍 No documents match your search.")
+    
+    for doc in db.load_documents(user_id, search, subject, limit, offset):
+        status = doc.get('status', 'done')
+        label = {'queued': " - ⏳ queued", 'running': " - ⚙️ processing", 'failed': " - ❌ failed"}.get(status, "")
+        with st.expander(f"📄 {doc['name']}{label}", expanded=status != 'done'):
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.write(f"**Uploaded:** {doc['upload_date']}")
+                st.write(f"**Subject:** {doc.get('subject', 'General')}")
+                st.write(f"**Size:** {doc['size']}")
+                if doc.get('shared'):
+                    st.write("📢 Shared course material")
+                if status == 'queued':
+                    st.progress(0.0, text="Waiting for a worker...")
+                elif status == 'running':
+                    if doc.get('pages_total'):
+                        st.progress(
+                            min(doc['pages_done'] / doc['pages_total'], 1.0),
+                            text=f"Page {doc['pages_done']} of {doc['pages_total']} • {doc['chunks']} chunks"
+                        )
+                    else:
+                        st.progress(0.5, text=f"{doc['chunks']} chunks so far")
+                elif status == 'failed':
+                    st.error(f"❌ {doc.get('error') or 'Processing failed'}")
+                else:
+                    st.write(f"**Chunks:** {doc['chunks']}")
+            with col2:
+                if doc.get('owned', True) and status == 'failed':
+                    if st.button("🔁 Retry", key=f"retry_{doc['doc_id']}", use_container_width=True):
+                        get_ingestion_service().submit(
+                            user_id, doc['doc_id'], doc['path'], doc['name'], doc['subject'],
+                            shared=doc.get('shared', False)
+                        )
+                        reload_documents()
+                        st.rerun()
+                if doc.get('owned', True) and st.button("🗑️ Remove", key=f"remove_{doc['doc_id']}", use_container_width=True):
+                    partition = None if doc.get('shared') else user_id
+                    get_ingestion_service().cancel(user_id, doc['doc_id'])
+                    get_rag_pipeline().remove_document(doc['doc_id'], user_id=partition)
+                    db.delete_document(user_id, doc['doc_id'])
+                    # Another student may have uploaded the same file
+                    if os.path.exists(doc['path']) and not db.file_in_use(doc['path']):
+                        os.remove(doc['path'])
+                    reload_documents()
+                    st.rerun()
+            if status == 'done':
+                extracted_topics(doc)
+
+def extracted_topics(doc):
+    # Topics ingestion found in the document, offered as a subject's topics once the user confirms them
+    db = st.session_state.db
+    user_id = current_user_id()
+    topics = db.load_document_topics(user_id, doc['doc_id'])
+    if not topics:
+        return
+    subjects = [s['name'] for s in st.session_state.user_data['subjects']]
+    if not subjects:
+        st.caption(f"🧩 {len(topics)} topics found - add a subject in the Study Planner to use them.")
+        return
+    subject_name = st.selectbox(
+        "🧩 Use extracted topics for",
+        subjects,
+        index=subjects.index(doc['subject']) if doc['subject'] in subjects else 0,
+        key=f"topic_subject_{doc['doc_id']}"
+    )
+    subject = find_subject(subject_name)
+    new_topics = [t['name'] for t in topics if t['name'] not in subject['topics']]
+    if not new_topics:
+        st.caption(f"✅ All {len(topics)} topics from this document are in {subject_name}.")
+        return
+    found_in = "headings and outline" if topics[0]['source'] == 'heading' else "most frequent terms"
+    edited = st.text_area(
+        f"📖 {len(new_topics)} new topics from the document's {found_in}",
+        "\n".join(new_topics),
+        key=f"topics_{doc['doc_id']}_{subject_name}",
+        help="One topic per line - edit or delete lines before adding them",
+        height=150
+    )
+    if st.button("✅ Add Topics", key=f"adopt_{doc['doc_id']}", use_container_width=True):
+        chosen = [t.strip() for t in edited.splitlines() if t.strip()]
+        try:
+            added = db.adopt_document_topics(user_id, doc['doc_id'], subject_name, chosen)
+        except DatabaseError as e:
+            st.error(f"❌ {e}")
+            return
+        subject['topics'].extend(added)
+        user_data_changed()
+        planner = st.session_state.user_data.get('semester_plan')
+        if planner is not None:
+            planner.add_subject(subject)
+            refresh_today_plan()
+        st.success(f"✅ Added {len(added)} topics to {subject_name}")
+        st.rerun()
+
+@st.fragment(run_every=PROGRESS_REFRESH_SECONDS)
+def live_document_list():
+    # Same list, re-run on a timer so progress bars move without user interaction
+    if not documents_processing():
+        # Everything finished: redraw the whole page, which also stops the polling
+        reload_documents()
+        st.rerun()
+    document_list()
 
 def study_assistant_page():
     st.markdown("## ❓ Study Assistant")
@@ -683,7 +1205,7 @@ def study_assistant_page():
     # Manual topic input
     st.markdown("### 💬 Ask About Any Topic")
     
-    col1, col2 = st.columns([3, 1])
+    col1, col2, col3 = st.columns([3, 1, 1])
     with col1:
         topic_query = st.text_input(
             "Enter a topic:",
@@ -697,19 +1219,37 @@ def study_assistant_page():
             ["Simple", "Detailed", "Comprehensive"],
             label_visibility="collapsed"
         )
+    with col3:
+        subject_filter = st.selectbox(
+            "Subject:",
+            ["All subjects"] + [s['name'] for s in st.session_state.user_data['subjects']],
+            label_visibility="collapsed"
+        )
     
+    explanation_stream = None
     if st.button("🎓 Get Explanation", type="primary", use_container_width=True) and topic_query:
-        with st.spinner(f"🔍 Researching '{topic_query}'..."):
-            explanation = st.session_state.rag.explain_topic(topic_query)
-            st.session_state.current_explanation = explanation
-            st.session_state.current_topic = topic_query
+        subject = None if subject_filter == "All subjects" else subject_filter
+        explanation_stream = get_rag_pipeline().explain_topic(
+            topic_query,
+            depth=explanation_depth,
+            subject=subject,
+            stream=True,
+            user_id=current_user_id(),
+            # Topics taken from a document go straight to the chunks they came from
+            sources=st.session_state.db.load_topic_sources(current_user_id(), topic_query, subject)
+        )
+        st.session_state.current_explanation = None
+        st.session_state.current_topic = topic_query
     
     # Display explanation
-    if st.session_state.get('current_explanation'):
+    if explanation_stream is not None or st.session_state.get('current_explanation'):
         st.markdown("---")
         st.markdown(f"### 📖 Explanation: {st.session_state.get('current_topic', 'Topic')}")
         
-        st.markdown(st.session_state.current_explanation)
+        if explanation_stream is not None:
+            st.session_state.current_explanation = render_stream(explanation_stream)
+        else:
+            st.markdown(st.session_state.current_explanation)
         
         # Action buttons
         col1, col2, col3 = st.columns(3)
@@ -732,20 +1272,23 @@ def settings_page():
     
     with tab1:
         st.markdown("### 🎯 Study Preferences")
+        saved = st.session_state.user_data['study_preferences']
+        time_options = ["🌅 Morning (6AM-12PM)", "🌞 Afternoon (12PM-6PM)", "🌇 Evening (6PM-10PM)", "🌙 Night (10PM-2AM)"]
+        intensity_options = ["Light 🐢", "Moderate 🚶", "Intensive 🏃"]
         
         col1, col2 = st.columns(2)
         
         with col1:
             daily_goal = st.number_input(
                 "Daily study goal (hours):",
-                min_value=1, max_value=12, value=4,
+                min_value=1, max_value=12, value=int(saved['daily_goal']),
                 help="Your target study time per day"
             )
             
             preferred_study_times = st.multiselect(
                 "Preferred study times:",
-                ["🌅 Morning (6AM-12PM)", "🌞 Afternoon (12PM-6PM)", "🌇 Evening (6PM-10PM)", "🌙 Night (10PM-2AM)"],
-                default=["🌅 Morning (6AM-12PM)", "🌇 Evening (6PM-10PM)"],
+                time_options,
+                default=[t for t in saved['preferred_times'] if t in time_options] or [time_options[0], time_options[2]],
                 help="When do you prefer to study?"
             )
         
@@ -753,14 +1296,14 @@ def settings_page():
             break_frequency = st.select_slider(
                 "Break frequency:",
                 options=["25 min", "45 min", "60 min", "90 min"],
-                value="45 min",
+                value=saved['break_frequency'],
                 help="How long between breaks? (Pomodoro technique)"
             )
             
             study_intensity = st.select_slider(
                 "Study intensity:",
-                options=["Light 🐢", "Moderate 🚶", "Intensive 🏃"],
-                value="Moderate 🚶"
+                options=intensity_options,
+                value=next((o for o in intensity_options if o.startswith(saved['intensity'].split()[0])), "Moderate 🚶")
             )
         
         if st.button("💾 Save Preferences", type="primary"):
@@ -770,17 +1313,64 @@ def settings_page():
                 'break_frequency': break_frequency,
                 'intensity': study_intensity
             }
-            st.success("✅ Preferences saved successfully!")
+            user_data_changed()
+            try:
+                st.session_state.db.save_preferences(current_user_id(), st.session_state.user_data['study_preferences'])
+                st.success("✅ Preferences saved successfully!")
+            except DatabaseError as e:
+                st.error(f"❌ {e}")
     
     with tab2:
         st.markdown("### 👤 Account Settings")
-        st.info("🔄 Account features coming in future updates!")
+        db = st.session_state.db
+        user = st.session_state.user
         
-        col1, col2 = st.columns(2)
-        with col1:
-            st.text_input("Name", value="Student", disabled=True)
-        with col2:
-            st.text_input("Email", value="student@example.com", disabled=True)
+        if user['id'] != db.local_user_id:
+            st.success(f"✅ Signed in as **{user['username']}**")
+            with st.form("profile_form"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    display_name = st.text_input("Name", value=user.get('display_name') or "")
+                with col2:
+                    email = st.text_input("Email", value=user.get('email') or "")
+                if st.form_submit_button("💾 Save Profile"):
+                    try:
+                        db.update_user(user['id'], display_name, email)
+                        st.session_state.user = db.get_user(user['id'])
+                        st.success("✅ Profile saved!")
+                    except DatabaseError as e:
+                        st.error(f"❌ {e}")
+            if st.button("🚪 Sign Out"):
+                switch_user(db.get_user(db.local_user_id))
+                st.rerun()
+        else:
+            st.info("🔐 You are using the shared local account. Sign in or create an account to keep your subjects and documents private.")
+            col1, col2 = st.columns(2)
+            with col1:
+                with st.form("login_form"):
+                    st.markdown("#### Sign In")
+                    username = st.text_input("Username", key="login_username")
+                    password = st.text_input("Password", type="password", key="login_password")
+                    if st.form_submit_button("🔓 Sign In", use_container_width=True):
+                        account = db.authenticate(username, password)
+                        if account is None:
+                            st.error("❌ Wrong username or password.")
+                        else:
+                            switch_user(account)
+                            st.rerun()
+            with col2:
+                with st.form("register_form"):
+                    st.markdown("#### Create Account")
+                    new_username = st.text_input("Username", key="register_username")
+                    new_name = st.text_input("Name", key="register_name")
+                    new_email = st.text_input("Email", key="register_email")
+                    new_password = st.text_input("Password", type="password", key="register_password")
+                    if st.form_submit_button("✨ Create Account", use_container_width=True):
+                        try:
+                            switch_user(db.create_user(new_username, new_password, new_name, new_email))
+                            st.rerun()
+                        except DatabaseError as e:
+                            st.error(f"❌ {e}")
     
     with tab3:
         st.markdown("### ℹ️ About Smart Study Planner")
@@ -822,11 +1412,10 @@ def settings_page():
         """, unsafe_allow_html=True)
 
 def save_uploaded_file(uploaded_file):
-    os.makedirs("data/uploaded_docs", exist_ok=True)
-    file_path = os.path.join("data/uploaded_docs", uploaded_file.name)
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    return file_path
+    # Stored under its content hash, so re-uploads under another name are detected
+    uploaded_file.seek(0)
+    extension = os.path.splitext(uploaded_file.name)[1]
+    return save_stream_by_hash(uploaded_file, UPLOAD_DIR, extension)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""UserDatabase write throughput with concurrent writers.
+
+    python -m benchmarks.bench_database [--writers 8] [--writes 500] [--subjects 50]
+
+Each writer thread stands in for one Streamlit session and issues a mix of
+progress updates, topic completions and study-session records. Compares
+committing every write on the caller's connection with the queued group
+commit (one transaction per batch on the writer thread).
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from modules.database import UserDatabase
+
+
+def seed(db, n_subjects, n_topics=10):
+    for i in range(n_subjects):
+        db.add_subject(db.local_user_id, f"Subject {i}", "2030-01-01", "Intermediate", "#667eea",
+                       [f"Topic {j}" for j in range(n_topics)])
+
+
+def writer(db, worker, n_writes, n_subjects, futures):
+    for i in range(n_writes):
+        name = f"Subject {(worker * 7 + i) % n_subjects}"
+        kind = i % 3
+        if kind == 0:
+            futures.append(db.update_progress(db.local_user_id, name, i % 101))
+        elif kind == 1:
+            futures.append(db.set_topic_completed(db.local_user_id, name, f"Topic {i % 10}"))
+        else:
+            futures.append(db.log_event(db.local_user_id, name, f"Topic {i % 10}", 'stop', 45))
+
+
+def run(path, batch_writes, n_writers, n_writes, n_subjects):
+    db = UserDatabase(path, batch_writes=batch_writes)
+    seed(db, n_subjects)
+    futures = []
+    threads = [
+        threading.Thread(target=writer, args=(db, w, n_writes, n_subjects, futures))
+        for w in range(n_writers)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    db.flush()
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for f in futures if f.exception() is not None)
+    db.close()
+    return elapsed, failed, db.stats['batches']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=500, help="writes per writer")
+    parser.add_argument('--subjects', type=int, default=50)
+    args = parser.parse_args()
+
+    total = args.writers * args.writes
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, batch_writes in (("commit per write", False), ("group commit", True)):
+            path = os.path.join(tmp, f"{label.replace(' ', '_')}.db")
+            elapsed, failed, batches = run(path, batch_writes, args.writers, args.writes, args.subjects)
+            line = f"{label:17} {total} writes in {elapsed:.2f}s  ({total / elapsed:,.0f} writes/s, {failed} failed"
+            if batch_writes:
+                line += f", {batches} batches"
+            print(line + ")")
+
+
+if __name__ == '__main__':
+    main()
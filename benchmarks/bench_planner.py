@@ -0,0 +1,102 @@
+"""Semester planning and incremental re-planning on a synthetic course load.
+
+    python -m benchmarks.bench_planner [--subjects 20] [--topics 2000] [--days 120]
+    python -m benchmarks.bench_planner --subjects 50 --topics 1000 --days 90
+
+Times the hour allocation solver on its own (allocate_hours over every day
+up to the last exam), the single-day plan, a full SemesterPlanner.build,
+then the incremental operations the UI triggers: completing a topic,
+adding a subject and removing one. Exits non-zero if a daily plan leaves
+time unscheduled for a partly studied subject whose exam is next.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from modules.recommender import TOPIC_MINUTES, SemesterPlanner, StudyRecommender, allocate_hours
+
+
+def make_subjects(n_subjects, n_topics, horizon, rng):
+    per_subject = max(1, n_topics // n_subjects)
+    return [
+        {
+            'name': f"Subject {i}",
+            'exam_date': (date.today() + timedelta(days=rng.randint(7, horizon))).strftime('%Y-%m-%d'),
+            'difficulty': rng.choice(['Beginner', 'Intermediate', 'Advanced']),
+            'progress': rng.randint(0, 60),
+            'topics': [f"Topic {i}.{j}" for j in range(per_subject)],
+        }
+        for i in range(n_subjects)
+    ]
+
+
+def partly_studied_plan(recommender, budget_minutes):
+    """Minutes planned when the nearest exam's subject is 3/8 studied and another exam is far off."""
+    today = date.today()
+    near = {
+        'name': "Near", 'exam_date': str(today + timedelta(days=5)), 'difficulty': 'Intermediate',
+        'topics': [f"Near {i}" for i in range(40)], 'minutes_studied': 15 * TOPIC_MINUTES,
+    }
+    far = {'name': "Far", 'exam_date': str(today + timedelta(days=60)), 'difficulty': 'Intermediate',
+           'topics': ["Far 1", "Far 2", "Far 3"]}
+    plan = recommender.generate_daily_plan([near, far], budget_minutes / 60, include_breaks=False, today=today)
+    return sum(task['duration'] for task in plan)
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subjects', type=int, default=20)
+    parser.add_argument('--topics', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=120)
+    parser.add_argument('--hours', type=float, default=6)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    subjects = make_subjects(args.subjects, args.topics, args.days, rng)
+    planner = SemesterPlanner(daily_minutes=int(args.hours * 60)).build(subjects)
+    entries = list(planner.subjects.values())
+    allocation, ms = timed(allocate_hours, entries, planner.daily_minutes, planner.block_minutes)
+    blocks = sum(-(-minutes // planner.block_minutes) for day in allocation for minutes in day.values())
+    print(f"allocate_hours: {ms:.2f} ms for {len(entries)} subjects x {len(allocation)} days ({blocks} blocks)")
+
+    recommender = StudyRecommender(None)
+    recommender.generate_daily_plan(subjects, available_hours=args.hours)  # warm the date cache
+    _, ms = timed(recommender.generate_daily_plan, subjects, args.hours)
+    print(f"daily plan: {ms:.2f} ms")
+    # A short day, so only a few of Near's topics are scored; its progress must still count all 40
+    budget = 120
+    planned = partly_studied_plan(recommender, budget)
+    print(f"partly studied nearest exam: {planned} of {budget} minutes planned")
+
+    planner = SemesterPlanner(daily_minutes=int(args.hours * 60))
+    _, ms = timed(planner.build, subjects)
+    print(f"build: {ms:.2f} ms for {args.subjects} subjects, {args.topics} topics, {planner.days} days")
+
+    timings = []
+    for _ in range(100):
+        subject = rng.choice(list(planner.subjects.values()))
+        if subject['topics']:
+            dates, ms = timed(planner.complete_topic, subject['name'], subject['topics'][0])
+            timings.append(ms)
+    timings.sort()
+    print(f"complete_topic: median {timings[len(timings) // 2]:.3f} ms, max {timings[-1]:.3f} ms")
+
+    extra = make_subjects(1, args.topics // args.subjects, args.days, rng)[0]
+    extra['name'] = "Added subject"
+    dates, ms = timed(planner.add_subject, extra)
+    print(f"add_subject: {ms:.2f} ms, {len(dates)} of {planner.days} days re-planned")
+    dates, ms = timed(planner.remove_subject, extra['name'])
+    print(f"remove_subject: {ms:.2f} ms, {len(dates)} of {planner.days} days re-planned")
+    sys.exit(0 if planned == budget else 1)
+
+
+if __name__ == '__main__':
+    main()
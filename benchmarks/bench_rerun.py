@@ -0,0 +1,106 @@
+"""Page rerun time with a realistic amount of user data.
+
+    python -m benchmarks.bench_rerun [--subjects 40] [--topics 12] [--documents 0]
+                                     [--page Dashboard] [--reruns 50]
+
+Seeds the local account with subjects, documents and a day plan in a
+temporary data directory, renders the page once, then times reruns that
+change nothing (what every widget interaction elsewhere on the page
+costs). On the Dashboard it also times reruns after completing a topic
+(which does change the data).
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+PAGES = {
+    'Dashboard': "🏠 Dashboard",
+    'Planner': "📅 Study Planner",
+    'Materials': "📚 Study Materials",
+}
+
+
+def seed(n_subjects, n_topics, n_documents=0):
+    from modules.database import UserDatabase
+    from modules.recommender import StudyRecommender
+
+    db = UserDatabase()
+    user_id = db.local_user_id
+    today = datetime.now().date()
+    for i in range(n_subjects):
+        db.add_subject(user_id, f"Subject {i}", str(today + timedelta(days=3 + i % 60)),
+                       ("Beginner", "Intermediate", "Advanced")[i % 3], "#667eea",
+                       [f"Topic {j}" for j in range(n_topics)])
+    for i in range(n_documents):
+        db.add_document(user_id, f"doc{i:05d}", f"Document {i}.pdf", f"missing/{i}.pdf",
+                        f"Subject {i % max(n_subjects, 1)}", 1 << 20, chunk_count=100)
+    plan = StudyRecommender(db).generate_daily_plan(db.load_subjects(user_id), available_hours=8)
+    db.save_plan(user_id, today, 'daily', plan)
+    db.close()
+
+
+def timed_runs(at, n, action=None):
+    samples = []
+    for _ in range(n):
+        started = time.perf_counter()
+        if action is None:
+            at.run()
+        else:
+            action(at)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subjects', type=int, default=40)
+    parser.add_argument('--topics', type=int, default=12)
+    parser.add_argument('--documents', type=int, default=0)
+    parser.add_argument('--page', choices=sorted(PAGES), default='Dashboard')
+    parser.add_argument('--reruns', type=int, default=50)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import AppTest, app_test, local_script_runner
+
+    # A running server compiles the script once; AppTest would recompile it on every run
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        seed(args.subjects, args.topics, args.documents)
+        at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+        at.run()
+        if args.page != 'Dashboard':
+            at.sidebar.radio[0].set_value(PAGES[args.page]).run()
+        tasks = len(at.session_state.user_data['today_plan'])
+        results = [("unchanged rerun", timed_runs(at, args.reruns))]
+
+        if args.page == 'Dashboard':
+            def complete_first_task(at):
+                at.button(key="complete_1").click().run()
+            results.append(("after completing", timed_runs(at, min(args.reruns, tasks - 1), complete_first_task)))
+        errors = [e.value for e in at.exception]
+
+    print(f"{args.page}: {args.subjects} subjects x {args.topics} topics, {args.documents} documents, "
+          f"{tasks} tasks in today's plan")
+    for label, samples in results:
+        samples = sorted(samples)
+        print(f"{label:17} median {statistics.median(samples):6.1f} ms   "
+              f"p90 {samples[int(len(samples) * 0.9)]:6.1f} ms   ({len(samples)} runs)")
+    if errors:
+        print(f"Script errors: {errors[0]}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Due-review lookups and plan merging with a large review deck.
+
+    python -m benchmarks.bench_reviews [--items 50000] [--subjects 100] [--hours 6]
+
+Seeds one user with --items completed topics spread over --subjects, with
+due dates scattered over two months either side of today, then times
+counting today's due reviews, fetching one day's worth, generating a daily
+plan that includes them, and recording reviews.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date
+
+from modules.database import UserDatabase
+from modules.recommender import StudyRecommender
+from modules.spaced_repetition import GRADES
+
+
+def seed(db, n_items, n_subjects):
+    user_id = db.local_user_id
+    per_subject = max(1, n_items // n_subjects)
+    for i in range(n_subjects):
+        db.add_subject(user_id, f"Subject {i}", "2030-01-01", "Intermediate", "#667eea",
+                       [f"Topic {i}.{j}" for j in range(per_subject)])
+    with db.conn:
+        # Completing a topic schedules its first review (see TRIGGERS)
+        db.conn.execute("UPDATE topics SET completed = 1, completed_at = CURRENT_TIMESTAMP")
+        db.conn.execute("UPDATE reviews SET due = date('now', 'localtime', (abs(random()) % 120 - 60) || ' days')")
+    return db.conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=50000)
+    parser.add_argument('--subjects', type=int, default=100)
+    parser.add_argument('--hours', type=float, default=6)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = UserDatabase(os.path.join(tmp, "bench.db"))
+        user_id = db.local_user_id
+        today = date.today()
+        items, ms = timed(seed, db, args.items, args.subjects)
+        print(f"seed: {items} review items in {ms:.0f} ms")
+
+        due, ms = timed(db.count_due_reviews, user_id, today)
+        print(f"count_due_reviews: {ms:.2f} ms ({due} due)")
+        reviews, ms = timed(db.load_due_reviews, user_id, today, limit=24)
+        print(f"load_due_reviews (24): {ms:.2f} ms")
+
+        subjects = db.load_subjects(user_id)
+        recommender = StudyRecommender(db)
+        plan, ms = timed(recommender.generate_daily_plan, subjects, args.hours, user_id=user_id, today=today)
+        print(f"daily plan with reviews: {ms:.2f} ms ({sum(1 for t in plan if t.get('review'))} reviews, "
+              f"{len(plan)} tasks)")
+
+        timings = []
+        for review in db.load_due_reviews(user_id, today, limit=200):
+            _, ms = timed(db.record_review, user_id, review['subject'], review['topic'],
+                          rng.choice(list(GRADES.values())), today)
+            timings.append(ms)
+        timings.sort()
+        if timings:
+            print(f"record_review: median {timings[len(timings) // 2]:.3f} ms, max {timings[-1]:.3f} ms")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
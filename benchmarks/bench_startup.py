@@ -0,0 +1,107 @@
+"""Cold-start time of the app, page by page.
+
+    python -m benchmarks.bench_startup [--budget-ms 300] [--runs 5]
+
+Each run is a fresh interpreter with an empty data directory: Streamlit is
+imported and warmed up first (paid once by the server, not per session), then
+the script is run headless with AppTest and timed to the first complete
+render of the Dashboard, followed by a first visit to every other page.
+A first run of a fresh AppTest also carries the harness's own setup (it
+rescans installed packages for components, which a server does once), so
+the first run of an empty app is timed the same way and subtracted.
+Also checks that the Dashboard did not load document parsing, the vector
+store or the LLM client. Exits non-zero if the Dashboard misses the budget
+or pulls in any of those modules.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the Dashboard has no use for
+LAZY_MODULES = (
+    'pypdf', 'google.generativeai', 'modules.rag_pipeline', 'modules.vector_store',
+    'modules.retrieval', 'modules.embeddings', 'modules.ingestion', 'modules.llm',
+)
+
+PAGES = ["📅 Study Planner", "📚 Study Materials", "❓ Study Assistant", "⚙️ Settings"]
+
+PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+# Streamlit's own one-time setup (component scan, emoji catalogue) happens on the first run
+warm_up = AppTest.from_string("import streamlit as st; st.info('📚 warm-up')")
+warm_up.run()
+import_ms = (time.perf_counter() - started) * 1000
+
+def first_run_ms(app_test):
+    started = time.perf_counter()
+    app_test.run()
+    return (time.perf_counter() - started) * 1000
+
+# Smallest of a few, as that is closest to the harness's own share
+baseline_ms = min(first_run_ms(AppTest.from_string("import streamlit as st")) for _ in range(3))
+at = AppTest.from_file({app!r}, default_timeout=120)
+dashboard_ms = first_run_ms(at) - baseline_ms
+loaded = [name for name in {lazy!r} if name in sys.modules]
+
+pages = {{}}
+for page in {pages!r}:
+    started = time.perf_counter()
+    at.sidebar.radio[0].set_value(page).run()
+    pages[page] = (time.perf_counter() - started) * 1000
+
+print(json.dumps({{
+    'streamlit_import_ms': import_ms, 'baseline_ms': baseline_ms, 'dashboard_ms': dashboard_ms, 'loaded': loaded,
+    'pages': pages, 'errors': [e.value for e in at.exception],
+}}))
+"""
+
+
+def probe():
+    script = PROBE.format(root=ROOT, app=os.path.join(ROOT, "app.py"), lazy=LAZY_MODULES, pages=PAGES)
+    with tempfile.TemporaryDirectory() as tmp:
+        result = subprocess.run(
+            [sys.executable, "-c", script], cwd=tmp, capture_output=True, text=True, check=True
+        )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=300.0, help="Dashboard first-render budget")
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = [probe() for _ in range(args.runs)]
+    dashboard = statistics.median(r['dashboard_ms'] for r in results)
+    print(f"streamlit warm-up     {statistics.median(r['streamlit_import_ms'] for r in results):7.0f} ms  (server, once)")
+    print(f"empty app first run   {statistics.median(r['baseline_ms'] for r in results):7.0f} ms  (harness, subtracted)")
+    print(f"Dashboard first paint {dashboard:7.0f} ms  (budget {args.budget_ms:.0f} ms)")
+    for page in PAGES:
+        print(f"  then {page:18} {statistics.median(r['pages'][page] for r in results):7.0f} ms")
+
+    failed = False
+    loaded = sorted({name for r in results for name in r['loaded']})
+    if loaded:
+        print(f"Dashboard loaded modules it should not: {', '.join(loaded)}")
+        failed = True
+    errors = [error for r in results for error in r['errors']]
+    if errors:
+        print(f"Script errors: {errors[0]}")
+        failed = True
+    if dashboard > args.budget_ms:
+        print(f"Over budget by {dashboard - args.budget_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Time-slotting a whole semester plan around a busy calendar.
+
+    python -m benchmarks.bench_timeslots [--days 120] [--tasks 6] [--weekly-events 20] [--one-off 500]
+
+Builds an .ics calendar with --weekly-events recurring weekly classes and
+--one-off single events over the semester, parses it, then packs --tasks
+tasks a day for --days days into the preferred study times around it.
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from modules.timeslots import export_ics, parse_ics, schedule_plan
+
+PREFERENCES = {
+    'preferred_times': ["🌅 Morning (6AM-12PM)", "🌞 Afternoon (12PM-6PM)", "🌇 Evening (6PM-10PM)"],
+    'break_frequency': "45 min",
+    'intensity': "Moderate",
+}
+
+
+def make_calendar(start, n_days, n_weekly, n_one_off, rng):
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0"]
+    for i in range(n_weekly):
+        first = datetime.combine(start + timedelta(days=rng.randint(0, 6)), datetime.min.time())
+        first += timedelta(hours=rng.randint(8, 18))
+        lines += ["BEGIN:VEVENT", f"DTSTART:{first:%Y%m%dT%H%M%S}", "DURATION:PT1H30M",
+                  f"RRULE:FREQ=WEEKLY;COUNT={n_days // 7 + 1}", f"SUMMARY:Class {i}", "END:VEVENT"]
+    for i in range(n_one_off):
+        moment = datetime.combine(start + timedelta(days=rng.randint(0, n_days)), datetime.min.time())
+        moment += timedelta(minutes=rng.randint(6 * 60, 22 * 60))
+        lines += ["BEGIN:VEVENT", f"DTSTART:{moment:%Y%m%dT%H%M%S}", f"DURATION:PT{rng.randint(1, 3)}H",
+                  f"SUMMARY:Event {i}", "END:VEVENT"]
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(lines)
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=120)
+    parser.add_argument('--tasks', type=int, default=6)
+    parser.add_argument('--weekly-events', type=int, default=20)
+    parser.add_argument('--one-off', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    start = date.today() + timedelta(days=1)
+    calendar = make_calendar(start, args.days, args.weekly_events, args.one_off, rng)
+    blocks, ms = timed(parse_ics, calendar)
+    print(f"parse_ics: {ms:.1f} ms, {len(blocks)} busy blocks")
+
+    days = [
+        (start + timedelta(days=d),
+         [{'subject': f"Subject {rng.randint(0, 9)}", 'topic': f"Topic {d}.{t}",
+           'duration': rng.choice((30, 45, 60, 90))} for t in range(args.tasks)])
+        for d in range(args.days)
+    ]
+    now = datetime.combine(start, datetime.min.time())
+    (entries, unscheduled), ms = timed(schedule_plan, days, PREFERENCES, blocks, now=now)
+    print(f"schedule_plan: {ms:.1f} ms for {args.days} days, {args.days * args.tasks} tasks -> "
+          f"{len(entries)} sessions, {len(unscheduled)} tasks left over")
+    ics, ms = timed(export_ics, entries)
+    print(f"export_ics: {ms:.1f} ms, {len(ics) // 1024} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Cost of extracting topics during chunking.
+
+    python -m benchmarks.bench_topics [--chapters 300] [--sections 4] [--paragraphs 20]
+
+Writes a synthetic textbook (numbered chapters and sections), the same
+book with each chapter's text on one long line, and the text with its
+headings removed, then times streaming each through iter_chunks with and
+without a TopicExtractor. The structured books take the heading path, the
+flat one the keyword fallback. Plain text is read in fixed-size
+pseudo-pages, so long lines put headings right before a page break; exits
+non-zero if a chapter is not linked to the chunk its heading is in. Also
+chunks a file that has no space after its first word (a base64 blob) and
+exits non-zero unless that ends and every character lands in a chunk.
+"""
+import argparse
+import base64
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+from modules.rag_pipeline import iter_chunks
+from modules.topic_extraction import TopicExtractor
+
+WORDS = ("gradient descent convergence learning rate matrix vector eigenvalue probability distribution "
+         "sampling estimator variance regression classifier margin kernel entropy network layer").split()
+
+
+def write_book(path, n_chapters, n_sections, n_paragraphs, rng, headings=True, one_line=False):
+    """Write the book; returns the chapter headings as written."""
+    chapters = []
+    paragraph_end = " " if one_line else "\n"
+    with open(path, 'w', encoding='utf-8') as f:
+        for chapter in range(1, n_chapters + 1):
+            if headings:
+                title = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {chapter}a"
+                chapters.append(f"{chapter}. {title}")
+                f.write(f"{chapters[-1]}\n")
+            for section in range(1, n_sections + 1):
+                if headings and not one_line:
+                    f.write(f"{chapter}.{section} {rng.choice(WORDS).title()} Section {chapter}-{section}\n")
+                for _ in range(n_paragraphs):
+                    f.write(" ".join(rng.choice(WORDS) for _ in range(40)) + "." + paragraph_end)
+            if one_line:
+                f.write("\n")
+    return chapters
+
+
+def timed_chunks(path, topics=None):
+    started = time.perf_counter()
+    chunks = [chunk['text'] for chunk in iter_chunks(path, "Bench", topics=topics)]
+    found = topics.topics() if topics is not None else []
+    return chunks, found, (time.perf_counter() - started) * 1000
+
+
+def unlinked_chapters(chapters, chunks, topics):
+    """Chapter headings whose topic does not include the first chunk the heading appears in.
+
+    Headings that a chunk boundary cuts in two are not checked.
+    """
+    linked = {topic['name']: set(topic['chunks']) for topic in topics}
+    missing = []
+    for heading in chapters:
+        name = heading.split(" ", 1)[1]
+        first = next((i for i, text in enumerate(chunks) if heading in text), None)
+        if first is not None and first not in linked.get(name, ()):
+            missing.append(name)
+    return missing
+
+
+def uncovered(text, chunks):
+    """Offset of the first character of text that no chunk contains, or None.
+
+    Chunks must appear in order, each starting no later than where the one
+    before it ended (plus the space between them).
+    """
+    text = " ".join(text.split())
+    covered = start = 0
+    for chunk in chunks:
+        at = text.find(chunk, start)
+        if at == -1 or at > covered + 1:
+            return covered
+        covered = max(covered, at + len(chunk))
+        start = at + 1
+    return covered if covered < len(text) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chapters', type=int, default=300)
+    parser.add_argument('--sections', type=int, default=4)
+    parser.add_argument('--paragraphs', type=int, default=20)
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, headings, one_line in (("structured", True, False), ("long lines", True, True),
+                                          ("flat", False, False)):
+            path = os.path.join(tmp, f"{label}.txt")
+            chapters = write_book(path, args.chapters, args.sections, args.paragraphs, random.Random(0),
+                                  headings, one_line)
+            chunks, _, plain_ms = timed_chunks(path)
+            _, topics, ms = timed_chunks(path, TopicExtractor())
+            sources = sorted({topic['source'] for topic in topics})
+            print(f"{label:10} {os.path.getsize(path) // 1024} KiB, {len(chunks)} chunks: chunking {plain_ms:.0f} ms, "
+                  f"with extraction {ms:.0f} ms -> {len(topics)} topics from {', '.join(sources) or 'nothing'}")
+            # Only the first MAX_TOPICS chapters are kept as topics
+            missing = unlinked_chapters(chapters[:len(topics)], chunks, topics)
+            if missing:
+                print(f"  {len(missing)} chapters not linked to their heading's chunk, e.g. {missing[0]}")
+                failed = True
+
+        path = os.path.join(tmp, "unbroken.txt")
+        text = "Intro " + base64.b64encode(random.Random(0).randbytes(30000)).decode()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        started = time.perf_counter()
+        # A chunker that stops making progress repeats the same chunk forever; cap the count instead of hanging
+        chunks = [chunk['text'] for chunk in itertools.islice(iter_chunks(path, "Bench"), len(text))]
+        ms = (time.perf_counter() - started) * 1000
+        print(f"{'unbroken':10} {len(text) // 1024} KiB, {len(chunks)} chunks: chunking {ms:.0f} ms")
+        gap = uncovered(text, chunks)
+        if len(chunks) == len(text) or gap is not None:
+            print(f"  chunking did not finish or skipped text from offset {gap}")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Smart Study Planner from the command line, without Streamlit.
+
+    python cli.py ingest <folder|zip|file>... [--subject S] [--user U] [--share] [--workers N]
+    python cli.py plan [--user U] [--date YYYY-MM-DD]
+    python cli.py query "question" [--user U] [--subject S] [-k 5] [--explain [--depth D]]
+
+Uses the same database and vector store as the app, so it can pre-build
+plans and indices from cron. Modules are imported by the command that needs
+them, which keeps `python cli.py --help` and the import of this file cheap.
+"""
+import argparse
+import sys
+import time
+from datetime import date, datetime
+
+DB_PATH = "data/study_planner.db"
+STORE_DIR = "data/vector_store"
+UPLOAD_DIR = "data/uploaded_docs"
+
+
+def open_database(args):
+    from modules.database import UserDatabase
+    return UserDatabase(args.db)
+
+
+def resolve_user(db, username):
+    """The named account, or the local one when no name is given."""
+    user = db.find_user(username) if username else db.get_user(db.local_user_id)
+    if user is None:
+        raise SystemExit(f"No such user: {username}")
+    return user
+
+
+def cmd_ingest(args):
+    from modules.ingestion import bulk_import, stage_files
+    from modules.rag_pipeline import RAGPipeline
+
+    db = open_database(args)
+    user = resolve_user(db, args.user)
+    rag = RAGPipeline(store_dir=args.store)
+    files = stage_files(args.sources, args.upload_dir)
+    print(f"Importing {len(files)} documents with {args.workers} workers...")
+    stats = bulk_import(db, rag, files, user['id'], args.subject, args.share, max_workers=args.workers)
+    db.close()
+    print(f"{stats['done']} imported, {stats['skipped']} already present, {stats['failed']} failed "
+          f"in {stats['seconds']:.1f}s: {stats['pages']} pages ({stats['pages_per_second']:.1f} pages/s), "
+          f"{stats['chunks']} chunks ({stats['chunks_per_second']:.1f} chunks/s)")
+    for error in stats['errors']:
+        print(f"  {error}")
+    return 1 if stats['failed'] else 0
+
+
+def plan_user(db, recommender, user_id, today):
+    """Rebuild and save a user's plans the way the app would show them today; returns today's tasks."""
+    from modules.recommender import SemesterPlanner
+
+    subjects = db.load_subjects(user_id)
+    saved = db.load_latest_plan(user_id, 'semester')
+    if saved is not None:
+        settings = saved[2]
+        planner = SemesterPlanner(settings['daily_minutes'], settings['intensity'], start=today).build(
+            [s for s in subjects if s['name'] in settings['subjects']]
+        )
+        db.delete_plans(user_id, 'semester')
+        db.save_plan(user_id, planner.start, 'semester', planner.summary(), settings=settings)
+        tasks = planner.plan_for(today)
+    else:
+        preferences = db.load_preferences(user_id)
+        tasks = recommender.generate_daily_plan(
+            subjects,
+            available_hours=preferences.get('daily_goal', 4),
+            intensity=preferences.get('intensity', 'Moderate'),
+            user_id=user_id,
+            today=today
+        )
+    db.save_plan(user_id, today, 'daily', tasks)
+    return tasks
+
+
+def cmd_plan(args):
+    from modules.recommender import StudyRecommender
+
+    db = open_database(args)
+    recommender = StudyRecommender(db)
+    today = date.fromisoformat(args.date) if args.date else datetime.now().date()
+    users = [resolve_user(db, args.user)] if args.user else db.list_users()
+    started = time.perf_counter()
+    planned = 0
+    for user in users:
+        if not db.load_subjects(user['id']):
+            continue
+        tasks = plan_user(db, recommender, user['id'], today)
+        planned += 1
+        print(f"{user['username']}: {len(tasks)} tasks, {sum(t['duration'] for t in tasks)} min")
+    db.close()
+    elapsed = time.perf_counter() - started
+    print(f"Planned {today} for {planned} of {len(users)} users in {elapsed:.2f}s")
+    return 0
+
+
+def cmd_query(args):
+    from modules.rag_pipeline import RAGPipeline
+
+    db = open_database(args)
+    user = resolve_user(db, args.user)
+    db.close()
+    rag = RAGPipeline(store_dir=args.store)
+    started = time.perf_counter()
+    if args.explain:
+        for token in rag.stream_explanation(args.question, args.depth, args.subject, user_id=user['id']):
+            sys.stdout.write(token)
+            sys.stdout.flush()
+        print()
+    else:
+        for chunk in rag.search(args.question, k=args.k, subject=args.subject, user_id=user['id']):
+            meta = chunk['metadata']
+            print(f"[{chunk['score']:.3f}] {meta.get('source')} p.{meta.get('page')} ({meta.get('subject')})")
+            print(f"    {chunk['text'][:200]}")
+    print(f"({(time.perf_counter() - started) * 1000:.0f} ms)", file=sys.stderr)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database path")
+    parser.add_argument('--store', default=STORE_DIR, help="vector store directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help="bulk-import documents into a user's library")
+    ingest.add_argument('sources', nargs='+', help="folders, zip archives or documents")
+    ingest.add_argument('--subject', default="General")
+    ingest.add_argument('--user', help="username (default: the local account)")
+    ingest.add_argument('--share', action='store_true', help="add as course material visible to everyone")
+    ingest.add_argument('--workers', type=int, help="worker processes (default: cores - 1, at most 4)")
+    ingest.add_argument('--upload-dir', default=UPLOAD_DIR)
+    ingest.set_defaults(func=cmd_ingest)
+
+    plan = commands.add_parser('plan', help="generate and save today's plans for every user")
+    plan.add_argument('--user', help="only this username")
+    plan.add_argument('--date', help="plan for this date instead of today (YYYY-MM-DD)")
+    plan.set_defaults(func=cmd_plan)
+
+    query = commands.add_parser('query', help="search the study materials or explain a topic")
+    query.add_argument('question')
+    query.add_argument('--user', help="username (default: the local account)")
+    query.add_argument('--subject')
+    query.add_argument('-k', type=int, default=5, help="number of passages")
+    query.add_argument('--explain', action='store_true', help="stream an explanation instead of passages")
+    query.add_argument('--depth', default="Detailed", choices=["Simple", "Detailed", "Comprehensive"])
+    query.set_defaults(func=cmd_query)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, 'workers', 0) is None:
+        from modules.ingestion import MAX_WORKERS
+        args.workers = MAX_WORKERS
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
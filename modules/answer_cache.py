@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from modules.retrieval import tokenize
+
+# Cosine similarity above which two questions count as the same question.
+# Tuned on the local hashing backend: "neural net" vs "neural network" is
+# ~0.75, while "logistic" vs "linear regression" is ~0.6.
+SIMILARITY_THRESHOLD = 0.75
+
+
+def normalize_topic(topic):
+    """'Neural Networks?' and 'explain neural network' both become 'neural network'."""
+    return " ".join(tokenize(topic))
+
+
+class AnswerCache:
+    """Bounded LRU + TTL cache of Study Assistant answers.
+
+    Entries are keyed by (normalised topic, depth, subject, user, corpus
+    version). user is whose private materials the answer may quote (None
+    for shared material only), so one student's notes never answer another
+    student's question. On an exact miss, the question embedding is compared
+    with the cached questions for the same depth/subject/user/version so
+    rephrasings hit too. Ingesting or removing documents bumps the version
+    and drops the affected entries (and those of all-subject questions).
+    An answer generated while the corpus changed is not stored: callers
+    take version() before retrieving and pass it to put().
+    """
+
+    def __init__(self, embedder, max_entries=256, ttl_seconds=6 * 3600,
+                 similarity=SIMILARITY_THRESHOLD, clock=time.monotonic):
+        self.embedder = embedder
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self.clock = clock
+        self.versions = {}
+        self.stats = {'hits': 0, 'semantic_hits': 0, 'misses': 0, 'evictions': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def version(self, subject=None, user=None):
+        """Version of the material an answer for subject and user draws on."""
+        # Answers depend on the shared corpus and on the user's own documents;
+        # questions across all subjects (subject None) on every subject's
+        owners = (None, user)
+        if subject is None:
+            return sum(v for (owner, _), v in list(self.versions.items()) if owner in owners)
+        return sum(self.versions.get((owner, subject), 0) for owner in set(owners))
+
+    def _key(self, normalized, depth, subject, user):
+        return (normalized, depth, subject, user, self.version(subject, user))
+
+    def _expired(self, entry, now):
+        return now - entry['created'] > self.ttl_seconds
+
+    def get(self, topic, depth, subject=None, user=None):
+        normalized = normalize_topic(topic) or topic.strip().lower()
+        now = self.clock()
+        with self._lock:
+            key = self._key(normalized, depth, subject, user)
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry['answer']
+
+            candidates = [
+                (k, e) for k, e in self._entries.items()
+                if k[1:] == key[1:] and not self._expired(e, now)
+            ]
+        if candidates:
+            query = self.embedder.embed_query(normalized)
+            similarities = np.stack([e['vector'] for _, e in candidates]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.similarity:
+                best_key, best_entry = candidates[best]
+                with self._lock:
+                    if best_key in self._entries:
+                        self._entries.move_to_end(best_key)
+                    self.stats['semantic_hits'] += 1
+                return best_entry['answer']
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, topic, depth, subject, answer, user=None, version=None):
+        """Cache answer; with version (see version()), only if the material has not changed since."""
+        normalized = normalize_topic(topic) or topic.strip().lower()
+        vector = self.embedder.embed_query(normalized)
+        now = self.clock()
+        with self._lock:
+            key = self._key(normalized, depth, subject, user)
+            if version is not None and key[-1] != version:
+                return
+            self._entries[key] = {'answer': answer, 'vector': vector, 'created': now}
+            self._entries.move_to_end(key)
+            for stale in [k for k, e in self._entries.items() if self._expired(e, now)]:
+                del self._entries[stale]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate_subject(self, subject, user=None):
+        """Call after user's documents for subject changed (user None: shared material)."""
+        with self._lock:
+            self.versions[(user, subject)] = self.versions.get((user, subject), 0) + 1
+            # Questions across all subjects (subject None) may have used it too.
+            # Shared material can be in anyone's answers; private material only in its owner's.
+            for key in [k for k in self._entries
+                        if k[2] in (subject, None) and (user is None or k[3] == user)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,28 @@
+import hashlib
+import hmac
+import os
+
+PBKDF2_ITERATIONS = 200_000
+MIN_PASSWORD_LENGTH = 8
+
+
+def hash_password(password, salt=None, iterations=PBKDF2_ITERATIONS):
+    """Salted PBKDF2-SHA256, stored as 'pbkdf2_sha256$iterations$salt$hash'."""
+    salt = salt or os.urandom(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password, stored):
+    try:
+        algorithm, iterations, salt, digest = stored.split('$')
+    except (AttributeError, ValueError):
+        return False
+    if algorithm != 'pbkdf2_sha256':
+        return False
+    candidate = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), bytes.fromhex(salt), int(iterations))
+    return hmac.compare_digest(candidate.hex(), digest)
+
+
+def normalize_username(username):
+    return (username or "").strip().lower()
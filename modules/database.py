@@ -0,0 +1,1046 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, wait
+from datetime import date, datetime, timedelta
+
+from modules.auth import MIN_PASSWORD_LENGTH, hash_password, normalize_username, verify_password
+from modules.spaced_repetition import INITIAL_EASE, due_date, next_review
+
+logger = logging.getLogger(__name__)
+
+# How long a connection waits for another writer's lock before failing
+BUSY_TIMEOUT_SECONDS = 5.0
+# Most queued writes applied in one transaction
+MAX_BATCH = 500
+# Bumped whenever a table changes shape; see UserDatabase._migrate
+SCHEMA_VERSION = 4
+# Owner of data created before accounts existed, and of sessions nobody signed in to
+LOCAL_USERNAME = "student"
+
+TABLES = {
+    'users': '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            display_name TEXT,
+            email TEXT,
+            password_hash TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+    'subjects': '''
+        CREATE TABLE IF NOT EXISTS subjects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            name TEXT NOT NULL,
+            exam_date DATE,
+            difficulty TEXT,
+            color TEXT,
+            progress INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, name)
+        )''',
+    'topics': '''
+        CREATE TABLE IF NOT EXISTS topics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject_id INTEGER NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+            name TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            completed INTEGER NOT NULL DEFAULT 0,
+            completed_at TIMESTAMP,
+            UNIQUE (subject_id, name)
+        )''',
+    'documents': '''
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            doc_hash TEXT NOT NULL,
+            name TEXT NOT NULL,
+            path TEXT NOT NULL,
+            subject TEXT,
+            shared INTEGER NOT NULL DEFAULT 0,
+            size_bytes INTEGER,
+            chunk_count INTEGER NOT NULL DEFAULT 0,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, doc_hash)
+        )''',
+    'chunks': '''
+        CREATE TABLE IF NOT EXISTS chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+            vector_row INTEGER NOT NULL,
+            page INTEGER,
+            chunk_index INTEGER
+        )''',
+    # Topics suggested by ingestion; chunks is a JSON array of the document's chunk indexes
+    'document_topics': '''
+        CREATE TABLE IF NOT EXISTS document_topics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+            name TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            source TEXT NOT NULL CHECK (source IN ('heading', 'keyword')),
+            chunks TEXT NOT NULL DEFAULT '[]',
+            UNIQUE (document_id, name)
+        )''',
+    # Filled when suggested topics are confirmed, so a topic's material is one lookup away
+    'topic_chunks': '''
+        CREATE TABLE IF NOT EXISTS topic_chunks (
+            topic_id INTEGER NOT NULL REFERENCES topics(id) ON DELETE CASCADE,
+            chunk_id INTEGER NOT NULL REFERENCES chunks(id) ON DELETE CASCADE,
+            PRIMARY KEY (topic_id, chunk_id)
+        ) WITHOUT ROWID''',
+    'jobs': '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER NOT NULL UNIQUE REFERENCES documents(id) ON DELETE CASCADE,
+            status TEXT NOT NULL DEFAULT 'queued',
+            pages_done INTEGER NOT NULL DEFAULT 0,
+            pages_total INTEGER,
+            chunks_done INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+    'plans': '''
+        CREATE TABLE IF NOT EXISTS plans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            plan_date DATE NOT NULL,
+            kind TEXT NOT NULL,
+            settings TEXT,
+            tasks TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, kind, plan_date)
+        )''',
+    'preferences': '''
+        CREATE TABLE IF NOT EXISTS preferences (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (user_id, key)
+        )''',
+    # Append-only; the *_stats tables below are rollups kept current by TRIGGERS
+    'study_events': '''
+        CREATE TABLE IF NOT EXISTS study_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            subject_id INTEGER REFERENCES subjects(id) ON DELETE SET NULL,
+            topic TEXT,
+            kind TEXT NOT NULL CHECK (kind IN ('start', 'stop', 'complete', 'review')),
+            minutes INTEGER NOT NULL DEFAULT 0,
+            day DATE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+    'subject_stats': '''
+        CREATE TABLE IF NOT EXISTS subject_stats (
+            subject_id INTEGER PRIMARY KEY REFERENCES subjects(id) ON DELETE CASCADE,
+            minutes INTEGER NOT NULL DEFAULT 0,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            last_day DATE
+        )''',
+    'daily_stats': '''
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            day DATE NOT NULL,
+            minutes INTEGER NOT NULL DEFAULT 0,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            completed_minutes INTEGER NOT NULL DEFAULT 0,
+            planned_minutes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        )''',
+    'user_stats': '''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+            minutes INTEGER NOT NULL DEFAULT 0,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            streak INTEGER NOT NULL DEFAULT 0,
+            best_streak INTEGER NOT NULL DEFAULT 0,
+            last_day DATE
+        )''',
+    # SM-2 state of each completed topic; one row per topic, found by due date
+    'reviews': f'''
+        CREATE TABLE IF NOT EXISTS reviews (
+            topic_id INTEGER PRIMARY KEY REFERENCES topics(id) ON DELETE CASCADE,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            due DATE NOT NULL,
+            interval_days INTEGER NOT NULL DEFAULT 1,
+            ease REAL NOT NULL DEFAULT {INITIAL_EASE},
+            repetitions INTEGER NOT NULL DEFAULT 0,
+            last_reviewed DATE
+        )''',
+    # Busy time imported from the user's calendar; study slots are planned around it
+    'busy_blocks': '''
+        CREATE TABLE IF NOT EXISTS busy_blocks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            starts_at TIMESTAMP NOT NULL,
+            ends_at TIMESTAMP NOT NULL,
+            summary TEXT
+        )''',
+}
+
+INDEXES = '''
+    CREATE INDEX IF NOT EXISTS idx_subjects_user_exam ON subjects(user_id, exam_date);
+    CREATE INDEX IF NOT EXISTS idx_topics_subject ON topics(subject_id, position);
+    CREATE INDEX IF NOT EXISTS idx_study_events_user ON study_events(user_id, day);
+    CREATE INDEX IF NOT EXISTS idx_reviews_due ON reviews(user_id, due);
+    CREATE INDEX IF NOT EXISTS idx_busy_blocks_user_start ON busy_blocks(user_id, starts_at);
+    CREATE INDEX IF NOT EXISTS idx_documents_shared ON documents(shared) WHERE shared = 1;
+    CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(doc_hash);
+    CREATE INDEX IF NOT EXISTS idx_documents_user_uploaded ON documents(user_id, uploaded_at);
+    CREATE INDEX IF NOT EXISTS idx_chunks_document ON chunks(document_id);
+    CREATE INDEX IF NOT EXISTS idx_chunks_document_index ON chunks(document_id, chunk_index);
+    CREATE INDEX IF NOT EXISTS idx_topic_chunks_chunk ON topic_chunks(chunk_id);
+    CREATE INDEX IF NOT EXISTS idx_jobs_unfinished ON jobs(status) WHERE status IN ('queued', 'running');
+'''
+
+# A stop, complete or review ends a session; each one is folded into the rollups in the
+# transaction that appends it, so reading progress never rescans the history.
+# Streaks only move forward: an event dated before the last study day leaves them alone.
+# Completed tasks and finished reviews drop out of the saved daily plan, so the
+# day's planned minutes are what is left in it plus what was done from it. Completing a topic
+# puts it up for its first review the next day.
+TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS study_events_rollup AFTER INSERT ON study_events
+    WHEN NEW.kind != 'start'
+    BEGIN
+        INSERT INTO subject_stats (subject_id, minutes, sessions, completed, last_day)
+        SELECT NEW.subject_id, NEW.minutes, 1, NEW.kind = 'complete', NEW.day WHERE NEW.subject_id IS NOT NULL
+        ON CONFLICT (subject_id) DO UPDATE SET
+            minutes = minutes + excluded.minutes, sessions = sessions + 1,
+            completed = completed + excluded.completed, last_day = max(last_day, excluded.last_day);
+        INSERT INTO daily_stats (user_id, day, minutes, sessions, completed_minutes)
+        VALUES (NEW.user_id, NEW.day, NEW.minutes, 1, CASE WHEN NEW.kind IN ('complete', 'review') THEN NEW.minutes ELSE 0 END)
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            minutes = minutes + excluded.minutes, sessions = sessions + 1,
+            completed_minutes = completed_minutes + excluded.completed_minutes;
+        INSERT INTO user_stats (user_id, minutes, sessions, streak, best_streak, last_day)
+        VALUES (NEW.user_id, NEW.minutes, 1, 1, 1, NEW.day)
+        ON CONFLICT (user_id) DO UPDATE SET
+            minutes = minutes + excluded.minutes, sessions = sessions + 1,
+            streak = CASE
+                WHEN excluded.last_day <= last_day THEN streak
+                WHEN excluded.last_day = date(last_day, '+1 day') THEN streak + 1
+                ELSE 1 END,
+            best_streak = max(best_streak, CASE
+                WHEN excluded.last_day <= last_day THEN streak
+                WHEN excluded.last_day = date(last_day, '+1 day') THEN streak + 1
+                ELSE 1 END),
+            last_day = max(last_day, excluded.last_day);
+    END;
+    CREATE TRIGGER IF NOT EXISTS daily_plan_planned AFTER INSERT ON plans WHEN NEW.kind = 'daily'
+    BEGIN
+        INSERT INTO daily_stats (user_id, day, planned_minutes)
+        SELECT NEW.user_id, NEW.plan_date, COALESCE(SUM(json_extract(value, '$.duration')), 0) FROM json_each(NEW.tasks) WHERE true
+        ON CONFLICT (user_id, day) DO UPDATE SET planned_minutes = excluded.planned_minutes + completed_minutes;
+    END;
+    CREATE TRIGGER IF NOT EXISTS daily_plan_replanned AFTER UPDATE OF tasks ON plans WHEN NEW.kind = 'daily'
+    BEGIN
+        INSERT INTO daily_stats (user_id, day, planned_minutes)
+        SELECT NEW.user_id, NEW.plan_date, COALESCE(SUM(json_extract(value, '$.duration')), 0) FROM json_each(NEW.tasks) WHERE true
+        ON CONFLICT (user_id, day) DO UPDATE SET planned_minutes = excluded.planned_minutes + completed_minutes;
+    END;
+    CREATE TRIGGER IF NOT EXISTS topic_completed_review AFTER UPDATE OF completed ON topics
+    WHEN NEW.completed = 1 AND OLD.completed = 0
+    BEGIN
+        INSERT OR IGNORE INTO reviews (topic_id, user_id, due)
+        SELECT NEW.id, user_id, date('now', 'localtime', '+1 day') FROM subjects WHERE id = NEW.subject_id;
+    END;
+'''
+
+# Tables that gained a user_id in schema version 2
+USER_TABLES = ('subjects', 'documents', 'plans', 'preferences')
+
+
+def like_pattern(text):
+    """A LIKE pattern matching text anywhere, with % and _ taken literally (use ESCAPE '\\')."""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+class DatabaseError(Exception):
+    """A read or write failed; the message is meant to be shown to the user."""
+
+
+class UserDatabase:
+    """SQLite store shared by all sessions of the app.
+
+    Every subject, document, plan and preference belongs to a user, and
+    every method takes the user_id it acts for. The database runs in WAL
+    mode so readers never block the writer. Each thread gets its own
+    connection (closed when the thread exits). Frequent small writes
+    (progress, topic completion, study events) go through a queue that
+    one writer thread drains and commits in a single transaction per
+    batch; they return a Future that fails with DatabaseError if the write
+    was rejected. Reads wait for the queued writes of the user they read
+    for, not for everyone's. Pass batch_writes=False to apply them
+    immediately.
+    """
+
+    def __init__(self, db_path="data/study_planner.db", batch_writes=True):
+        self.db_path = db_path
+        self.batch_writes = batch_writes
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.stats = {'queued': 0, 'batches': 0, 'failed': 0}
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._last_writes = {}
+        self.create_tables()
+        self.local_user_id = self._ensure_user(LOCAL_USERNAME, "Student")
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS)
+            conn.execute("PRAGMA journal_mode = WAL")
+            # Safe with WAL: a power cut can lose the last commits, never corrupt the file
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA foreign_keys = ON")
+            self._local.conn = conn
+        return conn
+
+    def create_tables(self):
+        conn = self.conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if version < SCHEMA_VERSION and 'subjects' in existing:
+            self._migrate(existing)
+        with conn:
+            for sql in TABLES.values():
+                conn.execute(sql)
+            conn.executescript(INDEXES)
+            conn.executescript(TRIGGERS)
+            if 'reviews' not in existing and 'topics' in existing:
+                # Topics completed before reviews existed get their first one the day after completion
+                conn.execute('''
+                    INSERT INTO reviews (topic_id, user_id, due)
+                    SELECT t.id, s.user_id, date(COALESCE(t.completed_at, 'now'), 'localtime', '+1 day')
+                    FROM topics t JOIN subjects s ON s.id = t.subject_id WHERE t.completed = 1
+                ''')
+            if 'sessions' in existing:
+                # Schema 3 replaced the sessions table with the event log
+                conn.execute('''
+                    INSERT INTO study_events (user_id, subject_id, topic, kind, minutes, day, created_at)
+                    SELECT s.user_id, se.subject_id, t.name, CASE WHEN se.completed THEN 'complete' ELSE 'stop' END,
+                        se.minutes, date(se.started_at, 'localtime'), se.started_at
+                    FROM sessions se JOIN subjects s ON s.id = se.subject_id LEFT JOIN topics t ON t.id = se.topic_id
+                    ORDER BY se.started_at, se.id
+                ''')
+                conn.execute("DROP TABLE sessions")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _migrate(self, existing):
+        """Bring a database written by an older version up to SCHEMA_VERSION.
+
+        Tables that changed shape are rebuilt (create new, copy, drop old,
+        rename) with foreign keys off, as SQLite recommends. Rows from
+        before accounts existed go to the local user.
+        """
+        conn = self.conn
+        conn.execute("PRAGMA foreign_keys = OFF")
+        try:
+            with conn:
+                conn.execute(TABLES['users'])
+                conn.execute(
+                    "INSERT OR IGNORE INTO users (username, display_name) VALUES (?, ?)",
+                    (LOCAL_USERNAME, "Student")
+                )
+                local_id = conn.execute("SELECT id FROM users WHERE username = ?", (LOCAL_USERNAME,)).fetchone()[0]
+                rebuilt = set()
+                for table in USER_TABLES:
+                    if table not in existing:
+                        continue
+                    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+                    if 'user_id' in columns:
+                        continue
+                    conn.execute(TABLES[table].replace(f"IF NOT EXISTS {table}", f"{table}_new"))
+                    new_columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table}_new)")}
+                    copied = ", ".join(c for c in columns if c in new_columns)
+                    # OR IGNORE keeps the oldest row where names used to be allowed twice
+                    conn.execute(
+                        f"INSERT OR IGNORE INTO {table}_new (user_id, {copied}) "
+                        f"SELECT ?, {copied} FROM {table} ORDER BY rowid",
+                        (local_id,)
+                    )
+                    conn.execute(f"DROP TABLE {table}")
+                    conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+                    rebuilt.add(table)
+                events = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'study_events'").fetchone()
+                if events and "'review'" not in events[0]:
+                    # Schema 4 added the 'review' kind; dropping the old table drops its rollup trigger too,
+                    # which create_tables puts back
+                    conn.execute(TABLES['study_events'].replace("IF NOT EXISTS study_events", "study_events_new"))
+                    conn.execute("INSERT INTO study_events_new SELECT * FROM study_events")
+                    conn.execute("DROP TABLE study_events")
+                    conn.execute("ALTER TABLE study_events_new RENAME TO study_events")
+                if 'documents' in rebuilt:
+                    # Their vectors live in the shared index, so everyone could already see them
+                    conn.execute("UPDATE documents SET shared = 1 WHERE user_id = ?", (local_id,))
+                problems = conn.execute("PRAGMA foreign_key_check").fetchall()
+                if problems:
+                    raise DatabaseError(f"Migration left dangling references: {problems[:5]}")
+        finally:
+            conn.execute("PRAGMA foreign_keys = ON")
+
+    def _execute(self, sql, params=(), many=False):
+        try:
+            with self.conn:
+                if many:
+                    return self.conn.executemany(sql, params)
+                return self.conn.execute(sql, params)
+        except sqlite3.Error as e:
+            logger.error("Write failed: %s (%s)", e, " ".join(sql.split())[:80])
+            raise DatabaseError(f"Could not save your changes: {e}") from e
+
+    # Batched writes
+    def _enqueue(self, sql, params, user_id=None):
+        future = Future()
+        if not self.batch_writes:
+            try:
+                self._execute(sql, params)
+                future.set_result(None)
+            except DatabaseError as e:
+                self.stats['failed'] += 1
+                future.set_exception(e)
+            return future
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+                self._writer.start()
+            if user_id is not None:
+                self._last_writes[user_id] = future
+        if user_id is not None:
+            future.add_done_callback(lambda done: self._forget_write(user_id, done))
+        self.stats['queued'] += 1
+        self._queue.put((sql, params, future))
+        return future
+
+    def _forget_write(self, user_id, future):
+        with self._writer_lock:
+            if self._last_writes.get(user_id) is future:
+                del self._last_writes[user_id]
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            # Group commit: everything that queued up while the last batch was committing
+            batch = [item]
+            stop = False
+            while len(batch) < MAX_BATCH:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._apply(batch)
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _apply(self, batch):
+        conn = self.conn
+        self.stats['batches'] += 1
+        try:
+            with conn:
+                for sql, params, _ in batch:
+                    conn.execute(sql, params)
+        except sqlite3.Error:
+            # Retry one by one so a single bad write does not drop the rest of the batch
+            for sql, params, future in batch:
+                try:
+                    self._execute(sql, params)
+                    future.set_result(None)
+                except DatabaseError as e:
+                    self.stats['failed'] += 1
+                    future.set_exception(e)
+            return
+        for _, _, future in batch:
+            future.set_result(None)
+
+    def flush(self, user_id=None):
+        """Block until user_id's queued writes (everyone's if None) have been committed or have failed."""
+        if self._writer is None:
+            return
+        if user_id is None:
+            self._queue.join()
+            return
+        # The writer commits in queue order, so the user's last write finishing means all of theirs have
+        with self._writer_lock:
+            future = self._last_writes.get(user_id)
+        if future is not None:
+            wait([future])
+
+    def close(self):
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # Accounts
+    def _ensure_user(self, username, display_name):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO users (username, display_name) VALUES (?, ?)", (username, display_name)
+            )
+        return self.conn.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()[0]
+
+    def create_user(self, username, password, display_name=None, email=None):
+        """Register an account and return it; raises DatabaseError if the name is taken."""
+        username = normalize_username(username)
+        if not username:
+            raise DatabaseError("Please choose a username.")
+        if len(password or "") < MIN_PASSWORD_LENGTH:
+            raise DatabaseError(f"Passwords need at least {MIN_PASSWORD_LENGTH} characters.")
+        try:
+            with self.conn:
+                cursor = self.conn.execute(
+                    "INSERT INTO users (username, display_name, email, password_hash) VALUES (?, ?, ?, ?)",
+                    (username, display_name or username, email, hash_password(password))
+                )
+        except sqlite3.IntegrityError as e:
+            raise DatabaseError(f"The username '{username}' is already taken.") from e
+        return self.get_user(cursor.lastrowid)
+
+    def authenticate(self, username, password):
+        """The account for these credentials, or None."""
+        row = self.conn.execute(
+            "SELECT id, password_hash FROM users WHERE username = ?", (normalize_username(username),)
+        ).fetchone()
+        if row is None or not verify_password(password or "", row[1]):
+            return None
+        return self.get_user(row[0])
+
+    def get_user(self, user_id):
+        row = self.conn.execute(
+            "SELECT id, username, display_name, email FROM users WHERE id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'id': row[0], 'username': row[1], 'display_name': row[2], 'email': row[3]}
+
+    def list_users(self):
+        rows = self.conn.execute("SELECT id, username, display_name, email FROM users ORDER BY id").fetchall()
+        return [{'id': r[0], 'username': r[1], 'display_name': r[2], 'email': r[3]} for r in rows]
+
+    def find_user(self, username):
+        row = self.conn.execute(
+            "SELECT id FROM users WHERE username = ?", (normalize_username(username),)
+        ).fetchone()
+        return self.get_user(row[0]) if row else None
+
+    def update_user(self, user_id, display_name, email):
+        self._execute(
+            "UPDATE users SET display_name = ?, email = ? WHERE id = ?", (display_name, email, user_id)
+        )
+
+    # Subjects and topics
+    def add_subject(self, user_id, name, exam_date, difficulty, color, topics=()):
+        try:
+            with self.conn:
+                cursor = self.conn.execute(
+                    "INSERT INTO subjects (user_id, name, exam_date, difficulty, color) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, name, exam_date, difficulty, color)
+                )
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO topics (subject_id, name, position) VALUES (?, ?, ?)",
+                    [(cursor.lastrowid, topic, position) for position, topic in enumerate(topics)]
+                )
+        except sqlite3.IntegrityError as e:
+            raise DatabaseError(f"A subject named '{name}' already exists.") from e
+        except sqlite3.Error as e:
+            logger.error("Adding subject %r failed: %s", name, e)
+            raise DatabaseError(f"Could not save subject '{name}': {e}") from e
+
+    def delete_subject(self, user_id, subject_name):
+        self._execute("DELETE FROM subjects WHERE user_id = ? AND name = ?", (user_id, subject_name))
+
+    def update_progress(self, user_id, subject_name, progress):
+        return self._enqueue(
+            "UPDATE subjects SET progress = ? WHERE user_id = ? AND name = ?",
+            (int(progress), user_id, subject_name), user_id
+        )
+
+    def set_topic_completed(self, user_id, subject_name, topic, completed=True):
+        return self._enqueue('''
+            UPDATE topics SET completed = ?, completed_at = CASE WHEN ? THEN CURRENT_TIMESTAMP END
+            WHERE subject_id = (SELECT id FROM subjects WHERE user_id = ? AND name = ?) AND name = ?
+        ''', (int(completed), int(completed), user_id, subject_name, topic), user_id)
+
+    def _subject_filter(self, user_id, search):
+        if search:
+            return "user_id = ? AND name LIKE ? ESCAPE '\\'", (user_id, like_pattern(search))
+        return "user_id = ?", (user_id,)
+
+    def count_subjects(self, user_id, search=None):
+        self.flush(user_id)
+        where, params = self._subject_filter(user_id, search)
+        return self.conn.execute(f"SELECT COUNT(*) FROM subjects WHERE {where}", params).fetchone()[0]
+
+    def load_subjects(self, user_id, search=None, limit=-1, offset=0):
+        """Subjects in the shape the UI keeps in user_data['subjects'], soonest exam first.
+
+        Each carries its study totals from the rollups. search keeps subjects whose name contains it; limit and offset
+        select one page (the default is all of them).
+        """
+        self.flush(user_id)
+        where, params = self._subject_filter(user_id, search)
+        page = f"SELECT id FROM subjects WHERE {where} ORDER BY exam_date, id LIMIT ? OFFSET ?"
+        params += (limit, offset)
+        subjects = {}
+        rows = self.conn.execute(f'''
+            SELECT s.id, s.name, s.exam_date, s.difficulty, s.color, s.progress, s.created_at,
+                st.minutes, st.sessions, st.last_day
+            FROM subjects s LEFT JOIN subject_stats st ON st.subject_id = s.id
+            WHERE s.id IN ({page}) ORDER BY s.exam_date, s.id
+        ''', params)
+        for (subject_id, name, exam_date, difficulty, color, progress, created_at,
+             minutes, sessions, last_day) in rows:
+            subjects[subject_id] = {
+                'name': name,
+                'exam_date': exam_date,
+                'difficulty': difficulty,
+                'color': color,
+                'progress': progress,
+                'topics': [],
+                'completed_topics': [],
+                'added_date': (created_at or '')[:10],
+                'minutes_studied': minutes or 0,
+                'sessions': sessions or 0,
+                'last_studied': last_day,
+            }
+        topics = self.conn.execute(f'''
+            SELECT subject_id, name, completed FROM topics
+            WHERE subject_id IN ({page}) ORDER BY subject_id, position
+        ''', params)
+        for subject_id, name, completed in topics:
+            subject = subjects.get(subject_id)
+            if subject is None:
+                continue
+            subject['topics'].append(name)
+            if completed:
+                subject['completed_topics'].append(name)
+        return list(subjects.values())
+
+    # Study sessions
+    def log_event(self, user_id, subject_name, topic, kind, minutes=0, day=None):
+        """Append a 'start', 'stop', 'complete' or 'review' event; all but start carry the minutes studied.
+
+        day is the local date the event counts for (default today); the
+        rollups are updated in the same queued transaction.
+        """
+        return self._enqueue('''
+            INSERT INTO study_events (user_id, subject_id, topic, kind, minutes, day)
+            VALUES (?, (SELECT id FROM subjects WHERE user_id = ? AND name = ?), ?, ?, ?, ?)
+        ''', (user_id, user_id, subject_name, topic, kind, int(minutes), str(day or date.today())), user_id)
+
+    def load_study_stats(self, user_id, today=None, days=14):
+        """Totals, streaks and the last `days` days of planned vs. studied minutes, read from the rollups.
+
+        The current streak counts as broken once a whole day has passed
+        without studying.
+        """
+        self.flush(user_id)
+        today = today or date.today()
+        row = self.conn.execute(
+            "SELECT minutes, sessions, streak, best_streak, last_day FROM user_stats WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        minutes, sessions, streak, best_streak, last_day = row or (0, 0, 0, 0, None)
+        if last_day is None or last_day < str(today - timedelta(days=1)):
+            streak = 0
+        first = today - timedelta(days=days - 1)
+        rows = self.conn.execute('''
+            SELECT day, minutes, planned_minutes FROM daily_stats WHERE user_id = ? AND day BETWEEN ? AND ?
+        ''', (user_id, str(first), str(today)))
+        by_day = {day: (studied, planned) for day, studied, planned in rows}
+        daily = []
+        for offset in range(days):
+            day = str(first + timedelta(days=offset))
+            studied, planned = by_day.get(day, (0, 0))
+            daily.append({'day': day, 'minutes': studied, 'planned': planned})
+        return {
+            'minutes': minutes,
+            'sessions': sessions,
+            'streak': streak,
+            'best_streak': best_streak,
+            'last_day': last_day,
+            'daily': daily,
+        }
+
+    # Spaced repetition
+    def count_due_reviews(self, user_id, day=None):
+        self.flush(user_id)
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM reviews WHERE user_id = ? AND due <= ?", (user_id, str(day or date.today()))
+        ).fetchone()[0]
+
+    def load_due_reviews(self, user_id, day=None, subject=None, limit=-1):
+        """Reviews due on or before day, most overdue first.
+
+        One range scan of idx_reviews_due that stops after limit rows, so the
+        cost follows the reviews asked for, not the size of the deck.
+        """
+        self.flush(user_id)
+        condition, params = "", (user_id, str(day or date.today()))
+        if subject:
+            condition, params = " AND s.name = ?", params + (subject,)
+        rows = self.conn.execute(f'''
+            SELECT s.name, t.name, r.due, r.interval_days, r.repetitions
+            FROM reviews r JOIN topics t ON t.id = r.topic_id JOIN subjects s ON s.id = t.subject_id
+            WHERE r.user_id = ? AND r.due <= ?{condition}
+            ORDER BY r.due LIMIT ?
+        ''', params + (limit,))
+        return [
+            {'subject': subject_name, 'topic': topic, 'due': due, 'interval_days': interval_days,
+             'repetitions': repetitions}
+            for subject_name, topic, due, interval_days, repetitions in rows
+        ]
+
+    def record_review(self, user_id, subject_name, topic, quality, day=None):
+        """Apply a review graded quality (0-5) to the topic's schedule; returns the next due date."""
+        self.flush(user_id)
+        day = day or date.today()
+        row = self.conn.execute('''
+            SELECT r.topic_id, r.repetitions, r.interval_days, r.ease
+            FROM reviews r JOIN topics t ON t.id = r.topic_id JOIN subjects s ON s.id = t.subject_id
+            WHERE s.user_id = ? AND s.name = ? AND t.name = ?
+        ''', (user_id, subject_name, topic)).fetchone()
+        if row is None:
+            raise DatabaseError(f"'{topic}' has no review scheduled.")
+        topic_id, repetitions, interval_days, ease = row
+        repetitions, interval_days, ease = next_review(repetitions, interval_days, ease, quality)
+        due = due_date(interval_days, day)
+        self._execute('''
+            UPDATE reviews SET repetitions = ?, interval_days = ?, ease = ?, due = ?, last_reviewed = ?
+            WHERE topic_id = ?
+        ''', (repetitions, interval_days, ease, str(due), str(day), topic_id))
+        return due
+
+    # Documents and their chunks
+    def add_document(self, user_id, doc_hash, name, path, subject, size_bytes, chunk_count=0, shared=False):
+        return self._execute('''
+            INSERT INTO documents (user_id, doc_hash, name, path, subject, size_bytes, chunk_count, shared)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, doc_hash) DO UPDATE SET chunk_count = excluded.chunk_count
+        ''', (user_id, doc_hash, name, path, subject, size_bytes, chunk_count, int(shared))).lastrowid
+
+    def add_chunks(self, user_id, doc_hash, chunks):
+        """chunks: iterable of (vector_row, page, chunk_index)."""
+        self._execute('''
+            INSERT INTO chunks (document_id, vector_row, page, chunk_index)
+            SELECT id, ?, ?, ? FROM documents WHERE user_id = ? AND doc_hash = ?
+        ''', [(vector_row, page, index, user_id, doc_hash) for vector_row, page, index in chunks], many=True)
+
+    def set_document_chunks(self, user_id, doc_hash, chunk_count):
+        self._execute(
+            "UPDATE documents SET chunk_count = ? WHERE user_id = ? AND doc_hash = ?",
+            (chunk_count, user_id, doc_hash)
+        )
+
+    def delete_document(self, user_id, doc_hash):
+        self._execute("DELETE FROM documents WHERE user_id = ? AND doc_hash = ?", (user_id, doc_hash))
+
+    def has_document(self, user_id, doc_hash):
+        return self.conn.execute(
+            "SELECT 1 FROM documents WHERE user_id = ? AND doc_hash = ?", (user_id, doc_hash)
+        ).fetchone() is not None
+
+    def clear_chunks(self, user_id, doc_hash):
+        """Forget a document's chunks and suggested topics, e.g. before it is ingested again."""
+        try:
+            with self.conn:
+                for table in ('document_topics', 'chunks'):
+                    self.conn.execute(f'''
+                        DELETE FROM {table} WHERE document_id = (SELECT id FROM documents WHERE user_id = ? AND doc_hash = ?)
+                    ''', (user_id, doc_hash))
+        except sqlite3.Error as e:
+            logger.error("Clearing chunks of %s failed: %s", doc_hash, e)
+            raise DatabaseError(f"Could not save your changes: {e}") from e
+
+    def file_in_use(self, path):
+        """Whether any account still has a document stored at path."""
+        return self.conn.execute("SELECT 1 FROM documents WHERE path = ? LIMIT 1", (path,)).fetchone() is not None
+
+    def _visible_documents(self, columns, user_id, search, subject):
+        """SQL and parameters selecting columns of the documents user_id can see."""
+        condition, extra = "", ()
+        if search:
+            condition += " AND d.name LIKE ? ESCAPE '\\'"
+            extra += (like_pattern(search),)
+        if subject:
+            condition += " AND d.subject = ?"
+            extra += (subject,)
+        source = "FROM documents d LEFT JOIN jobs j ON j.document_id = d.id"
+        sql = f'''
+            SELECT {columns} {source} WHERE d.user_id = ?{condition}
+            UNION ALL
+            SELECT {columns} {source}
+            WHERE d.shared = 1 AND d.user_id != ? AND (j.status IS NULL OR j.status = 'done'){condition}
+        '''
+        return sql, (user_id,) + extra + (user_id,) + extra
+
+    def count_documents(self, user_id, search=None, subject=None):
+        self.flush(user_id)
+        sql, params = self._visible_documents("1", user_id, search, subject)
+        return self.conn.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+
+    def load_documents(self, user_id, search=None, subject=None, limit=-1, offset=0):
+        """The user's own documents plus everything shared with the whole cohort, oldest first.
+
+        Documents still being ingested carry their job's status and progress.
+        search (in the name) and subject filter the list; limit and offset
+        select one page.
+        """
+        self.flush(user_id)
+        sql, params = self._visible_documents('''
+            d.doc_hash, d.name, d.path, d.subject, d.size_bytes, d.chunk_count, d.uploaded_at, d.shared,
+            d.user_id, j.status, j.pages_done, j.pages_total, j.chunks_done, j.error
+        ''', user_id, search, subject)
+        rows = self.conn.execute(f"{sql} ORDER BY 7, 1 LIMIT ? OFFSET ?", params + (limit, offset))
+        documents = []
+        for (doc_hash, name, path, subject, size_bytes, chunk_count, uploaded_at, shared,
+             owner, status, pages_done, pages_total, chunks_done, error) in rows:
+            documents.append({
+                'name': name,
+                'doc_id': doc_hash,
+                'path': path,
+                'subject': subject,
+                'chunks': chunk_count if status in (None, 'done') else chunks_done,
+                'upload_date': (uploaded_at or '')[:16],
+                'size': f"{(size_bytes or 0) / 1024 / 1024:.2f} MB",
+                'shared': bool(shared),
+                'owned': owner == user_id,
+                'status': status or 'done',
+                'pages_done': pages_done or 0,
+                'pages_total': pages_total,
+                'error': error,
+            })
+        return documents
+
+    def has_unfinished_jobs(self, user_id):
+        self.flush(user_id)
+        return self.conn.execute('''
+            SELECT 1 FROM jobs j JOIN documents d ON d.id = j.document_id
+            WHERE j.status IN ('queued', 'running') AND d.user_id = ? LIMIT 1
+        ''', (user_id,)).fetchone() is not None
+
+    # Topics extracted from documents
+    def _visible_document_id(self, user_id, doc_hash):
+        # The user's own copy if they have one, else the shared one
+        row = self.conn.execute('''
+            SELECT id FROM documents WHERE doc_hash = ? AND (user_id = ? OR shared = 1)
+            ORDER BY user_id = ? DESC LIMIT 1
+        ''', (doc_hash, user_id, user_id)).fetchone()
+        return row[0] if row else None
+
+    def set_document_topics(self, user_id, doc_hash, topics):
+        """Replace a document's suggested topics: [{'name', 'source', 'chunks'}] with chunk indexes."""
+        try:
+            with self.conn:
+                row = self.conn.execute(
+                    "SELECT id FROM documents WHERE user_id = ? AND doc_hash = ?", (user_id, doc_hash)
+                ).fetchone()
+                if row is None:
+                    return
+                self.conn.execute("DELETE FROM document_topics WHERE document_id = ?", (row[0],))
+                self.conn.executemany('''
+                    INSERT OR IGNORE INTO document_topics (document_id, name, position, source, chunks)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [(row[0], topic['name'], position, topic['source'], json.dumps(topic['chunks']))
+                      for position, topic in enumerate(topics)])
+        except sqlite3.Error as e:
+            logger.error("Saving topics of %s failed: %s", doc_hash, e)
+            raise DatabaseError(f"Could not save the document's topics: {e}") from e
+
+    def load_document_topics(self, user_id, doc_hash):
+        """Topics suggested for a document the user can see, in document order."""
+        rows = self.conn.execute('''
+            SELECT name, source, json_array_length(chunks) FROM document_topics
+            WHERE document_id = ? ORDER BY position
+        ''', (self._visible_document_id(user_id, doc_hash),))
+        return [{'name': name, 'source': source, 'chunks': chunks} for name, source, chunks in rows]
+
+    def adopt_document_topics(self, user_id, doc_hash, subject_name, names):
+        """Add confirmed topic names to a subject and link each to the chunks it was extracted from.
+
+        Topics the subject already has keep their place and progress (and
+        are linked too); a name edited before confirming has no chunks to
+        link. Returns the names that were new to the subject.
+        """
+        try:
+            with self.conn:
+                row = self.conn.execute(
+                    "SELECT id FROM subjects WHERE user_id = ? AND name = ?", (user_id, subject_name)
+                ).fetchone()
+                if row is None:
+                    raise DatabaseError(f"Subject '{subject_name}' was not found.")
+                subject_id = row[0]
+                existing = {name for (name,) in self.conn.execute(
+                    "SELECT name FROM topics WHERE subject_id = ?", (subject_id,)
+                )}
+                added = [name for name in dict.fromkeys(names) if name not in existing]
+                start = self.conn.execute(
+                    "SELECT COALESCE(MAX(position) + 1, 0) FROM topics WHERE subject_id = ?", (subject_id,)
+                ).fetchone()[0]
+                self.conn.executemany(
+                    "INSERT INTO topics (subject_id, name, position) VALUES (?, ?, ?)",
+                    [(subject_id, name, start + offset) for offset, name in enumerate(added)]
+                )
+                self.conn.execute('''
+                    INSERT OR IGNORE INTO topic_chunks (topic_id, chunk_id)
+                    SELECT t.id, c.id
+                    FROM document_topics dt
+                    JOIN topics t ON t.subject_id = ? AND t.name = dt.name
+                    JOIN json_each(dt.chunks) j
+                    JOIN chunks c ON c.document_id = dt.document_id AND c.chunk_index = j.value
+                    WHERE dt.document_id = ? AND dt.name IN (SELECT value FROM json_each(?))
+                ''', (subject_id, self._visible_document_id(user_id, doc_hash), json.dumps(list(names))))
+        except sqlite3.Error as e:
+            logger.error("Adding topics to %r failed: %s", subject_name, e)
+            raise DatabaseError(f"Could not save topics for '{subject_name}': {e}") from e
+        return added
+
+    def load_topic_sources(self, user_id, topic, subject=None, limit=-1):
+        """(partition, vector_row) of the chunks linked to a topic, in reading order.
+
+        partition is None for shared documents and the owner's user id
+        otherwise, as RAGPipeline.get_chunks expects.
+        """
+        condition, params = "", (user_id, topic)
+        if subject:
+            condition, params = " AND s.name = ?", params + (subject,)
+        rows = self.conn.execute(f'''
+            SELECT CASE WHEN d.shared THEN NULL ELSE d.user_id END, c.vector_row
+            FROM subjects s JOIN topics t ON t.subject_id = s.id
+            JOIN topic_chunks tc ON tc.topic_id = t.id
+            JOIN chunks c ON c.id = tc.chunk_id JOIN documents d ON d.id = c.document_id
+            WHERE s.user_id = ? AND t.name = ?{condition}
+            ORDER BY d.id, c.chunk_index LIMIT ?
+        ''', params + (limit,))
+        # The same topic name can be linked to the same chunk under two subjects
+        return list(dict.fromkeys(rows))
+
+    # Ingestion jobs
+    def create_job(self, user_id, doc_hash):
+        """Queue (or re-queue) ingestion of a stored document; returns the job id."""
+        self._execute('''
+            INSERT INTO jobs (document_id)
+            SELECT id FROM documents WHERE user_id = ? AND doc_hash = ?
+            ON CONFLICT (document_id) DO UPDATE SET
+                status = 'queued', pages_done = 0, pages_total = NULL, chunks_done = 0, error = NULL,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (user_id, doc_hash))
+        row = self.conn.execute('''
+            SELECT j.id FROM jobs j JOIN documents d ON d.id = j.document_id
+            WHERE d.user_id = ? AND d.doc_hash = ?
+        ''', (user_id, doc_hash)).fetchone()
+        if row is None:
+            raise DatabaseError("The document to process was not found.")
+        return row[0]
+
+    def update_job_progress(self, job_id, pages_done=None, pages_total=None, chunks_done=None):
+        # Progress ticks are frequent and expendable, so they go through the write queue
+        return self._enqueue('''
+            UPDATE jobs SET pages_done = COALESCE(?, pages_done), pages_total = COALESCE(?, pages_total),
+                chunks_done = COALESCE(?, chunks_done), updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (pages_done, pages_total, chunks_done, job_id))
+
+    def set_job_status(self, job_id, status, error=None):
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (status, error, job_id)
+        )
+
+    def load_unfinished_jobs(self):
+        rows = self.conn.execute('''
+            SELECT j.id, j.status, d.user_id, d.doc_hash, d.name, d.path, d.subject, d.shared
+            FROM jobs j JOIN documents d ON d.id = j.document_id
+            WHERE j.status IN ('queued', 'running') ORDER BY j.id
+        ''')
+        return [
+            {'id': job_id, 'status': status, 'user_id': user_id, 'doc_hash': doc_hash, 'name': name,
+             'path': path, 'subject': subject, 'shared': bool(shared)}
+            for job_id, status, user_id, doc_hash, name, path, subject, shared in rows
+        ]
+
+    # Calendar
+    def replace_busy_blocks(self, user_id, blocks):
+        """Swap the user's imported calendar for blocks, (start, end, summary) with datetimes."""
+        try:
+            with self.conn:
+                self.conn.execute("DELETE FROM busy_blocks WHERE user_id = ?", (user_id,))
+                self.conn.executemany(
+                    "INSERT INTO busy_blocks (user_id, starts_at, ends_at, summary) VALUES (?, ?, ?, ?)",
+                    [(user_id, start.isoformat(' '), end.isoformat(' '), summary) for start, end, summary in blocks]
+                )
+        except sqlite3.Error as e:
+            logger.error("Calendar import failed: %s", e)
+            raise DatabaseError(f"Could not save your calendar: {e}") from e
+
+    def count_busy_blocks(self, user_id):
+        return self.conn.execute("SELECT COUNT(*) FROM busy_blocks WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def load_busy_blocks(self, user_id, start, end):
+        """(start, end, summary) of the busy blocks overlapping [start, end), by start."""
+        rows = self.conn.execute('''
+            SELECT starts_at, ends_at, summary FROM busy_blocks
+            WHERE user_id = ? AND starts_at < ? AND ends_at > ? ORDER BY starts_at
+        ''', (user_id, end.isoformat(' '), start.isoformat(' ')))
+        return [(datetime.fromisoformat(s), datetime.fromisoformat(e), summary) for s, e, summary in rows]
+
+    # Plans and preferences
+    def save_plan(self, user_id, plan_date, kind, tasks, settings=None):
+        # A daily plan's planned minutes count the completions still in the write queue
+        self.flush(user_id)
+        self._execute('''
+            INSERT INTO plans (user_id, plan_date, kind, settings, tasks) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, kind, plan_date) DO UPDATE SET
+                settings = excluded.settings, tasks = excluded.tasks, created_at = CURRENT_TIMESTAMP
+        ''', (user_id, str(plan_date), kind, json.dumps(settings), json.dumps(tasks, default=str)))
+
+    def load_plan(self, user_id, plan_date, kind):
+        """Returns (tasks, settings), or None if nothing was saved for that day."""
+        row = self.conn.execute(
+            "SELECT tasks, settings FROM plans WHERE user_id = ? AND kind = ? AND plan_date = ?",
+            (user_id, kind, str(plan_date))
+        ).fetchone()
+        return (json.loads(row[0]), json.loads(row[1])) if row else None
+
+    def load_latest_plan(self, user_id, kind):
+        """Returns (plan_date, tasks, settings) of the newest plan of this kind, or None."""
+        row = self.conn.execute('''
+            SELECT plan_date, tasks, settings FROM plans WHERE user_id = ? AND kind = ?
+            ORDER BY plan_date DESC LIMIT 1
+        ''', (user_id, kind)).fetchone()
+        return (row[0], json.loads(row[1]), json.loads(row[2])) if row else None
+
+    def delete_plans(self, user_id, kind):
+        self._execute("DELETE FROM plans WHERE user_id = ? AND kind = ?", (user_id, kind))
+
+    def save_preferences(self, user_id, preferences):
+        self._execute(
+            "INSERT OR REPLACE INTO preferences (user_id, key, value) VALUES (?, ?, ?)",
+            [(user_id, key, json.dumps(value)) for key, value in preferences.items()], many=True
+        )
+
+    def load_preferences(self, user_id):
+        rows = self.conn.execute("SELECT key, value FROM preferences WHERE user_id = ?", (user_id,))
+        return {key: json.loads(value) for key, value in rows}
@@ -0,0 +1,208 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+EMBEDDING_DIM = 256
+EMBEDDING_BATCH_SIZE = 64
+# Query vectors kept in memory; queries are never written to the disk cache,
+# which would otherwise grow with traffic instead of with the corpus
+QUERY_CACHE_SIZE = 512
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _features(text):
+    # Word unigrams plus character trigrams inside each word, so that
+    # "network" and "networks" still land close together
+    for word in _TOKEN_RE.findall(text.lower()):
+        yield word
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            yield padded[i:i + 3]
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def embed_texts(texts, dim=EMBEDDING_DIM):
+    """Deterministic hashed n-gram embeddings, L2-normalised (one row per text)."""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for feature in _features(text):
+            h = zlib.crc32(feature.encode('utf-8'))
+            # Signed hashing trick: the top bit picks the sign
+            vectors[row, h % dim] += 1.0 if h & 0x80000000 else -1.0
+    return _normalize(vectors)
+
+
+class HashingEmbeddingBackend:
+    """Offline backend: hashed word and character n-grams, no model download or network."""
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts):
+        return embed_texts(texts, self.dim)
+
+
+class GeminiEmbeddingBackend:
+    """Google Gemini embeddings; the API accepts up to 100 texts per call."""
+
+    max_batch_size = 100
+
+    def __init__(self, api_key=None, model="models/text-embedding-004", dim=768):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+        self._genai = genai
+        self.model = model
+        self.dim = dim
+        self.name = f"gemini-{model.split('/')[-1]}"
+
+    def embed(self, texts):
+        result = self._genai.embed_content(
+            model=self.model, content=list(texts), task_type="retrieval_document"
+        )
+        return _normalize(np.asarray(result['embedding'], dtype=np.float32))
+
+
+def get_embedding_backend(name=None):
+    """Pick a backend by name ("local" or "gemini"); defaults to $EMBEDDING_BACKEND or local."""
+    name = (name or os.getenv("EMBEDDING_BACKEND", "local")).lower()
+    if name == "local":
+        return HashingEmbeddingBackend()
+    if name == "gemini":
+        return GeminiEmbeddingBackend()
+    raise ValueError(f"Unknown embedding backend: {name}")
+
+
+def text_key(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """Vectors on disk in SQLite, keyed by (backend name, text hash)."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # Ingestion worker processes write to the same cache file
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT,
+                key BLOB,
+                vector BLOB,
+                PRIMARY KEY (model, key)
+            )
+        ''')
+        self.conn.commit()
+
+    def get_many(self, model, keys):
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                    [model, *part]
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model, items):
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, vector) VALUES (?, ?, ?)",
+                [(model, key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+            )
+            self.conn.commit()
+
+
+class EmbeddingService:
+    """Batches texts for the backend and caches every vector it computes.
+
+    Identical texts within a call are embedded once, cached texts are not
+    sent to the backend at all, and the rest go out in batch_size groups.
+    Chunk vectors go to the disk cache; query vectors only to a bounded
+    in-memory LRU.
+    """
+
+    def __init__(self, backend=None, cache_path=None, batch_size=EMBEDDING_BATCH_SIZE):
+        self.backend = backend or get_embedding_backend()
+        self.cache = EmbeddingCache(cache_path) if cache_path else None
+        self.batch_size = min(batch_size, getattr(self.backend, 'max_batch_size', batch_size))
+        self.stats = {'requested': 0, 'cache_hits': 0, 'computed': 0, 'backend_calls': 0}
+        self._queries = OrderedDict()
+        self._query_lock = threading.Lock()
+
+    @property
+    def dim(self):
+        return self.backend.dim
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    def embed(self, texts):
+        texts = list(texts)
+        self.stats['requested'] += len(texts)
+        vectors = np.empty((len(texts), self.dim), dtype=np.float32)
+        if not texts:
+            return vectors
+
+        keys = [text_key(text) for text in texts]
+        positions = {}
+        for i, key in enumerate(keys):
+            positions.setdefault(key, []).append(i)
+
+        cached = self.cache.get_many(self.name, list(positions)) if self.cache else {}
+        self.stats['cache_hits'] += len(cached)
+        for key, vector in cached.items():
+            vectors[positions[key]] = vector
+
+        missing = [key for key in positions if key not in cached]
+        for start in range(0, len(missing), self.batch_size):
+            batch_keys = missing[start:start + self.batch_size]
+            batch_vectors = self.backend.embed([texts[positions[key][0]] for key in batch_keys])
+            self.stats['backend_calls'] += 1
+            self.stats['computed'] += len(batch_keys)
+            for key, vector in zip(batch_keys, batch_vectors):
+                vectors[positions[key]] = vector
+            if self.cache:
+                self.cache.put_many(self.name, zip(batch_keys, batch_vectors))
+        return vectors
+
+    def embed_query(self, text):
+        key = text_key(text)
+        self.stats['requested'] += 1
+        with self._query_lock:
+            vector = self._queries.get(key)
+            if vector is not None:
+                self._queries.move_to_end(key)
+                self.stats['cache_hits'] += 1
+                return vector
+        vector = np.asarray(self.backend.embed([text])[0], dtype=np.float32)
+        self.stats['backend_calls'] += 1
+        self.stats['computed'] += 1
+        with self._query_lock:
+            self._queries[key] = vector
+            while len(self._queries) > QUERY_CACHE_SIZE:
+                self._queries.popitem(last=False)
+        return vector
@@ -0,0 +1,413 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from modules.database import DatabaseError
+from modules.embeddings import EmbeddingService, get_embedding_backend
+from modules.rag_pipeline import BATCH_SIZE, SUPPORTED_EXTENSIONS, batched, count_pages, iter_chunks
+from modules.topic_extraction import TopicExtractor
+from utils.helpers import save_stream_by_hash
+
+logger = logging.getLogger(__name__)
+
+# Worker processes parsing and embedding documents at the same time
+MAX_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# Embedded batches waiting to be stored; workers pause when this many are pending
+MAX_PENDING_BATCHES = 32
+# Chunks of finished documents collected before one append to the index in a bulk import
+BULK_BATCH_CHUNKS = 4096
+
+# Set in each worker process by _init_worker
+_results = None
+# Loaded once per worker process and reused for every document it handles
+_embedder = None
+
+
+def _init_worker(results):
+    global _results
+    _results = results
+
+
+def _worker_embedder(cache_path, model):
+    global _embedder
+    if _embedder is None:
+        _embedder = EmbeddingService(get_embedding_backend(), cache_path=cache_path)
+    if _embedder.name != model:
+        raise RuntimeError(f"Worker embeds with {_embedder.name} but the index uses {model}")
+    return _embedder
+
+
+def ingest_worker(job_id, file_path, subject, source, chunk_size, chunk_overlap, cache_path, model):
+    """Runs in a worker process: parse, chunk and embed one document.
+
+    Batches are sent back to the parent, which owns the vector store, as
+    ('batch', job_id, chunks, vectors, page) messages, followed by the
+    suggested topics as ('topics', job_id, topics).
+    """
+    try:
+        embedder = _worker_embedder(cache_path, model)
+        _results.put(('pages', job_id, count_pages(file_path)))
+        topics = TopicExtractor()
+        chunks = iter_chunks(file_path, subject, chunk_size, chunk_overlap, source=source, topics=topics)
+        for batch in batched(chunks, BATCH_SIZE):
+            vectors = embedder.embed([chunk['text'] for chunk in batch])
+            _results.put(('batch', job_id, batch, vectors, batch[-1]['metadata']['page']))
+        _results.put(('topics', job_id, topics.topics()))
+        _results.put(('done', job_id))
+    except Exception as e:
+        _results.put(('error', job_id, f"{type(e).__name__}: {e}"))
+
+
+def parse_worker(file_path, subject, source, chunk_size, chunk_overlap, cache_path, model):
+    """Runs in a worker process: parse, chunk and embed a whole document for bulk_import.
+
+    Returns (pages, chunks, vectors, topics).
+    """
+    embedder = _worker_embedder(cache_path, model)
+    topics = TopicExtractor()
+    chunks = list(iter_chunks(file_path, subject, chunk_size, chunk_overlap, source=source, topics=topics))
+    if chunks:
+        vectors = embedder.embed([chunk['text'] for chunk in chunks])
+    else:
+        vectors = np.empty((0, embedder.dim), dtype=np.float32)
+    pages = count_pages(file_path) or max((chunk['metadata']['page'] for chunk in chunks), default=0)
+    return pages, chunks, vectors, topics.topics()
+
+
+def _is_supported(name):
+    return os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS
+
+
+def stage_files(sources, upload_dir):
+    """Copy every supported document in sources into upload_dir under its content hash.
+
+    A source is a folder (searched recursively), a zip archive, a single
+    file, or an uploaded file object with a name (zips included). Zip
+    members are streamed out without extracting the archive. Returns
+    [(name, doc_hash, path)], with repeated content listed once.
+    """
+    staged = {}
+
+    def stage(name, stream):
+        doc_hash, path = save_stream_by_hash(stream, upload_dir, os.path.splitext(name)[1])
+        staged.setdefault(doc_hash, (name, doc_hash, path))
+
+    def stage_zip(archive):
+        with zipfile.ZipFile(archive) as zf:
+            for member in zf.infolist():
+                if not member.is_dir() and _is_supported(member.filename):
+                    with zf.open(member) as stream:
+                        stage(os.path.basename(member.filename), stream)
+
+    for source in sources:
+        if not isinstance(source, (str, os.PathLike)):
+            source.seek(0)
+            if source.name.lower().endswith('.zip'):
+                stage_zip(source)
+            elif _is_supported(source.name):
+                stage(source.name, source)
+        elif os.path.isdir(source):
+            for root, dirs, names in os.walk(source):
+                dirs.sort()
+                for name in sorted(names):
+                    if _is_supported(name):
+                        with open(os.path.join(root, name), 'rb') as stream:
+                            stage(name, stream)
+        elif zipfile.is_zipfile(source):
+            stage_zip(source)
+        elif _is_supported(source):
+            with open(source, 'rb') as stream:
+                stage(os.path.basename(source), stream)
+    return list(staged.values())
+
+
+def bulk_import(db, rag, files, user_id, subject, shared=False, executor=None,
+                max_workers=MAX_WORKERS, batch_chunks=BULK_BATCH_CHUNKS, on_progress=None):
+    """Index files staged by stage_files, parsing documents in parallel.
+
+    Each worker returns a whole embedded document and finished documents
+    are appended to the index together once batch_chunks chunks have
+    collected, so a course pack costs a handful of large appends. Every
+    file gets a job row, so the document list shows it and an interrupted
+    import is resumed like any upload. Files already in the library are
+    skipped. Returns the stats dict, which on_progress(stats) also
+    receives after each document.
+    """
+    partition = None if shared else user_id
+    stats = {'files': len(files), 'done': 0, 'skipped': 0, 'failed': 0, 'pages': 0, 'chunks': 0,
+             'seconds': 0.0, 'pages_per_second': 0.0, 'chunks_per_second': 0.0, 'errors': []}
+    started = time.perf_counter()
+
+    def report():
+        stats['seconds'] = time.perf_counter() - started
+        if stats['seconds'] > 0:
+            stats['pages_per_second'] = stats['pages'] / stats['seconds']
+            stats['chunks_per_second'] = stats['chunks'] / stats['seconds']
+        if on_progress is not None:
+            on_progress(stats)
+
+    jobs = []
+    for name, doc_hash, path in files:
+        if db.has_document(user_id, doc_hash) or not rag.start_document(doc_hash, partition):
+            stats['skipped'] += 1
+            continue
+        db.add_document(user_id, doc_hash, name, path, subject, os.path.getsize(path), shared=shared)
+        jobs.append({'id': db.create_job(user_id, doc_hash), 'doc_hash': doc_hash, 'name': name, 'path': path})
+    unfinished = {job['doc_hash'] for job in jobs}
+
+    def finish(job, error=None):
+        unfinished.discard(job['doc_hash'])
+        if error is None:
+            rag.finish_document(job['doc_hash'], subject, partition)
+            db.set_job_status(job['id'], 'done')
+            stats['done'] += 1
+        else:
+            rag.finish_document(job['doc_hash'], subject, partition, failed=True)
+            db.clear_chunks(user_id, job['doc_hash'])
+            db.set_job_status(job['id'], 'failed', error)
+            stats['failed'] += 1
+            stats['errors'].append(f"{job['name']}: {error}")
+
+    def append(pending):
+        chunks = [chunk for _, _, doc_chunks, _, _ in pending for chunk in doc_chunks]
+        if chunks:
+            doc_ids = [job['doc_hash'] for job, _, doc_chunks, _, _ in pending for _ in doc_chunks]
+            vectors = np.concatenate([vectors for _, _, _, vectors, _ in pending])
+            rows = iter(rag.append_batch(doc_ids, chunks, vectors, partition))
+        for job, pages, doc_chunks, _, topics in pending:
+            db.add_chunks(user_id, job['doc_hash'], [
+                (next(rows), chunk['metadata']['page'], chunk['metadata']['chunk_index'])
+                for chunk in doc_chunks
+            ])
+            db.set_document_topics(user_id, job['doc_hash'], topics)
+            db.set_document_chunks(user_id, job['doc_hash'], len(doc_chunks))
+            db.update_job_progress(job['id'], pages_done=pages, pages_total=pages, chunks_done=len(doc_chunks))
+            finish(job)
+            stats['pages'] += pages
+            stats['chunks'] += len(doc_chunks)
+        pending.clear()
+
+    own_executor = executor is None
+    if own_executor and jobs:
+        executor = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context('spawn'))
+    pending = []
+    pending_chunks = 0
+    try:
+        cache_path = os.path.join(rag.store_dir, "embedding_cache.db")
+        futures = {}
+        for job in jobs:
+            futures[executor.submit(
+                parse_worker, job['path'], subject, job['name'],
+                rag.chunk_size, rag.chunk_overlap, cache_path, rag.embedder.name
+            )] = job
+            db.set_job_status(job['id'], 'running')
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                pages, chunks, vectors, topics = future.result()
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                finish(job, f"{type(e).__name__}: {e}")
+            else:
+                pending.append((job, pages, chunks, vectors, topics))
+                pending_chunks += len(chunks)
+                if pending_chunks >= batch_chunks:
+                    append(pending)
+                    pending_chunks = 0
+            report()
+        append(pending)
+    finally:
+        for job in jobs:
+            if job['doc_hash'] in unfinished:
+                finish(job, "Import was interrupted.")
+        if own_executor and jobs:
+            executor.shutdown(wait=False, cancel_futures=True)
+    report()
+    return stats
+
+
+class IngestionService:
+    """Processes uploaded documents in the background.
+
+    Jobs are rows in the database's jobs table, so they survive restarts:
+    on startup anything queued or interrupted mid-way is started again.
+    Parsing, chunking and embedding happen in a process pool (one document
+    per worker, so several uploads use several cores); a single thread in
+    this process stores the embedded batches, because the vector store and
+    BM25 index are owned by this process.
+    """
+
+    def __init__(self, db, rag, max_workers=MAX_WORKERS):
+        self.db = db
+        self.rag = rag
+        self.max_workers = max_workers
+        self._context = multiprocessing.get_context('spawn')
+        self._results = self._context.Queue(MAX_PENDING_BATCHES)
+        self._pool = None
+        self._jobs = {}
+        self._lock = threading.RLock()
+        self._consumer = threading.Thread(target=self._consume, name="ingestion-results", daemon=True)
+        self._consumer.start()
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                self.max_workers, mp_context=self._context,
+                initializer=_init_worker, initargs=(self._results,)
+            )
+        return self._pool
+
+    def _discard_pool(self, pool):
+        # A broken pool cannot run anything again; the next job starts a fresh one
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, user_id, doc_hash, path, name, subject, shared=False):
+        """Queue a document already recorded with db.add_document; returns the job id."""
+        job_id = self.db.create_job(user_id, doc_hash)
+        self._start({'id': job_id, 'user_id': user_id, 'doc_hash': doc_hash, 'path': path,
+                     'name': name, 'subject': subject, 'shared': shared})
+        return job_id
+
+    def import_files(self, user_id, files, subject, shared=False):
+        """Run bulk_import for staged files on a background thread, sharing the worker pool.
+
+        Returns a stats dict that is updated as the import progresses and
+        gets 'finished' set to True at the end.
+        """
+        live = {'files': len(files), 'done': 0, 'skipped': 0, 'failed': 0, 'pages': 0, 'chunks': 0,
+                'seconds': 0.0, 'pages_per_second': 0.0, 'chunks_per_second': 0.0, 'errors': [],
+                'finished': False}
+
+        def run():
+            executor = self._executor()
+            try:
+                bulk_import(self.db, self.rag, files, user_id, subject, shared,
+                            executor=executor, on_progress=live.update)
+            except Exception as e:
+                logger.exception("Bulk import failed")
+                if isinstance(e, BrokenProcessPool):
+                    self._discard_pool(executor)
+                live['errors'].append(f"Import stopped: {type(e).__name__}: {e}")
+            finally:
+                live['finished'] = True
+
+        threading.Thread(target=run, name="bulk-import", daemon=True).start()
+        return live
+
+    def resume(self):
+        """Restart jobs left queued or running by a previous run of the app."""
+        jobs = self.db.load_unfinished_jobs()
+        for job in jobs:
+            if job['status'] == 'running':
+                # Whatever the interrupted run stored is incomplete; start over
+                self.rag.partition(None if job['shared'] else job['user_id']).vector_store.delete_document(job['doc_hash'])
+                self.db.clear_chunks(job['user_id'], job['doc_hash'])
+            self._start(job)
+        return len(jobs)
+
+    def _start(self, job):
+        job = dict(job, partition=None if job['shared'] else job['user_id'], chunks=0)
+        if not os.path.exists(job['path']):
+            self.db.set_job_status(job['id'], 'failed', "The uploaded file is missing.")
+            return
+        if not self.rag.start_document(job['doc_hash'], job['partition']):
+            # Already indexed, e.g. finished just before a restart
+            self.db.set_job_status(job['id'], 'done')
+            return
+        with self._lock:
+            self._jobs[job['id']] = job
+        try:
+            executor = self._executor()
+            future = executor.submit(
+                ingest_worker, job['id'], job['path'], job['subject'], job['name'],
+                self.rag.chunk_size, self.rag.chunk_overlap,
+                os.path.join(self.rag.store_dir, "embedding_cache.db"), self.rag.embedder.name
+            )
+        except Exception as e:
+            self._fail(job['id'], f"Could not start processing: {e}")
+            return
+        future.add_done_callback(lambda f, job_id=job['id']: self._worker_finished(job_id, executor, f))
+
+    def _worker_finished(self, job_id, executor, future):
+        # A worker that died (killed, out of memory) never sends 'error' itself
+        if future.cancelled() or future.exception() is None:
+            return
+        self._discard_pool(executor)
+        self._results.put(('error', job_id, f"Worker crashed: {future.exception()}"))
+
+    def cancel(self, user_id, doc_hash):
+        """Stop tracking a document's job; batches still in flight are discarded."""
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job['user_id'] == user_id and job['doc_hash'] == doc_hash:
+                    del self._jobs[job_id]
+                    self.rag.finish_document(doc_hash, job['subject'], job['partition'], failed=True)
+
+    def active_jobs(self):
+        with self._lock:
+            return len(self._jobs)
+
+    def _consume(self):
+        while True:
+            message = self._results.get()
+            try:
+                with self._lock:
+                    self._handle(message)
+            except Exception as e:
+                logger.exception("Ingestion job %s failed", message[1])
+                self._fail(message[1], str(e))
+
+    def _handle(self, message):
+        kind, job_id = message[0], message[1]
+        job = self._jobs.get(job_id)
+        if job is None:
+            return  # cancelled, or already failed
+        if kind == 'pages':
+            self.db.set_job_status(job_id, 'running')
+            self.db.update_job_progress(job_id, pages_total=message[2])
+        elif kind == 'batch':
+            _, _, chunks, vectors, page = message
+            rows = self.rag.append_batch(job['doc_hash'], chunks, vectors, job['partition'])
+            self.db.add_chunks(job['user_id'], job['doc_hash'], [
+                (row, chunk['metadata']['page'], chunk['metadata']['chunk_index'])
+                for row, chunk in zip(rows, chunks)
+            ])
+            job['chunks'] += len(chunks)
+            self.db.update_job_progress(job_id, pages_done=page, chunks_done=job['chunks'])
+        elif kind == 'topics':
+            self.db.set_document_topics(job['user_id'], job['doc_hash'], message[2])
+        elif kind == 'done':
+            del self._jobs[job_id]
+            self.rag.finish_document(job['doc_hash'], job['subject'], job['partition'])
+            self.db.set_document_chunks(job['user_id'], job['doc_hash'], job['chunks'])
+            self.db.update_job_progress(job_id, chunks_done=job['chunks'])
+            self.db.set_job_status(job_id, 'done')
+        elif kind == 'error':
+            self._fail(job_id, message[2])
+
+    def _fail(self, job_id, error):
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        try:
+            if job is not None:
+                self.rag.finish_document(job['doc_hash'], job['subject'], job['partition'], failed=True)
+                self.db.clear_chunks(job['user_id'], job['doc_hash'])
+            self.db.set_job_status(job_id, 'failed', error)
+        except DatabaseError:
+            logger.exception("Could not record the failure of ingestion job %s", job_id)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
@@ -0,0 +1,91 @@
+import os
+import re
+import time
+
+# Used by the offline model when none of the user's materials match
+FALLBACK_EXPLANATIONS = {
+    "machine learning": "Machine Learning is a subset of artificial intelligence that enables computers to learn and make decisions from data without being explicitly programmed. It's like teaching computers to recognize patterns and make predictions.",
+    "neural networks": "Neural Networks are computing systems inspired by the human brain. They consist of interconnected nodes (neurons) that process information and learn to perform tasks by analyzing examples.",
+    "database systems": "Database Systems are organized collections of data that allow efficient storage, retrieval, and manipulation of information. They use structured query language (SQL) for operations.",
+    "linear algebra": "Linear Algebra is the branch of mathematics concerning linear equations, linear functions, and their representations through matrices and vector spaces.",
+    "calculus": "Calculus is the mathematical study of continuous change, dealing with derivatives (rates of change) and integrals (accumulation of quantities)."
+}
+
+DEPTH_INSTRUCTIONS = {
+    'Simple': "Explain it simply in one or two short paragraphs, as to a beginner.",
+    'Detailed': "Give a detailed explanation with the key ideas and a worked example.",
+    'Comprehensive': "Give a comprehensive explanation: definitions, intuition, key results, examples and common pitfalls.",
+}
+
+_TOKEN_RE = re.compile(r"\S+\s*|\s+")
+
+
+def build_prompt(topic, depth, context):
+    instruction = DEPTH_INSTRUCTIONS.get(depth, DEPTH_INSTRUCTIONS['Detailed'])
+    lines = [
+        "You are a patient study assistant helping a student prepare for exams.",
+        f"Topic: {topic}",
+        instruction,
+    ]
+    if context:
+        lines.append("Base your answer on these excerpts from the student's own materials "
+                     "and cite them as (source, page):")
+        for part in context:
+            lines.append(f"[{part['source']}, page {part['page']}] {part['text']}")
+    else:
+        lines.append("None of the student's uploaded materials cover this topic; answer from general knowledge.")
+    return "\n\n".join(lines)
+
+
+class GeminiLLM:
+    def __init__(self, api_key=None, model="gemini-1.5-flash"):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+        self.model = genai.GenerativeModel(model)
+
+    def stream(self, topic, depth, context):
+        response = self.model.generate_content(build_prompt(topic, depth, context), stream=True)
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeLLM:
+    """Offline stand-in: streams an answer stitched from the retrieved excerpts.
+
+    token_delay (seconds) simulates generation speed when testing the UI.
+    """
+
+    def __init__(self, token_delay=0.0):
+        self.token_delay = token_delay
+
+    def answer(self, topic, depth, context):
+        if not context:
+            return FALLBACK_EXPLANATIONS.get(topic.lower(), f"This is a comprehensive explanation for '{topic}'. In a full implementation, AI would analyze your study materials to provide personalized insights and examples.")
+        lines = [f"**From your study materials on _{topic}_:**", ""]
+        for part in context:
+            lines.append(f"> {part['text']}")
+            lines.append(f"> — *{part['source']}, page {part['page']}*")
+            lines.append("")
+        return "\n".join(lines)
+
+    def stream(self, topic, depth, context):
+        for token in _TOKEN_RE.findall(self.answer(topic, depth, context)):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield token
+
+
+def get_llm(name=None):
+    """Pick a model by name ("local" or "gemini").
+
+    Defaults to $LLM_BACKEND, or Gemini when GEMINI_API_KEY is set.
+    """
+    default = "gemini" if os.getenv("GEMINI_API_KEY") else "local"
+    name = (name or os.getenv("LLM_BACKEND", default)).lower()
+    if name == "local":
+        return FakeLLM()
+    if name == "gemini":
+        return GeminiLLM()
+    raise ValueError(f"Unknown LLM backend: {name}")
@@ -0,0 +1,431 @@
+import asyncio
+import hashlib
+import os
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from modules.answer_cache import AnswerCache
+from modules.embeddings import EmbeddingService
+from modules.llm import get_llm
+from modules.retrieval import HybridRetriever
+from modules.vector_store import VectorStore
+from utils.helpers import sha256_file
+
+# Chunking settings (characters)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 150
+# TXT/DOCX have no real pages, so they are streamed in pseudo-pages of this size
+PAGE_CHARS = 4000
+# Number of chunks embedded and appended to the index at once
+BATCH_SIZE = 64
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt', '.docx')
+
+# Study Assistant "Depth" -> number of chunks retrieved and context size (characters)
+DEPTH_SETTINGS = {
+    'Simple': {'k': 3, 'context_chars': 1500},
+    'Detailed': {'k': 6, 'context_chars': 4000},
+    'Comprehensive': {'k': 10, 'context_chars': 8000},
+}
+# Hybrid scores below this are treated as "nothing relevant in your materials"
+MIN_RELEVANCE = 0.1
+
+_WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+# Document loaders: each yields (page_number, text) one page at a time
+def iter_pages(file_path):
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.pdf':
+        return _iter_pdf_pages(file_path)
+    if ext == '.txt':
+        return _iter_text_pages(file_path)
+    if ext == '.docx':
+        return _iter_docx_pages(file_path)
+    raise ValueError(f"Unsupported file type: {ext or file_path}")
+
+
+def _iter_pdf_pages(file_path):
+    from pypdf import PdfReader
+
+    with open(file_path, 'rb') as f:
+        reader = PdfReader(f)
+        for page_number, page in enumerate(reader.pages, 1):
+            yield page_number, page.extract_text() or ""
+
+
+def _iter_text_pages(file_path):
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        page_number = 0
+        while True:
+            block = f.read(PAGE_CHARS)
+            if not block:
+                break
+            page_number += 1
+            yield page_number, block
+
+
+def _iter_docx_pages(file_path):
+    # Stream word/document.xml instead of loading the whole document tree
+    page_number = 1
+    parts = []
+    size = 0
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open('word/document.xml') as xml_file:
+            for event, elem in ET.iterparse(xml_file, events=('end',)):
+                if elem.tag != _WORD_NS + 'p':
+                    continue
+                text = "".join(t.text or "" for t in elem.iter(_WORD_NS + 't'))
+                page_break = any(
+                    br.get(_WORD_NS + 'type') == 'page' for br in elem.iter(_WORD_NS + 'br')
+                ) or elem.find(f'.//{_WORD_NS}lastRenderedPageBreak') is not None
+                elem.clear()
+                if text:
+                    parts.append(text)
+                    size += len(text)
+                if (page_break or size >= PAGE_CHARS) and parts:
+                    yield page_number, "\n".join(parts)
+                    page_number += 1
+                    parts = []
+                    size = 0
+    if parts:
+        yield page_number, "\n".join(parts)
+
+
+def count_pages(file_path):
+    """Number of pages iter_pages will yield, or None when it can't be known cheaply."""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.pdf':
+        from pypdf import PdfReader
+
+        with open(file_path, 'rb') as f:
+            return len(PdfReader(f).pages)
+    if ext == '.txt':
+        # Bytes, not characters, so this is an upper bound for non-ASCII text
+        return max(1, -(-os.path.getsize(file_path) // PAGE_CHARS))
+    return None
+
+
+def _split_point(text, limit, min_cut=0):
+    # Prefer ending a chunk on a sentence, then on a word boundary; never at or before min_cut,
+    # so a chunk always gets past the part the next one repeats
+    window = text[:limit]
+    sentence_end = max(window.rfind('. '), window.rfind('? '), window.rfind('! '))
+    if sentence_end >= max(limit * 0.6, min_cut):
+        return sentence_end + 1
+    space = window.rfind(' ', min_cut + 1)
+    if space > 0:
+        return space
+    return limit
+
+
+def chunk_pages(pages, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Yield (page_number, chunk_text) from a stream of pages.
+
+    Only the current page and the unfinished chunk are kept in memory.
+    """
+    buffer = ""
+    marks = []  # (offset in buffer, page number) where each page starts
+    for page_number, text in pages:
+        text = " ".join(text.split())
+        if not text:
+            continue
+        if buffer:
+            buffer += " "
+        marks.append((len(buffer), page_number))
+        buffer += text
+
+        while len(buffer) >= chunk_size:
+            cut = _split_point(buffer, chunk_size, overlap)
+            chunk = buffer[:cut].strip()
+            if chunk:
+                yield marks[0][1], chunk
+
+            # Without room for an overlap the next chunk starts at the cut, so the buffer always shrinks
+            start = cut - overlap if cut > overlap else cut
+            space = buffer.find(' ', start, cut)
+            start = space + 1 if space != -1 else cut
+            buffer = buffer[start:]
+            marks = [(max(offset - start, 0), page) for offset, page in marks]
+            # Drop page marks that now lie entirely before the buffer start
+            while len(marks) > 1 and marks[1][0] == 0:
+                marks.pop(0)
+
+    if buffer.strip():
+        yield marks[0][1], buffer.strip()
+
+
+def iter_chunks(file_path, subject, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, source=None, topics=None):
+    """Yield chunk dicts for a document, streaming it page by page.
+
+    topics, a TopicExtractor, is shown every page and chunk on the way
+    through, so topics come out of the same single read of the file.
+    """
+    source = source or os.path.basename(file_path)
+    pages = iter_pages(file_path)
+    if topics is not None:
+        # Plain text is streamed in fixed-size pseudo-pages that can end mid-line
+        pages = topics.read_pages(pages, lines_cross_pages=file_path.lower().endswith('.txt'))
+    for index, (page_number, text) in enumerate(chunk_pages(pages, chunk_size, overlap)):
+        if topics is not None:
+            topics.add_chunk(index, text)
+        yield {
+            'text': text,
+            'metadata': {
+                'subject': subject,
+                'source': source,
+                'page': page_number,
+                'chunk_index': index,
+            }
+        }
+
+
+def hash_text(text):
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Partition:
+    """One vector store and its BM25 index: the shared course material or one user's uploads."""
+
+    def __init__(self, path, embedder):
+        self.path = path
+        # Opened memory-mapped, so startup cost does not grow with the corpus
+        self.vector_store = VectorStore(path, embedder.dim, model=embedder.name)
+        self.retriever = HybridRetriever(
+            self.vector_store, embedder, index_path=os.path.join(path, "bm25.npz")
+        )
+        self.ingest_lock = threading.Lock()
+        self.ingesting = set()
+
+    def has_document(self, doc_id):
+        return doc_id in self.ingesting or self.vector_store.has_document(doc_id)
+
+
+class RAGPipeline:
+    """Document ingestion, retrieval and explanations.
+
+    Documents live in partitions: store_dir itself holds material shared
+    with everyone, and store_dir/users/<user_id> holds each user's own
+    uploads. Methods take user_id (None for the shared partition); a
+    search covers that user's partition plus the shared one, so its cost
+    grows with what the user can see, not with the number of users.
+
+    One instance is meant to be shared by every session of the app: reads
+    are lock-free, and concurrent ingestions are serialised only where
+    they append to a partition's store and BM25 index.
+    """
+
+    def __init__(self, store_dir="data/vector_store", embedder=None, llm=None,
+                 chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+        self.store_dir = store_dir
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.embedder = embedder or EmbeddingService(
+            cache_path=os.path.join(store_dir, "embedding_cache.db")
+        )
+        self.answer_cache = AnswerCache(self.embedder)
+        self.llm = llm or get_llm()
+        self._partitions = {}
+        self._partitions_lock = threading.Lock()
+        self.shared = self.partition(None)
+
+    def partition(self, user_id=None):
+        partition = self._partitions.get(user_id)
+        if partition is None:
+            with self._partitions_lock:
+                partition = self._partitions.get(user_id)
+                if partition is None:
+                    path = self.store_dir if user_id is None else os.path.join(self.store_dir, "users", str(user_id))
+                    partition = self._partitions[user_id] = Partition(path, self.embedder)
+        return partition
+
+    def _visible_partitions(self, user_id):
+        if user_id is None:
+            return [self.shared]
+        return [self.partition(user_id), self.shared]
+
+    def has_document(self, doc_id, user_id=None):
+        return self.partition(user_id).has_document(doc_id)
+
+    def process_document(self, file_path, subject, doc_id=None, source=None, on_batch=None, user_id=None,
+                         topics=None):
+        """Stream a document into user_id's partition and return the number of chunks added.
+
+        doc_id is the file's content hash and source the name shown to the
+        user (defaults to the file name). user_id None adds it to the shared
+        partition. A document that is already indexed there is skipped
+        without being parsed, and chunks whose text is already in the
+        partition reuse the stored vector instead of being embedded again.
+        on_batch(rows, chunks) is called after each batch is stored, and
+        topics (a TopicExtractor) is fed the document as it is chunked.
+        """
+        doc_id = doc_id or sha256_file(file_path)
+        if not self.start_document(doc_id, user_id):
+            return 0
+
+        store = self.partition(user_id).vector_store
+        count = 0
+        failed = True
+        try:
+            chunks = iter_chunks(file_path, subject, self.chunk_size, self.chunk_overlap, source=source,
+                                 topics=topics)
+            for batch in batched(chunks, BATCH_SIZE):
+                hashes = [hash_text(chunk['text']) for chunk in batch]
+                rows = store.lookup_hashes(hashes)
+                vectors = np.empty((len(batch), self.embedder.dim), dtype=np.float32)
+                missing = [i for i, row in enumerate(rows) if row < 0]
+                known = [i for i, row in enumerate(rows) if row >= 0]
+                if missing:
+                    vectors[missing] = self.embedder.embed([batch[i]['text'] for i in missing])
+                if known:
+                    vectors[known] = store.vectors[[rows[i] for i in known]]
+                rows = self.append_batch(doc_id, batch, vectors, user_id, hashes)
+                if on_batch is not None:
+                    on_batch(rows, batch)
+                count += len(batch)
+            failed = False
+        finally:
+            self.finish_document(doc_id, subject, user_id, failed=failed)
+        return count
+
+    # process_document in steps, for callers that parse and embed elsewhere
+    def start_document(self, doc_id, user_id=None):
+        """Reserve doc_id for ingestion; False if it is already indexed or being indexed."""
+        partition = self.partition(user_id)
+        with partition.ingest_lock:
+            # Another session may be ingesting the same file right now
+            if partition.has_document(doc_id):
+                return False
+            partition.ingesting.add(doc_id)
+        return True
+
+    def append_batch(self, doc_id, chunks, vectors, user_id=None, text_hashes=None):
+        """Store one embedded batch of chunks; returns the range of new rows.
+
+        doc_id may be a list with one document per chunk (see VectorStore.add).
+        """
+        partition = self.partition(user_id)
+        if text_hashes is None:
+            text_hashes = [hash_text(chunk['text']) for chunk in chunks]
+        # BM25 assigns rows in arrival order, so both appends must happen together
+        with partition.ingest_lock:
+            rows = partition.vector_store.add(chunks, vectors, doc_id, text_hashes)
+            partition.retriever.add(rows, [chunk['text'] for chunk in chunks])
+        return rows
+
+    def finish_document(self, doc_id, subject, user_id=None, failed=False):
+        partition = self.partition(user_id)
+        if failed:
+            # Don't leave a half-indexed document that would be skipped next time
+            partition.vector_store.delete_document(doc_id)
+        with partition.ingest_lock:
+            partition.ingesting.discard(doc_id)
+            partition.retriever.flush()
+        self.answer_cache.invalidate_subject(subject, user=user_id)
+
+    def remove_document(self, doc_id, user_id=None):
+        store = self.partition(user_id).vector_store
+        subjects = store.document_subjects(doc_id)
+        removed = store.delete_document(doc_id)
+        for subject in subjects:
+            self.answer_cache.invalidate_subject(subject, user=user_id)
+        return removed
+
+    def search(self, query, k=5, subject=None, user_id=None):
+        """Hybrid BM25 + vector search over the user's and the shared partition.
+
+        Returns chunk dicts with a 'score', best first.
+        """
+        hits = []
+        for partition in self._visible_partitions(user_id):
+            hits += [(score, row, partition) for row, score in partition.retriever.search(query, k=k, subject=subject)]
+        hits.sort(key=lambda hit: -hit[0])
+        chunks = []
+        for score, row, partition in hits[:k]:
+            chunk = partition.vector_store.get_chunks([row])[0]
+            chunk['score'] = score
+            chunks.append(chunk)
+        return chunks
+
+    def get_chunks(self, sources):
+        """Chunk dicts for (partition, vector_row) pairs, such as UserDatabase.load_topic_sources returns."""
+        rows = {}
+        for user_id, row in sources:
+            rows.setdefault(user_id, []).append(row)
+        chunks = []
+        for user_id, partition_rows in rows.items():
+            chunks += self.partition(user_id).vector_store.get_chunks(partition_rows)
+        return chunks
+
+    def build_context(self, chunks, max_chars):
+        """Concatenate chunks best-first until the character budget is used up."""
+        parts = []
+        used = 0
+        for chunk in chunks:
+            remaining = max_chars - used
+            if remaining <= 0:
+                break
+            text = chunk['text'][:remaining]
+            meta = chunk['metadata']
+            parts.append({'text': text, 'source': meta.get('source'), 'page': meta.get('page')})
+            used += len(text)
+        return parts
+
+    def explain_topic(self, topic, depth="Detailed", subject=None, stream=False, user_id=None, sources=None):
+        """Explain a topic from the user's materials and the shared ones.
+
+        With stream=True this returns a generator of text pieces as the model
+        produces them; otherwise it returns the whole answer as one string.
+        sources are the chunks linked to the topic (see get_chunks); when
+        given they are the context and no search is run.
+        """
+        tokens = self.stream_explanation(topic, depth, subject, user_id, sources)
+        return tokens if stream else "".join(tokens)
+
+    def stream_explanation(self, topic, depth="Detailed", subject=None, user_id=None, sources=None):
+        # Taken before retrieval: a document finishing mid-answer must not get this answer cached as current
+        version = self.answer_cache.version(subject, user_id)
+        cached = self.answer_cache.get(topic, depth, subject, user=user_id)
+        if cached is not None:
+            yield cached
+            return
+
+        settings = DEPTH_SETTINGS.get(depth, DEPTH_SETTINGS['Detailed'])
+        if sources:
+            chunks = self.get_chunks(sources[:settings['k']])
+        else:
+            chunks = self.search(topic, k=settings['k'], subject=subject, user_id=user_id)
+            chunks = [chunk for chunk in chunks if chunk['score'] >= MIN_RELEVANCE]
+        context = self.build_context(chunks, settings['context_chars'])
+
+        parts = []
+        for token in self.llm.stream(topic, depth, context):
+            parts.append(token)
+            yield token
+        # Only complete answers are cached; a closed stream never gets here
+        self.answer_cache.put(topic, depth, subject, "".join(parts), user=user_id, version=version)
+
+    async def astream_explanation(self, topic, depth="Detailed", subject=None, user_id=None, sources=None):
+        """Async iterator over stream_explanation; blocking work runs in a thread."""
+        tokens = self.stream_explanation(topic, depth, subject, user_id, sources)
+        done = object()
+        while True:
+            token = await asyncio.to_thread(next, tokens, done)
+            if token is done:
+                break
+            yield token
@@ -0,0 +1,523 @@
+import heapq
+import math
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from utils.helpers import calculate_days_until, parse_date_ordinal
+
+DIFFICULTY_WEIGHTS = {
+    'easy': 0.8, 'beginner': 0.8,
+    'medium': 1.0, 'intermediate': 1.0,
+    'hard': 1.25, 'advanced': 1.25,
+}
+# Columnar form of the above: difficulty code -> weight / badge
+DIFFICULTY_CODES = {
+    'easy': 0, 'beginner': 0,
+    'medium': 1, 'intermediate': 1,
+    'hard': 2, 'advanced': 2,
+}
+CODE_WEIGHTS = np.array([0.8, 1.0, 1.25], dtype=np.float64)
+CODE_BADGES = ("🟢 Easy", "🟡 Medium", "🔴 Hard")
+# Days-until value used for subjects without a valid exam date
+NO_EXAM_DAYS = 999
+
+# Study block length and the break taken after each block, in minutes
+INTENSITY_SETTINGS = {
+    'Light': {'block': 30, 'break': 10},
+    'Moderate': {'block': 45, 'break': 10},
+    'Intensive': {'block': 60, 'break': 5},
+}
+
+# Don't schedule leftover slivers shorter than this
+MIN_BLOCK_MINUTES = 15
+# Each extra block on the same topic is worth this much less than the last
+REPEAT_DECAY = 0.5
+# Days over which exam urgency halves
+URGENCY_HALF_LIFE = 7.0
+# Estimated study time for one topic before difficulty and progress scaling
+TOPIC_MINUTES = 120
+# Days over which material studied before an exam loses half its value by exam day
+RETENTION_HALF_LIFE = 14.0
+# Exams further out than this are planned as if they were this far (daily plan only)
+DAILY_HORIZON_DAYS = 60
+# Length of one spaced-repetition review, and the most of a day's budget reviews may take
+REVIEW_MINUTES = 15
+REVIEW_SHARE = 0.25
+
+
+def normalize_intensity(intensity):
+    # Settings stores e.g. "Moderate 🚶"; the planner uses "Moderate"
+    name = (intensity or 'Moderate').split()[0].capitalize()
+    return name if name in INTENSITY_SETTINGS else 'Moderate'
+
+
+def urgency(days_until):
+    return 1.0 / (1.0 + max(days_until, 0) / URGENCY_HALF_LIFE)
+
+
+def topic_priority(days_until, difficulty, progress):
+    """Priority in [0, 1]: nearer exams, harder subjects and less progress rank higher."""
+    weight = DIFFICULTY_WEIGHTS.get((difficulty or 'medium').lower(), 1.0)
+    remaining = max(0.0, 1.0 - (progress or 0) / 100.0)
+    return min(1.0, urgency(days_until) * weight * remaining)
+
+
+def effective_progress(subject):
+    """Progress in percent: the value the student set, or the share of the subject's
+    estimated study time already logged as sessions, whichever is higher."""
+    weight = DIFFICULTY_WEIGHTS.get((subject.get('difficulty') or 'medium').lower(), 1.0)
+    estimate = max(len(subject.get('topics') or ()), 1) * TOPIC_MINUTES * weight
+    studied = 100.0 * (subject.get('minutes_studied') or 0) / estimate
+    return min(100.0, max(float(subject.get('progress', 0) or 0), studied))
+
+
+def open_topics(subject):
+    completed = set(subject.get('completed_topics', []))
+    topics = [t for t in subject.get('topics', []) if t not in completed]
+    if not topics and not subject.get('topics'):
+        topics = ['General review']
+    return topics
+
+
+def subject_columns(subjects, today=None):
+    """Columnar view of subjects and their open topics as NumPy arrays.
+
+    Dates are parsed through a cache, so a rerun with unchanged subjects
+    costs one dictionary lookup per subject plus array arithmetic.
+    """
+    today_ordinal = (today or datetime.now().date()).toordinal()
+    n = len(subjects)
+    exam = np.fromiter(
+        (parse_date_ordinal(s.get('exam_date', '')) or today_ordinal + NO_EXAM_DAYS for s in subjects),
+        dtype=np.int64, count=n
+    )
+    difficulty = np.fromiter(
+        (DIFFICULTY_CODES.get((s.get('difficulty') or 'medium').lower(), 1) for s in subjects),
+        dtype=np.int8, count=n
+    )
+    progress = np.fromiter((effective_progress(s) for s in subjects), dtype=np.float64, count=n)
+
+    topics = [open_topics(s) for s in subjects]
+    counts = np.fromiter((len(t) for t in topics), dtype=np.int64, count=n)
+    return {
+        'days': exam - today_ordinal,
+        'difficulty': difficulty,
+        'progress': progress,
+        'topic_subject': np.repeat(np.arange(n), counts),
+        'topic_names': [topic for subject_topics in topics for topic in subject_topics],
+    }
+
+
+def subject_priorities(columns):
+    """topic_priority() for every subject at once; exams already past score 0."""
+    days = columns['days']
+    urgency_values = 1.0 / (1.0 + np.maximum(days, 0) / URGENCY_HALF_LIFE)
+    remaining = np.clip(1.0 - columns['progress'] / 100.0, 0.0, 1.0)
+    priority = np.minimum(1.0, urgency_values * CODE_WEIGHTS[columns['difficulty']] * remaining)
+    priority[days < 0] = 0.0
+    return priority
+
+
+def score_topics(subjects, focus_subject=None, limit=None, today=None):
+    """Return [(priority, subject, topic, days_until)] for open topics, best first.
+
+    Scoring is one vectorized pass; with limit only the top entries (ties in
+    input order) are turned back into Python tuples.
+    """
+    if focus_subject:
+        subjects = [s for s in subjects if s['name'] == focus_subject]
+    columns = subject_columns(subjects, today)
+    topic_subject = columns['topic_subject']
+    priority = subject_priorities(columns)[topic_subject]
+
+    order = np.lexsort((np.arange(len(priority)), -priority))
+    order = order[priority[order] > 0]
+    if limit is not None:
+        order = order[:limit]
+    days = columns['days']
+    names = columns['topic_names']
+    return [
+        (float(priority[i]), subjects[topic_subject[i]], names[i], int(days[topic_subject[i]]))
+        for i in order.tolist()
+    ]
+
+
+def allocate(scored, budget_minutes, block_minutes, break_minutes=0, max_blocks_per_topic=3,
+             subject_minutes=None):
+    """Fill the time budget greedily from a max-heap of topic priorities.
+
+    Each pick takes one study block from the top topic, then pushes the topic
+    back with its priority decayed, so time spreads over the most urgent
+    topics instead of piling onto one. With subject_minutes ({name:
+    minutes}), no subject gets more than its share. Runs in O(T + B log T)
+    for T topics and B blocks.
+    """
+    heap = [(-priority, i, priority, 0) for i, (priority, *_) in enumerate(scored)]
+    heapq.heapify(heap)
+    tasks = {}
+    order = []
+    remaining = budget_minutes
+    left = dict(subject_minutes) if subject_minutes is not None else None
+    while heap and remaining >= MIN_BLOCK_MINUTES:
+        neg_score, i, base_priority, blocks = heapq.heappop(heap)
+        duration = min(block_minutes, remaining)
+        if left is not None:
+            name = scored[i][1]['name']
+            duration = min(duration, left.get(name, 0))
+            if duration < MIN_BLOCK_MINUTES:
+                continue
+            left[name] -= duration
+        remaining -= duration
+
+        task = tasks.get(i)
+        if task is None:
+            _, subject, topic, days = scored[i]
+            task = tasks[i] = {
+                'subject': subject['name'],
+                'topic': topic,
+                'duration': 0,
+                'priority': base_priority,
+                'break_after': 0,
+                'reason': f"Exam in {days} days • {subject.get('difficulty', 'Medium')} difficulty",
+            }
+            order.append(i)
+        task['duration'] += duration
+
+        if break_minutes and remaining >= MIN_BLOCK_MINUTES + break_minutes:
+            task['break_after'] += break_minutes
+            remaining -= break_minutes
+
+        blocks += 1
+        if blocks < max_blocks_per_topic:
+            heapq.heappush(heap, (neg_score * REPEAT_DECAY, i, base_priority, blocks))
+    return [tasks[i] for i in order]
+
+
+def planning_entry(subject, exam_day):
+    """What allocation needs to know about a subject whose exam is exam_day days after day 0.
+
+    need is the estimated study time (open topics x minutes per topic) and
+    weight the difficulty scaled by the share of the subject still to learn.
+    """
+    topics = open_topics(subject)
+    weight = DIFFICULTY_WEIGHTS.get((subject.get('difficulty') or 'medium').lower(), 1.0)
+    remaining = max(0.0, 1.0 - effective_progress(subject) / 100.0)
+    topic_minutes = max(MIN_BLOCK_MINUTES * 2, int(TOPIC_MINUTES * weight * max(remaining, 0.25)))
+    return {
+        'name': subject['name'],
+        'difficulty': subject.get('difficulty', 'Medium'),
+        'exam_day': exam_day,
+        'weight': weight * remaining,
+        'topics': topics,
+        'topic_minutes': topic_minutes,
+        'need': topic_minutes * max(len(topics), 1),
+    }
+
+
+def retention(days_before_exam):
+    """Share of what is studied this many days before the exam still there on exam day."""
+    return 1.0 / (1.0 + (days_before_exam - 1) / RETENTION_HALF_LIFE)
+
+
+def allocate_hours(entries, day_minutes, block_minutes, days=None):
+    """Split each day's study time across subjects to maximise expected exam readiness.
+
+    The model: a subject's readiness on exam day is 1 - exp(-H / need),
+    where H sums the minutes studied, each discounted by retention() for
+    how long before the exam they were studied; its value is readiness
+    times weight. The n-th block on one subject in one day counts
+    REPEAT_DECAY**(n-1) as much, so days mix subjects instead of cramming
+    one. The objective is concave, and it is filled greedily by marginal
+    utility, one block at a time:
+
+    - every subject keeps a max-heap of its days by discounted value, so
+      its best day is at the top;
+    - a global max-heap holds each subject's gain from its best day.
+
+    Gains only fall as time is handed out (readiness saturates, days fill
+    up), so a popped heap entry is re-priced and pushed back when stale.
+    That makes a pick O(log S + log D) and the whole plan
+    O(B (log S + log D) + S D) for S subjects, D days and B blocks.
+
+    entries come from planning_entry(); day_minutes is the budget of every
+    day. Returns one {subject name: minutes} per day, in subject order.
+    """
+    days = days if days is not None else max((e['exam_day'] for e in entries), default=0)
+    capacity = [day_minutes] * days
+    allocation = [{} for _ in range(days)]
+    studied = [0.0] * len(entries)
+    day_heaps = []
+    gains = []
+    for i, entry in enumerate(entries):
+        last_day = min(entry['exam_day'], days)
+        heap = [(-retention(entry['exam_day'] - d), d, 0) for d in range(last_day)] if entry['weight'] > 0 else []
+        heapq.heapify(heap)
+        day_heaps.append(heap)
+
+    def best_gain(i):
+        # Per-minute gain of subject i's next block, dropping days that are already full
+        heap = day_heaps[i]
+        while heap and capacity[heap[0][1]] < MIN_BLOCK_MINUTES:
+            heapq.heappop(heap)
+        if not heap:
+            return 0.0
+        entry = entries[i]
+        need = entry['need']
+        return entry['weight'] * math.exp(-studied[i] / need) / need * -heap[0][0]
+
+    for i in range(len(entries)):
+        gain = best_gain(i)
+        if gain > 0:
+            gains.append((-gain, i))
+    heapq.heapify(gains)
+
+    while gains:
+        neg_gain, i = heapq.heappop(gains)
+        gain = best_gain(i)
+        if gain <= 0:
+            continue
+        if gains and gain < -gains[0][0] and gain < -neg_gain:
+            heapq.heappush(gains, (-gain, i))
+            continue
+        neg_value, day, repeats = heapq.heappop(day_heaps[i])
+        minutes = min(block_minutes, capacity[day])
+        capacity[day] -= minutes
+        name = entries[i]['name']
+        allocation[day][name] = allocation[day].get(name, 0) + minutes
+        studied[i] += -neg_value * minutes
+        if capacity[day] >= MIN_BLOCK_MINUTES:
+            heapq.heappush(day_heaps[i], (neg_value * REPEAT_DECAY, day, repeats + 1))
+        gain = best_gain(i)
+        if gain > 0:
+            heapq.heappush(gains, (-gain, i))
+    return allocation
+
+
+def review_tasks(reviews, today=None):
+    """Plan entries for due reviews (as loaded by load_due_reviews), most overdue first."""
+    today = today or datetime.now().date()
+    tasks = []
+    for review in reviews:
+        overdue = (today - date.fromisoformat(review['due'])).days
+        tasks.append({
+            'subject': review['subject'],
+            'topic': review['topic'],
+            'duration': REVIEW_MINUTES,
+            'priority': min(1.0, 0.6 + 0.1 * overdue),
+            'break_after': 0,
+            'reason': f"🔄 Review • {f'{overdue} days overdue' if overdue else 'due today'}"
+                      f" • interval {review['interval_days']} days",
+            'review': True,
+        })
+    return tasks
+
+
+class StudyRecommender:
+    def __init__(self, database):
+        self.db = database
+
+    def generate_daily_plan(self, subjects, available_hours=4, intensity="Moderate",
+                            include_breaks=True, focus_subject=None, user_id=None, today=None):
+        """Today's tasks within the hour budget.
+
+        With user_id, that user's due reviews come first, taking up to
+        REVIEW_SHARE of the budget; new study fills the rest.
+        """
+        settings = INTENSITY_SETTINGS[normalize_intensity(intensity)]
+        budget = int(available_hours * 60)
+        reviews = []
+        if user_id is not None:
+            due = self.db.load_due_reviews(
+                user_id, today, subject=focus_subject, limit=int(budget * REVIEW_SHARE) // REVIEW_MINUTES
+            )
+            reviews = review_tasks(due, today)
+            budget -= REVIEW_MINUTES * len(reviews)
+        if focus_subject:
+            subjects = [s for s in subjects if s['name'] == focus_subject]
+        # Today's split between subjects is day 0 of a plan that assumes the same budget every day
+        days_until = subject_columns(subjects, today)['days'].tolist()
+        entries = [
+            planning_entry(subject, min(days, DAILY_HORIZON_DAYS) + 1)
+            for subject, days in zip(subjects, days_until) if days >= 0
+        ]
+        shares = allocate_hours(entries, budget, settings['block'])[0] if entries and budget > 0 else {}
+        # A share of m minutes covers at most one topic per MIN_BLOCK_MINUTES; only those need scoring.
+        # Progress is taken from the full topic list first, since it is measured against its length
+        candidates = [
+            dict(s, topics=open_topics(s)[:shares[s['name']] // MIN_BLOCK_MINUTES + 1], completed_topics=[],
+                 progress=effective_progress(s), minutes_studied=0)
+            for s in subjects if s['name'] in shares
+        ]
+        return reviews + allocate(
+            score_topics(candidates, today=today),
+            budget_minutes=budget,
+            block_minutes=settings['block'],
+            break_minutes=settings['break'] if include_breaks else 0,
+            subject_minutes=shares,
+        )
+
+
+class SemesterPlanner:
+    """Day-by-day plan from the start date up to the last exam.
+
+    Planning happens in two layers so that changes stay local:
+
+    1. allocate_hours() splits every day's budget between the subjects whose
+       exam is still ahead, for the best expected readiness across all
+       exams. Adding or removing a subject re-solves the split (a few
+       milliseconds) and only re-flows the subjects whose time changed.
+    2. Each subject then pours its remaining topics, in order, into its own
+       daily slots. Completing a topic only re-flows that subject.
+
+    add_subject / remove_subject / complete_topic return the dates whose
+    tasks changed.
+    """
+
+    def __init__(self, daily_minutes=240, intensity="Moderate", start=None):
+        self.daily_minutes = daily_minutes
+        self.intensity = normalize_intensity(intensity)
+        self.block_minutes = INTENSITY_SETTINGS[self.intensity]['block']
+        self.start = start or datetime.now().date()
+        self.subjects = {}
+        self.capacity = []  # per day: {subject name: minutes}
+        self.tasks = []     # per day: {subject name: [task, ...]}
+        self.slots = {}     # subject name -> day indices where it has time
+
+    @property
+    def days(self):
+        return len(self.capacity)
+
+    def build(self, subjects):
+        for subject in subjects:
+            self._register(subject)
+        self._extend_horizon()
+        self._allocate()
+        for name in self.subjects:
+            self._flow(name)
+        return self
+
+    def _register(self, subject):
+        exam_day = calculate_days_until(subject.get('exam_date', ''))
+        exam_day += (datetime.now().date() - self.start).days
+        if exam_day <= 0:
+            return False
+        self.subjects[subject['name']] = planning_entry(subject, exam_day)
+        self.slots.setdefault(subject['name'], [])
+        return True
+
+    def _extend_horizon(self):
+        last = max((s['exam_day'] for s in self.subjects.values()), default=0)
+        while self.days < last:
+            self.capacity.append({})
+            self.tasks.append({})
+
+    def _allocate(self):
+        """Re-solve the split of every day; returns the subjects whose time changed."""
+        allocation = allocate_hours(list(self.subjects.values()), self.daily_minutes, self.block_minutes, self.days)
+        changed = set()
+        for day, (old, new) in enumerate(zip(self.capacity, allocation)):
+            if new == old:
+                continue
+            for name in set(old) | set(new):
+                if old.get(name) != new.get(name):
+                    changed.add(name)
+            self.capacity[day] = new
+        for name in changed:
+            if name in self.subjects:
+                self.slots[name] = [d for d in range(self.days) if name in self.capacity[d]]
+        return changed
+
+    def _flow(self, name):
+        """Lay the subject's remaining topics over its slots; returns the days whose tasks changed."""
+        subject = self.subjects[name]
+        slots = self.slots.get(name, [])
+        touched = set()
+        kept = set(slots)
+        for day in range(self.days):
+            if day not in kept and self.tasks[day].pop(name, None) is not None:
+                touched.add(day)
+
+        queue = list(subject['topics'])
+        topic_index = 0
+        left = subject['topic_minutes']
+        for day in slots:
+            minutes = self.capacity[day][name]
+            days_left = subject['exam_day'] - day
+            priority = min(1.0, urgency(days_left) * subject['weight'])
+            reason = f"Exam in {days_left} days • {subject['difficulty']} difficulty"
+            day_tasks = []
+            while minutes >= MIN_BLOCK_MINUTES:
+                if topic_index < len(queue):
+                    duration = min(minutes, left)
+                    topic = queue[topic_index]
+                    left -= duration
+                    if left < MIN_BLOCK_MINUTES:
+                        topic_index += 1
+                        left = subject['topic_minutes']
+                else:
+                    # Everything covered: spend the remaining slots revising
+                    duration, topic = minutes, f"Review: {name}"
+                if day_tasks and day_tasks[-1]['topic'] == topic:
+                    day_tasks[-1]['duration'] += duration
+                else:
+                    day_tasks.append({
+                        'subject': name, 'topic': topic, 'duration': duration,
+                        'priority': priority, 'reason': reason,
+                    })
+                minutes -= duration
+            # Days before the first shifted topic come out the same and are left alone
+            if self.tasks[day].get(name) != day_tasks:
+                self.tasks[day][name] = day_tasks
+                touched.add(day)
+        return touched
+
+    def _dates(self, days):
+        return [self.start + timedelta(days=d) for d in sorted(days)]
+
+    def add_subject(self, subject):
+        if subject['name'] in self.subjects:
+            self.remove_subject(subject['name'])
+        if not self._register(subject):
+            return []
+        self._extend_horizon()
+        changed = self._allocate() | {subject['name']}
+        touched = set()
+        for name in changed:
+            touched |= self._flow(name)
+        return self._dates(touched)
+
+    def remove_subject(self, name):
+        subject = self.subjects.pop(name, None)
+        if subject is None:
+            return []
+        touched = {d for d in self.slots.pop(name, []) if self.tasks[d].pop(name, None) is not None}
+        changed = self._allocate()
+        for other in changed - {name}:
+            touched |= self._flow(other)
+        return self._dates(touched)
+
+    def complete_topic(self, name, topic):
+        subject = self.subjects.get(name)
+        if subject is None or topic not in subject['topics']:
+            return []
+        subject['topics'].remove(topic)
+        return self._dates(self._flow(name))
+
+    def plan_for(self, day_date):
+        day = (day_date - self.start).days
+        if not 0 <= day < self.days:
+            return []
+        tasks = [task for day_tasks in self.tasks[day].values() for task in day_tasks]
+        return sorted(tasks, key=lambda t: -t['priority'])
+
+    def summary(self):
+        """One row per day: date, planned minutes and subjects."""
+        rows = []
+        for day in range(self.days):
+            rows.append({
+                'date': self.start + timedelta(days=day),
+                'minutes': sum(self.capacity[day].values()),
+                'subjects': sorted(self.capacity[day], key=lambda n: -self.capacity[day][n]),
+            })
+        return rows
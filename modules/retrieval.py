@@ -0,0 +1,246 @@
+import math
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in into is it its of on or
+that the their then there these this to was were which will with what how
+why when who explain explained explanation about
+""".split())
+
+# Rows indexed since the last snapshot before the BM25 index is saved again
+SAVE_EVERY_ROWS = 2000
+
+
+def tokenize(text):
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        # Cheap plural folding so "networks" matches "network"
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring, keyed by vector store row id.
+
+    Postings live in two segments: a compacted CSR base (loaded from disk)
+    and an in-memory delta that new rows are appended to. save() merges the
+    delta into the base.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}
+        self.count = 0
+        self.total_length = 0
+        self.saved_count = 0
+        self._doc_lengths = array('f')
+        self._base_offsets = np.zeros(1, dtype=np.int64)
+        self._base_rows = np.zeros(0, dtype=np.int32)
+        self._base_tfs = np.zeros(0, dtype=np.float32)
+        self._delta = {}
+        self._lock = threading.Lock()
+
+    def add(self, start_row, texts):
+        with self._lock:
+            # Rows that never reached the index (e.g. skipped) count as empty documents
+            while self.count < start_row:
+                self._doc_lengths.append(0.0)
+                self.count += 1
+            # Rows already indexed (caught up on by a load that ran meanwhile) are not added twice
+            for text in texts[self.count - start_row:]:
+                counts = Counter(tokenize(text))
+                row = self.count
+                for term, tf in counts.items():
+                    term_id = self.vocab.setdefault(term, len(self.vocab))
+                    postings = self._delta.get(term_id)
+                    if postings is None:
+                        postings = self._delta[term_id] = (array('i'), array('f'))
+                    postings[0].append(row)
+                    postings[1].append(tf)
+                length = sum(counts.values())
+                self._doc_lengths.append(float(length))
+                self.total_length += length
+                self.count += 1
+
+    def _postings(self, term_id):
+        rows = tfs = None
+        if term_id + 1 < len(self._base_offsets):
+            start, end = self._base_offsets[term_id], self._base_offsets[term_id + 1]
+            rows, tfs = self._base_rows[start:end], self._base_tfs[start:end]
+        delta = self._delta.get(term_id)
+        if delta is not None:
+            delta_rows = np.array(delta[0], dtype=np.int32)
+            delta_tfs = np.array(delta[1], dtype=np.float32)
+            if rows is None or not len(rows):
+                return delta_rows, delta_tfs
+            return np.concatenate([rows, delta_rows]), np.concatenate([tfs, delta_tfs])
+        return rows, tfs
+
+    def scores(self, query, size=None):
+        """Dense BM25 score vector of length size (defaults to the indexed row count)."""
+        size = self.count if size is None else size
+        scores = np.zeros(size, dtype=np.float32)
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids or not self.count:
+            return scores
+        with self._lock:
+            doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.float32)[:size]
+            avg_length = max(self.total_length / self.count, 1.0)
+            n = self.count
+            for term_id in term_ids:
+                rows, tfs = self._postings(term_id)
+                if rows is None or not len(rows):
+                    continue
+                if rows[-1] >= size:
+                    keep = rows < size
+                    rows, tfs = rows[keep], tfs[keep]
+                df = len(rows)
+                idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * doc_lengths[rows] / avg_length)
+                scores[rows] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+            del doc_lengths
+        return scores
+
+    def save(self, path):
+        with self._lock:
+            offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+            rows_parts, tfs_parts = [], []
+            for term_id in range(len(self.vocab)):
+                rows, tfs = self._postings(term_id)
+                if rows is None:
+                    rows, tfs = np.zeros(0, np.int32), np.zeros(0, np.float32)
+                rows_parts.append(rows)
+                tfs_parts.append(tfs)
+                offsets[term_id + 1] = offsets[term_id] + len(rows)
+            self._base_offsets = offsets
+            self._base_rows = np.concatenate(rows_parts) if rows_parts else np.zeros(0, np.int32)
+            self._base_tfs = np.concatenate(tfs_parts) if tfs_parts else np.zeros(0, np.float32)
+            self._delta = {}
+
+            terms = sorted(self.vocab, key=self.vocab.get)
+            tmp_path = path + '.tmp.npz'
+            np.savez(
+                tmp_path,
+                terms=np.array(terms, dtype=str),
+                offsets=self._base_offsets,
+                rows=self._base_rows,
+                tfs=self._base_tfs,
+                doc_lengths=np.frombuffer(self._doc_lengths, dtype=np.float32).copy(),
+                params=np.array([self.k1, self.b], dtype=np.float64),
+            )
+            os.replace(tmp_path, path)
+            self.saved_count = self.count
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            k1, b = data['params'].tolist()
+            index = cls(k1=k1, b=b)
+            index.vocab = {term: i for i, term in enumerate(data['terms'].tolist())}
+            index._base_offsets = data['offsets']
+            index._base_rows = data['rows']
+            index._base_tfs = data['tfs']
+            doc_lengths = data['doc_lengths']
+        index._doc_lengths = array('f', doc_lengths.tobytes())
+        index.count = len(doc_lengths)
+        index.total_length = int(doc_lengths.sum())
+        index.saved_count = index.count
+        return index
+
+
+def top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top[np.isfinite(scores[top])]
+
+
+class HybridRetriever:
+    """Scores every row with both BM25 and cosine similarity and fuses them.
+
+    Both scores are computed densely with NumPy over the memory-mapped
+    vectors, then masked (deleted documents, subject filter) and the top k
+    picked with argpartition, so there is no per-row Python work at query time.
+    """
+
+    def __init__(self, vector_store, embedder, index_path=None, alpha=0.5):
+        self.vector_store = vector_store
+        self.embedder = embedder
+        self.index_path = index_path
+        self.alpha = alpha
+        self._bm25 = None
+        self._lock = threading.Lock()
+
+    @property
+    def bm25(self):
+        if self._bm25 is None:
+            with self._lock:
+                if self._bm25 is None:
+                    self._bm25 = self._load_bm25()
+        return self._bm25
+
+    def _load_bm25(self):
+        index = None
+        if self.index_path and os.path.exists(self.index_path):
+            index = BM25Index.load(self.index_path)
+            if index.count > len(self.vector_store):
+                index = None
+        index = index or BM25Index()
+        # Catch up on rows appended since the snapshot was written
+        if index.count < len(self.vector_store):
+            rows = range(index.count, len(self.vector_store))
+            for start in range(0, len(rows), 1000):
+                part = rows[start:start + 1000]
+                index.add(part.start, [c['text'] for c in self.vector_store.get_chunks(part)])
+            self._maybe_save(index)
+        return index
+
+    def _maybe_save(self, index):
+        if self.index_path and index.count - index.saved_count >= SAVE_EVERY_ROWS:
+            index.save(self.index_path)
+
+    def add(self, rows, texts):
+        if self._bm25 is None:
+            # A load in progress may have read the store's length before these rows were appended
+            with self._lock:
+                if self._bm25 is None:
+                    # Not loaded yet: the catch-up on first use will pick these rows up
+                    return
+        self._bm25.add(rows.start, texts)
+
+    def flush(self):
+        if self._bm25 is not None:
+            self._maybe_save(self._bm25)
+
+    def search(self, query, k=5, subject=None):
+        """Return [(row, score)] for the best k rows, best first."""
+        store = self.vector_store
+        size = len(store)
+        if size == 0:
+            return []
+        vector_scores = store.vectors[:size] @ self.embedder.embed_query(query)
+        keyword_scores = self.bm25.scores(query, size)
+        top_keyword = keyword_scores.max()
+        if top_keyword > 0:
+            keyword_scores /= top_keyword
+        scores = self.alpha * vector_scores + (1.0 - self.alpha) * keyword_scores
+
+        mask = store.row_mask(subject)[:size]
+        if not mask.all():
+            scores = np.where(mask, scores, -np.inf)
+        return [(int(row), float(scores[row])) for row in top_k(scores, k)]
@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+
+# Recall grades offered after a review, on SM-2's 0-5 quality scale
+GRADES = {'Forgot': 1, 'Hard': 3, 'Good': 4, 'Easy': 5}
+DEFAULT_GRADE = 'Good'
+# Below this quality the topic counts as forgotten and starts over
+PASSING_QUALITY = 3
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+
+
+def next_review(repetitions, interval_days, ease, quality):
+    """One SM-2 step: (repetitions, interval_days, ease) after a review graded quality (0-5).
+
+    A pass moves to 1 day, then 6, then the previous interval times the
+    ease factor; a fail restarts at 1 day. The ease factor moves with every
+    grade but never drops below MIN_EASE.
+    """
+    quality = max(0, min(5, int(quality)))
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < PASSING_QUALITY:
+        return 0, 1, ease
+    if repetitions == 0:
+        interval_days = 1
+    elif repetitions == 1:
+        interval_days = 6
+    else:
+        interval_days = max(1, round(interval_days * ease))
+    return repetitions + 1, interval_days, ease
+
+
+def due_date(interval_days, reviewed=None):
+    return (reviewed or date.today()) + timedelta(days=interval_days)
@@ -0,0 +1,374 @@
+import re
+from collections import deque
+from datetime import date, datetime, time, timedelta, timezone
+
+from modules.recommender import INTENSITY_SETTINGS, MIN_BLOCK_MINUTES, normalize_intensity
+
+# Hours of each preferred study time in Settings; Night runs past midnight
+TIME_WINDOWS = {
+    'morning': (6, 12),
+    'afternoon': (12, 18),
+    'evening': (18, 22),
+    'night': (22, 26),
+}
+DEFAULT_BREAK_EVERY = 45
+# Sessions placed after "now" start on the next multiple of this many minutes
+START_ROUNDING_MINUTES = 5
+# Recurring busy events are expanded this far ahead when imported
+RECURRENCE_HORIZON_DAYS = 366
+WEEKDAYS = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
+
+
+class IntervalTree:
+    """Static interval tree over half-open (start, end, ...) tuples.
+
+    The intervals are kept sorted by start and the tree is implicit in that
+    list: the middle element is the root and each half is a subtree. Every
+    node also stores the latest end in its subtree, so a query skips any
+    subtree that finishes before the window opens. Building is O(n log n)
+    and a query O(log n + k) for k overlapping intervals.
+    """
+
+    def __init__(self, intervals):
+        self.intervals = sorted(intervals)
+        self.max_end = [None] * len(self.intervals)
+        self._build(0, len(self.intervals))
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        end = self.intervals[mid][1]
+        for child_end in (self._build(lo, mid), self._build(mid + 1, hi)):
+            if child_end is not None and child_end > end:
+                end = child_end
+        self.max_end[mid] = end
+        return end
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def overlapping(self, start, end):
+        """Intervals overlapping [start, end), by start."""
+        found = []
+        stack = [(0, len(self.intervals))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self.max_end[mid] <= start:
+                continue
+            interval = self.intervals[mid]
+            # Right subtree first so the left one is popped (and found) first
+            if interval[0] < end:
+                stack.append((mid + 1, hi))
+            stack.append((lo, mid))
+            if interval[0] < end and interval[1] > start:
+                found.append(interval)
+        found.sort()
+        return found
+
+
+def study_windows(day, preferred_times):
+    """(start, end) datetimes of the preferred study times on day, earliest first."""
+    windows = []
+    for label in preferred_times or ():
+        for name, (first_hour, last_hour) in TIME_WINDOWS.items():
+            if name in label.lower():
+                midnight = datetime.combine(day, time())
+                windows.append((midnight + timedelta(hours=first_hour), midnight + timedelta(hours=last_hour)))
+    windows.sort()
+    merged = []
+    for start, end in windows:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_intervals(windows, busy):
+    """The parts of windows not covered by any interval in the busy IntervalTree."""
+    free = []
+    for start, end in windows:
+        cursor = start
+        for busy_start, busy_end, *_ in busy.overlapping(start, end):
+            if busy_start > cursor:
+                free.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if cursor < end:
+            free.append((cursor, end))
+    return free
+
+
+def _minutes(delta):
+    return int(delta.total_seconds() // 60)
+
+
+def pack_day(tasks, free, break_every=DEFAULT_BREAK_EVERY, break_minutes=10, not_before=None):
+    """Place tasks, in order, into the free intervals of one day.
+
+    A task may be split over several intervals but no piece is shorter
+    than MIN_BLOCK_MINUTES (unless that is all the task has left). After
+    break_every minutes of back-to-back study (at least MIN_BLOCK_MINUTES)
+    a break_minutes break is left open; any gap between intervals counts
+    as a break too. Returns
+    (entries, unscheduled): entries are {'subject', 'topic', 'start',
+    'end', 'break_after'} and unscheduled the tasks, or remainders of
+    tasks, that did not fit.
+    """
+    # Shorter stretches than a block would leave no room for any piece
+    break_every = max(break_every, MIN_BLOCK_MINUTES)
+    slots = deque(free)
+    if not_before is not None:
+        slots = deque((max(start, not_before), end) for start, end in slots if end > not_before)
+    entries = []
+    unscheduled = []
+    studied = 0
+    last_end = None
+    for task in tasks:
+        remaining = int(task.get('duration', 0))
+        while remaining > 0 and slots:
+            start, end = slots[0]
+            available = _minutes(end - start)
+            if available < min(MIN_BLOCK_MINUTES, remaining):
+                slots.popleft()
+                continue
+            if last_end is None or start > last_end:
+                studied = 0
+            length = min(remaining, available, break_every - studied)
+            if length < remaining and length < MIN_BLOCK_MINUTES:
+                # Too close to a break to start a useful piece; take the break now
+                length = 0
+            if length:
+                stop = start + timedelta(minutes=length)
+                entries.append({
+                    'subject': task['subject'],
+                    'topic': task['topic'],
+                    'start': start,
+                    'end': stop,
+                    'break_after': 0,
+                    'review': bool(task.get('review')),
+                })
+                remaining -= length
+                studied += length
+                start = last_end = stop
+            if studied >= break_every or not length:
+                if entries and entries[-1]['end'] == start:
+                    entries[-1]['break_after'] = break_minutes
+                start += timedelta(minutes=break_minutes)
+                studied = 0
+                last_end = start
+            if start >= end:
+                slots.popleft()
+            else:
+                slots[0] = (start, end)
+        if remaining > 0:
+            unscheduled.append(dict(task, duration=remaining))
+    return entries, unscheduled
+
+
+def break_settings(preferences):
+    """(minutes of study between breaks, break length) from the saved study preferences."""
+    match = re.search(r'\d+', str(preferences.get('break_frequency') or ''))
+    break_every = int(match.group()) if match else DEFAULT_BREAK_EVERY
+    return break_every, INTENSITY_SETTINGS[normalize_intensity(preferences.get('intensity'))]['break']
+
+
+def schedule_plan(days, preferences, busy_blocks, now=None):
+    """Time-slot every day of a plan around busy calendar blocks.
+
+    days is [(date, tasks)]; busy_blocks are (start, end, ...) tuples. The
+    busy blocks go into one IntervalTree, so each preferred study window
+    costs one query however many events the calendar holds. Nothing is
+    placed in the past. Returns (entries, unscheduled) over all days.
+    """
+    now = now or datetime.now()
+    seconds = now.minute * 60 + now.second + now.microsecond / 1e6
+    step = START_ROUNDING_MINUTES * 60
+    now = now.replace(minute=0, second=0, microsecond=0) + timedelta(seconds=-(-seconds // step) * step)
+    busy = IntervalTree(busy_blocks)
+    break_every, break_minutes = break_settings(preferences)
+    preferred = preferences.get('preferred_times')
+    entries = []
+    unscheduled = []
+    for day, tasks in days:
+        free = free_intervals(study_windows(day, preferred), busy)
+        day_entries, left = pack_day(tasks, free, break_every, break_minutes, not_before=now)
+        entries.extend(day_entries)
+        unscheduled.extend(dict(task, date=day) for task in left)
+    return entries, unscheduled
+
+
+# iCalendar (RFC 5545), only as much as calendars of busy time need
+def _unfold(text):
+    return re.sub(r'\r?\n[ \t]', '', text).splitlines()
+
+
+def _parse_value(params, value):
+    """A datetime in the value's own zone (naive for floating local times), or a date for all-day values.
+
+    Recurrences are stepped in the event's zone, so its times only become
+    local (see _local) once expanded.
+    """
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or re.fullmatch(r'\d{8}', value):
+        return datetime.strptime(value, '%Y%m%d').date()
+    moment = datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        return moment.replace(tzinfo=timezone.utc)
+    if 'TZID' in params:
+        try:
+            from zoneinfo import ZoneInfo
+            zone = ZoneInfo(params['TZID'].strip('"'))
+        except (ImportError, KeyError, ValueError):
+            # Unknown zone (or no tz database): treat the time as local
+            return moment
+        return moment.replace(tzinfo=zone)
+    return moment
+
+
+def _local(moment):
+    """moment as a naive local datetime (dates become their midnight)."""
+    if not isinstance(moment, datetime):
+        return datetime.combine(moment, time())
+    return moment.astimezone().replace(tzinfo=None) if moment.tzinfo is not None else moment
+
+
+def _parse_duration(value):
+    match = re.fullmatch(r'([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?', value.strip())
+    if not match:
+        return None
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    delta = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                      minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -delta if sign == '-' else delta
+
+
+def _occurrences(start, rule, until):
+    """Start times of a DAILY or WEEKLY RRULE, up to until (local); other rules yield just start.
+
+    Steps are taken in start's own zone, so a weekly 09:00 stays at 09:00
+    there across daylight saving changes.
+    """
+    parts = dict(part.split('=', 1) for part in rule.split(';') if '=' in part)
+    frequency = parts.get('FREQ')
+    if frequency not in ('DAILY', 'WEEKLY'):
+        yield start
+        return
+    step = int(parts.get('INTERVAL', 1))
+    count = int(parts['COUNT']) if 'COUNT' in parts else None
+    if 'UNTIL' in parts:
+        rule_until = _parse_value({}, parts['UNTIL'])
+        if not isinstance(rule_until, datetime):
+            rule_until = datetime.combine(rule_until, time.max)
+        until = min(until, _local(rule_until))
+    if frequency == 'DAILY':
+        offsets = [0]
+        period = timedelta(days=step)
+    else:
+        weekdays = sorted(WEEKDAYS[d[-2:]] for d in parts.get('BYDAY', '').split(',') if d[-2:] in WEEKDAYS)
+        offsets = [(d - start.weekday()) % 7 for d in weekdays] or [0]
+        offsets.sort()
+        period = timedelta(weeks=step)
+    produced = 0
+    week_start = start
+    while _local(week_start) <= until:
+        for offset in offsets:
+            moment = week_start + timedelta(days=offset)
+            if _local(moment) > until or (count is not None and produced >= count):
+                return
+            produced += 1
+            yield moment
+        week_start += period
+
+
+def parse_ics(text, until=None):
+    """Busy (start, end, summary) blocks of the events in an .ics file.
+
+    All-day events block their whole days. DAILY and WEEKLY recurrences
+    (INTERVAL, COUNT, UNTIL, BYDAY and EXDATE) are expanded up to until,
+    by default RECURRENCE_HORIZON_DAYS from today; transparent (free)
+    and cancelled events are skipped.
+    """
+    until = until or datetime.combine(date.today() + timedelta(days=RECURRENCE_HORIZON_DAYS), time())
+    blocks = []
+    event = None
+    for line in _unfold(text):
+        if line == 'BEGIN:VEVENT':
+            event = {'exdates': set()}
+            continue
+        if event is None:
+            continue
+        if line == 'END:VEVENT':
+            blocks.extend(_event_blocks(event, until))
+            event = None
+            continue
+        name, _, value = line.partition(':')
+        name, *raw_params = name.split(';')
+        params = dict(p.split('=', 1) for p in raw_params if '=' in p)
+        name = name.upper()
+        try:
+            if name in ('DTSTART', 'DTEND'):
+                event[name] = _parse_value(params, value)
+            elif name == 'EXDATE':
+                event['exdates'].update(_parse_value(params, v) for v in value.split(','))
+            elif name in ('DURATION', 'RRULE', 'SUMMARY', 'TRANSP', 'STATUS'):
+                event[name] = value
+        except ValueError:
+            continue
+    blocks.sort()
+    return blocks
+
+
+def _event_blocks(event, until):
+    start = event.get('DTSTART')
+    if start is None or event.get('TRANSP') == 'TRANSPARENT' or event.get('STATUS') == 'CANCELLED':
+        return []
+    all_day = not isinstance(start, datetime)
+    end = event.get('DTEND')
+    duration = _parse_duration(event['DURATION']) if 'DURATION' in event else None
+    if all_day:
+        start = datetime.combine(start, time())
+        end = datetime.combine(end, time()) if end is not None and not isinstance(end, datetime) else end
+    if duration is None and end is not None:
+        # Aware and floating times only subtract once both are local
+        duration = end - start if (end.tzinfo is None) == (start.tzinfo is None) else _local(end) - _local(start)
+    elif duration is None:
+        duration = timedelta(days=1 if all_day else 0)
+    if duration <= timedelta(0):
+        return []
+    summary = event.get('SUMMARY', '').replace('\\,', ',').replace('\\n', ' ')
+    starts = _occurrences(start, event['RRULE'], until) if 'RRULE' in event else [start]
+    excluded = {_local(moment) for moment in event['exdates']}
+    # Each occurrence ends duration later in the event's own zone, then both ends become local
+    blocks = [(_local(moment), _local(moment + duration), summary) for moment in starts]
+    return [block for block in blocks if block[0] not in excluded]
+
+
+def _escape(text):
+    return str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def export_ics(entries, calendar_name="Study plan"):
+    """An .ics calendar with one event per scheduled entry (as returned by schedule_plan)."""
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    lines = [
+        'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Smart Study Planner//EN',
+        f'X-WR-CALNAME:{_escape(calendar_name)}',
+    ]
+    for i, entry in enumerate(entries):
+        kind = "Review" if entry.get('review') else "Study"
+        summary = f"{kind}: {entry['subject']} - {entry['topic']}"
+        lines += [
+            'BEGIN:VEVENT',
+            f"UID:{entry['start']:%Y%m%dT%H%M%S}-{i}@smart-study-planner",
+            f'DTSTAMP:{stamp}',
+            f"DTSTART:{entry['start']:%Y%m%dT%H%M%S}",
+            f"DTEND:{entry['end']:%Y%m%dT%H%M%S}",
+            f"SUMMARY:{_escape(summary)}",
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(lines) + '\r\n'
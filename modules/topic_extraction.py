@@ -0,0 +1,290 @@
+import re
+from collections import Counter
+
+# Most topics suggested for one document; deeper outline levels are folded
+# into their parent heading until the list fits
+MAX_TOPICS = 40
+# With fewer headings than this the document is treated as unstructured
+# and the most frequent keywords are suggested instead
+MIN_HEADINGS = 3
+KEYWORD_TOPICS = 15
+# A keyword needs this many occurrences to be suggested
+MIN_KEYWORD_COUNT = 3
+# Keywords remembered per chunk, which is what keyword topics link to
+CHUNK_KEYWORDS = 5
+# A heading seen on more pages than this is a running header, not a topic
+MAX_HEADING_REPEATS = 3
+MIN_TITLE_CHARS = 3
+MAX_TITLE_CHARS = 80
+MAX_HEADING_WORDS = 10
+# Words after a heading that must follow it in a chunk, so a contents entry
+# or a mention in running text is not taken for the section start
+CONTEXT_WORDS = 3
+# Longer lines are never headings, so only this much of a line carried to the next page is kept
+MAX_LINE_CHARS = 200
+
+MARKDOWN_HEADING = re.compile(r'^(#{1,4})\s+(.+?)\s*#*$')
+UNIT_HEADING = re.compile(
+    r'^(?:chapter|unit|module|week|lecture|lesson|part|section|topic)\s+'
+    r'(?:\d{1,3}|[ivxlc]{1,5})[a-z]?\s*[:.)\-–—]?\s+(.+)$',
+    re.IGNORECASE
+)
+NUMBERED_HEADING = re.compile(r'^(\d{1,2}(?:\.\d{1,2}){0,3})[.)]?\s+([A-Z].+)$')
+ROMAN_HEADING = re.compile(r'^([IVXL]{1,5})[.)]\s+(.+)$')
+# Table of contents lines end in dot leaders and/or a page number
+DOT_LEADER = re.compile(r'\s*(?:\.\s*){2,}\d*$|\s+\d{1,4}$')
+WORD = re.compile(r"[a-z][a-z'-]*[a-z]")
+
+# Headings every syllabus has that are not something to study
+BOILERPLATE = {
+    'assessment', 'assessments', 'assignments', 'attendance', 'bibliography', 'contact', 'contents',
+    'course description', 'course outline', 'course schedule', 'grading', 'grading policy',
+    'index', 'instructor', 'learning outcomes', 'objectives', 'office hours', 'prerequisites',
+    'readings', 'references', 'required texts', 'schedule', 'summary', 'syllabus', 'table of contents',
+    'textbook', 'textbooks',
+}
+SMALL_WORDS = {'a', 'an', 'and', 'as', 'at', 'by', 'for', 'in', 'of', 'on', 'or', 'the', 'to', 'via', 'with'}
+STOPWORDS = set('''
+    a about above after again against all also among an and any are as at be because been before
+    being below between both but by can could did do does doing down during each either etc every
+    few for from further had has have having here how however if in into is it its itself just
+    like may might more most much must no nor not now of off on once one only or other our out
+    over own per same shall should since so some such than that the their them then there these
+    they this those through thus to too two under until up upon use used using very via was we
+    well were what when where whether which while who whom why will with within without would
+    yet you your chapter section figure table page example examples students student course
+    week lecture unit module exercise exercises will
+'''.split())
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+def _title_case(line):
+    # Short all-caps words are usually acronyms ("CS", "SQL") and stay as they are
+    words = []
+    for i, word in enumerate(line.split()):
+        if word.lower() in SMALL_WORDS and i:
+            words.append(word.lower())
+        elif len(word) <= 3:
+            words.append(word)
+        else:
+            words.append(word.capitalize())
+    return " ".join(words)
+
+
+def _clean_title(title):
+    title = DOT_LEADER.sub("", normalize(title)).strip(" .:;-–—")
+    if not MIN_TITLE_CHARS <= len(title) <= MAX_TITLE_CHARS or len(title.split()) > MAX_HEADING_WORDS:
+        return None
+    if not any(c.isalpha() for c in title) or title.lower() in BOILERPLATE:
+        return None
+    return title
+
+
+def parse_heading(line):
+    """(level, title) if line looks like a heading or outline entry, else None.
+
+    Markdown headings use their '#' depth, numbered outlines their dotted
+    depth (1, 1.2, 1.2.3); chapter/unit/week headings, Roman numerals and
+    short all-caps lines are top level.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    match = MARKDOWN_HEADING.match(line)
+    if match:
+        level, title = len(match.group(1)), match.group(2)
+    elif (match := UNIT_HEADING.match(line)):
+        level, title = 1, match.group(1)
+    elif (match := NUMBERED_HEADING.match(line)):
+        level, title = match.group(1).count('.') + 1, match.group(2)
+        if title.endswith(('.', ',', ';')) and len(title.split()) > 4:
+            return None  # a numbered sentence in running text, not an outline entry
+    elif (match := ROMAN_HEADING.match(line)):
+        level, title = 1, match.group(2)
+    elif line.isupper() and len(line.split()) <= MAX_HEADING_WORDS and sum(c.isalpha() for c in line) >= 4:
+        level, title = 1, _title_case(line)
+    else:
+        return None
+    title = _clean_title(title)
+    return (level, title) if title else None
+
+
+def _keywords(text):
+    """Non-stopword words of text, plus the adjacent pairs of them."""
+    words = [w if len(w) >= 4 and w not in STOPWORDS else None for w in WORD.findall(text.lower())]
+    terms = [w for w in words if w]
+    terms += [f"{a} {b}" for a, b in zip(words, words[1:]) if a and b]
+    return terms
+
+
+class TopicExtractor:
+    """Suggests a document's topics while it is being chunked.
+
+    Fed the raw pages through read_pages and every chunk through
+    add_chunk, so extraction rides along the single streaming pass that
+    chunks the file. Headings and numbered outlines become topics linked
+    to the chunks of their section; a document without enough headings
+    gets its most frequent keywords instead, linked to the chunks where
+    they are most frequent. Memory stays bounded by the number of
+    headings and the document's vocabulary, not its length.
+    """
+
+    def __init__(self):
+        self._topics = []
+        self._by_key = {}
+        self._awaiting_context = []
+        self._held_chunks = []
+        self._pending = []
+        self._current = []
+        self._line_tail = ""
+        self._page = None
+        self._headings = 0  # topics not (yet) disqualified as running headers
+        self._counts = Counter()
+        self._chunk_keywords = []
+
+    def read_pages(self, pages, lines_cross_pages=False):
+        """Pass (page_number, text) pages through unchanged, scanning each for headings.
+
+        lines_cross_pages is for pseudo-pages cut at a fixed size, whose
+        last line continues on the next page.
+        """
+        for page_number, text in pages:
+            self._scan(page_number, text)
+            if not lines_cross_pages:
+                self._scan_line(self._line_tail)
+                self._line_tail = ""
+            yield page_number, text
+        if self._line_tail:
+            self._scan_line(self._line_tail)
+            self._line_tail = ""
+        self._resolve_context([])
+
+    def _scan(self, page_number, text):
+        self._page = page_number
+        lines = (self._line_tail + text).split('\n')
+        self._line_tail = lines.pop()[:MAX_LINE_CHARS + 1]
+        for line in lines:
+            self._scan_line(line)
+        # The carried-over line can already supply a heading's context, before its chunks come out
+        if self._awaiting_context:
+            tail_words = self._line_tail.split(maxsplit=CONTEXT_WORDS)
+            if len(tail_words) > CONTEXT_WORDS:
+                self._resolve_context(tail_words)
+
+    def _scan_line(self, line):
+        if len(line) > MAX_LINE_CHARS:
+            line = line[:MAX_LINE_CHARS + 1]
+        words = line.split(maxsplit=CONTEXT_WORDS)
+        if words:
+            self._resolve_context(words)
+        heading = parse_heading(line)
+        if heading is None:
+            return
+        level, title = heading
+        key = title.lower()
+        topic = self._by_key.get(key)
+        if topic is None:
+            topic = self._by_key[key] = {'name': title, 'level': level, 'chunks': [], 'pages': set(), 'match': None}
+            self._topics.append(topic)
+            self._headings += 1
+        if self._page not in topic['pages']:
+            topic['pages'].add(self._page)
+            if len(topic['pages']) == MAX_HEADING_REPEATS + 1:
+                self._headings -= 1
+        # A contents entry names the topic; its section starts where the heading itself appears
+        if topic['match'] is None and not DOT_LEADER.search(line.strip()):
+            topic['match'] = normalize(line)
+            self._awaiting_context.append(topic)
+
+    def _resolve_context(self, words):
+        """Complete the headings waiting for the words that follow them, then link the chunks held back."""
+        if not self._awaiting_context:
+            return
+        for topic in self._awaiting_context:
+            if words:
+                topic['match'] += " " + " ".join(words[:CONTEXT_WORDS])
+        self._pending += self._awaiting_context
+        self._awaiting_context = []
+        held, self._held_chunks = self._held_chunks, []
+        for index, text in held:
+            self._link_chunk(index, text)
+
+    def add_chunk(self, index, text):
+        """Link chunk index to the sections it covers and count its keywords."""
+        if self._awaiting_context:
+            # A heading in this chunk may not be matchable yet; link once its context is known
+            self._held_chunks.append((index, text))
+        else:
+            self._link_chunk(index, text)
+
+        # Keywords are only the fallback, counted while the document shows too little structure
+        if self._headings < MIN_HEADINGS:
+            terms = _keywords(text)
+            self._counts.update(terms)
+            top = Counter(terms).most_common(CHUNK_KEYWORDS)
+            self._chunk_keywords.append((index, [term for term, _ in top]))
+
+    def _link_chunk(self, index, text):
+        found = [(i, text.find(topic['match'])) for i, topic in enumerate(self._pending)]
+        found = [(i, position) for i, position in found if position != -1]
+        if found:
+            # Text before the first heading still belongs to the previous section
+            if min(position for _, position in found) > 0:
+                for topic in self._current:
+                    topic['chunks'].append(index)
+            started = [self._pending[i] for i, _ in sorted(found, key=lambda item: item[1])]
+            # Headings pending before the last one found were lost to extraction quirks; stop waiting
+            del self._pending[:max(i for i, _ in found) + 1]
+            for topic in started[:-1]:
+                topic['chunks'].append(index)
+            self._current = started[-1:]
+        for topic in self._current:
+            topic['chunks'].append(index)
+
+    def topics(self):
+        """[{'name', 'source', 'chunks'}] in document order; source is 'heading' or 'keyword'."""
+        if self._headings >= MIN_HEADINGS:
+            return self._heading_topics()
+        return self._keyword_topics()
+
+    def _heading_topics(self):
+        headings = [t for t in self._topics if len(t['pages']) <= MAX_HEADING_REPEATS]
+        levels = sorted({t['level'] for t in headings})
+        depth = levels[0]
+        for level in levels:
+            if sum(t['level'] <= level for t in headings) <= MAX_TOPICS:
+                depth = level
+        topics = []
+        for topic in self._topics:
+            keep = topic['level'] <= depth and len(topic['pages']) <= MAX_HEADING_REPEATS
+            if keep and len(topics) < MAX_TOPICS:
+                topics.append({'name': topic['name'], 'source': 'heading', 'chunks': list(topic['chunks'])})
+            elif topics:
+                # A dropped subsection's chunks belong to the heading above it
+                topics[-1]['chunks'].extend(topic['chunks'])
+        for topic in topics:
+            topic['chunks'] = sorted(set(topic['chunks']))
+        return topics
+
+    def _keyword_topics(self):
+        # Pairs count double: "neural networks" says more than "neural" or "networks"
+        candidates = [(count * len(term.split()), term) for term, count in self._counts.items()
+                      if count >= MIN_KEYWORD_COUNT]
+        chosen = []
+        for _, term in sorted(candidates, key=lambda item: (-item[0], item[1])):
+            if len(chosen) >= KEYWORD_TOPICS:
+                break
+            words = term.split()
+            # "neural" adds nothing once "neural networks" is in the list
+            if any(set(words) <= set(other.split()) or set(other.split()) <= set(words) for other in chosen):
+                continue
+            chosen.append(term)
+        chunks = {term: [] for term in chosen}
+        for index, terms in self._chunk_keywords:
+            for term in terms:
+                if term in chunks:
+                    chunks[term].append(index)
+        return [{'name': term.title(), 'source': 'keyword', 'chunks': chunks[term]} for term in chosen]
@@ -0,0 +1,278 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+
+class VectorStore:
+    """Append-only vector index kept on disk.
+
+    Vectors are stored as one flat float32 file and opened with numpy.memmap,
+    so opening the store does not read the corpus into memory. Chunk records
+    live in chunks.jsonl and are read back by byte offset only for results.
+    Every row also records the document it came from (keyed by the file's
+    content hash) and a hash of its text. Deleting a document tombstones its
+    rows instead of rewriting the files.
+    manifest.json records how many rows are committed; anything written past
+    that (e.g. after a crash mid-append) is truncated on the next append.
+    """
+
+    def __init__(self, path, dim, model=None):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+
+        manifest = self._read_manifest()
+        if manifest and manifest['dim'] != dim:
+            raise ValueError(
+                f"Vector store at {path} has dimension {manifest['dim']}, expected {dim}"
+            )
+        if manifest and model and manifest.get('model', model) != model:
+            raise ValueError(
+                f"Vector store at {path} was built with {manifest['model']}, not {model}"
+            )
+        manifest = manifest or {}
+        self.dim = dim
+        self.model = manifest.get('model', model)
+        self.count = manifest.get('count', 0)
+        self.chunks_bytes = manifest.get('chunks_bytes', 0)
+        self.subjects = manifest.get('subjects', [])
+        self._subject_codes = {name: code for code, name in enumerate(self.subjects)}
+        self.documents = manifest.get('documents', [])
+        self.deleted = set(manifest.get('deleted', []))
+        # Only live documents are addressable by key; a deleted key can be re-added
+        self._document_codes = {
+            key: code for code, key in enumerate(self.documents) if code not in self.deleted
+        }
+        self._hash_rows = None
+        self._reset_maps()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_manifest(self):
+        try:
+            with open(self._file('manifest.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self):
+        tmp_path = self._file('manifest.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'dim': self.dim,
+                'model': self.model,
+                'count': self.count,
+                'chunks_bytes': self.chunks_bytes,
+                'subjects': self.subjects,
+                'documents': self.documents,
+                'deleted': sorted(self.deleted),
+            }, f)
+        os.replace(tmp_path, self._file('manifest.json'))
+
+    def _reset_maps(self):
+        self._vectors = None
+        self._offsets = None
+        self._subject_ids = None
+        self._document_ids = None
+        self._text_hashes = None
+        self._live_mask = None
+
+    def _map(self, name, dtype, shape):
+        if self.count == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode='r', shape=shape)
+
+    @property
+    def vectors(self):
+        if self._vectors is None:
+            self._vectors = self._map('vectors.f32', np.float32, (self.count, self.dim))
+        return self._vectors
+
+    @property
+    def offsets(self):
+        if self._offsets is None:
+            self._offsets = self._map('offsets.i64', np.int64, (self.count,))
+        return self._offsets
+
+    @property
+    def subject_ids(self):
+        if self._subject_ids is None:
+            self._subject_ids = self._map('subjects.i32', np.int32, (self.count,))
+        return self._subject_ids
+
+    @property
+    def document_ids(self):
+        if self._document_ids is None:
+            self._document_ids = self._map('documents.i32', np.int32, (self.count,))
+        return self._document_ids
+
+    @property
+    def text_hashes(self):
+        if self._text_hashes is None:
+            self._text_hashes = self._map('hashes.u64', np.uint64, (self.count,))
+        return self._text_hashes
+
+    @property
+    def live_mask(self):
+        """Boolean mask of rows that belong to documents that were not deleted."""
+        if self._live_mask is None:
+            if self.deleted:
+                self._live_mask = ~np.isin(self.document_ids, list(self.deleted))
+            else:
+                self._live_mask = np.ones(self.count, dtype=bool)
+        return self._live_mask
+
+    def row_mask(self, subject=None):
+        """Live rows, optionally restricted to one subject."""
+        mask = self.live_mask
+        if subject is not None:
+            code = self._subject_codes.get(subject)
+            if code is None:
+                return np.zeros(self.count, dtype=bool)
+            mask = mask & (self.subject_ids == code)
+        return mask
+
+    def __len__(self):
+        return self.count
+
+    def has_document(self, doc_id):
+        return doc_id in self._document_codes
+
+    def document_subjects(self, doc_id):
+        code = self._document_codes.get(doc_id)
+        if code is None:
+            return []
+        codes = np.unique(self.subject_ids[self.document_ids == code])
+        return [self.subjects[c] for c in codes.tolist()]
+
+    def delete_document(self, doc_id):
+        """Tombstone every row of a document; returns the number of rows dropped."""
+        with self._lock:
+            code = self._document_codes.pop(doc_id, None)
+            if code is None:
+                return 0
+            self.deleted.add(code)
+            self._write_manifest()
+            self._live_mask = None
+            # Rebuilt from the rows still live, so a deleted copy cannot shadow an earlier live one
+            self._hash_rows = None
+            return int(np.count_nonzero(self.document_ids == code))
+
+    def lookup_hashes(self, text_hashes):
+        """Map each text hash to a live row that already holds it, or -1."""
+        live = self.live_mask
+        hash_rows = self._hash_rows
+        if hash_rows is None:
+            # The latest live row per hash
+            rows = np.flatnonzero(live)
+            hash_rows = self._hash_rows = dict(zip(self.text_hashes[rows].tolist(), rows.tolist()))
+        rows = []
+        for h in text_hashes:
+            row = hash_rows.get(int(h), -1)
+            rows.append(row if row >= 0 and live[row] else -1)
+        return rows
+
+    def _document_code(self, doc_id):
+        if doc_id not in self._document_codes:
+            self._document_codes[doc_id] = len(self.documents)
+            self.documents.append(doc_id)
+        return self._document_codes[doc_id]
+
+    def _subject_code(self, subject):
+        if subject not in self._subject_codes:
+            self._subject_codes[subject] = len(self.subjects)
+            self.subjects.append(subject)
+        return self._subject_codes[subject]
+
+    def _truncate_uncommitted(self):
+        committed = {
+            'vectors.f32': self.count * self.dim * 4,
+            'offsets.i64': self.count * 8,
+            'subjects.i32': self.count * 4,
+            'documents.i32': self.count * 4,
+            'hashes.u64': self.count * 8,
+            'chunks.jsonl': self.chunks_bytes,
+        }
+        for name, size in committed.items():
+            file_path = self._file(name)
+            if os.path.exists(file_path) and os.path.getsize(file_path) > size:
+                os.truncate(file_path, size)
+
+    def add(self, chunks, vectors, doc_id, text_hashes):
+        """Append chunks and their vectors; returns the range of new row ids.
+
+        doc_id is one document key for all the chunks, or a list with one
+        key per chunk so a bulk import can append many documents at once.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.shape != (len(chunks), self.dim):
+            raise ValueError(f"Expected vectors of shape ({len(chunks)}, {self.dim}), got {vectors.shape}")
+        if not chunks:
+            return range(self.count, self.count)
+
+        with self._lock:
+            self._truncate_uncommitted()
+            offsets = []
+            position = self.chunks_bytes
+            with open(self._file('chunks.jsonl'), 'ab') as f:
+                for chunk in chunks:
+                    line = (json.dumps(chunk) + "\n").encode('utf-8')
+                    offsets.append(position)
+                    f.write(line)
+                    position += len(line)
+            subject_ids = [self._subject_code(c['metadata'].get('subject', 'General')) for c in chunks]
+            if isinstance(doc_id, str):
+                document_codes = np.full(len(chunks), self._document_code(doc_id), dtype=np.int32)
+            else:
+                document_codes = np.asarray([self._document_code(key) for key in doc_id], dtype=np.int32)
+
+            with open(self._file('vectors.f32'), 'ab') as f:
+                f.write(vectors.tobytes())
+            with open(self._file('offsets.i64'), 'ab') as f:
+                f.write(np.asarray(offsets, dtype=np.int64).tobytes())
+            with open(self._file('subjects.i32'), 'ab') as f:
+                f.write(np.asarray(subject_ids, dtype=np.int32).tobytes())
+            with open(self._file('documents.i32'), 'ab') as f:
+                f.write(document_codes.tobytes())
+            with open(self._file('hashes.u64'), 'ab') as f:
+                f.write(np.asarray(text_hashes, dtype=np.uint64).tobytes())
+
+            start = self.count
+            self.count += len(chunks)
+            self.chunks_bytes = position
+            self._write_manifest()
+            self._reset_maps()
+            if self._hash_rows is not None:
+                for offset, h in enumerate(text_hashes):
+                    self._hash_rows[int(h)] = start + offset
+        return range(start, self.count)
+
+    def get_chunks(self, rows):
+        if not len(rows):
+            return []
+        offsets = self.offsets
+        chunks = []
+        with open(self._file('chunks.jsonl'), 'rb') as f:
+            for row in rows:
+                f.seek(int(offsets[row]))
+                chunks.append(json.loads(f.readline()))
+        return chunks
+
+    def search(self, query_vector, k=5, subject=None):
+        """Return [(row, score)] for the k rows most similar to query_vector."""
+        if self.count == 0:
+            return []
+        scores = self.vectors @ np.asarray(query_vector, dtype=np.float32)
+        mask = self.row_mask(subject)
+        if not mask.any():
+            return []
+        if not mask.all():
+            scores = np.where(mask, scores, -np.inf)
+
+        k = min(k, self.count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top if np.isfinite(scores[row])]
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+from functools import lru_cache
+
+READ_BLOCK_SIZE = 1 << 20
+
+
+def sha256_file(file_path, block_size=READ_BLOCK_SIZE):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_stream_by_hash(stream, dest_dir, extension, block_size=READ_BLOCK_SIZE):
+    """Copy a binary stream into dest_dir under its SHA-256, hashing while it is written.
+
+    Returns (hexdigest, path). Identical content always maps to the same file,
+    whatever name it was uploaded under.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for block in iter(lambda: stream.read(block_size), b''):
+                digest.update(block)
+                out.write(block)
+        key = digest.hexdigest()
+        file_path = os.path.join(dest_dir, key + extension.lower())
+        if os.path.exists(file_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, file_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return key, file_path
+
+
+def format_duration(minutes):
+    if minutes < 60:
+        return f"{minutes} min"
+    else:
+        hours = minutes // 60
+        mins = minutes % 60
+        return f"{hours}h {mins}m"
+
+
+@lru_cache(maxsize=4096)
+def parse_date_ordinal(date_str):
+    """Proleptic ordinal of a YYYY-MM-DD string (None if invalid); parsed once per string."""
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d').date().toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def calculate_days_until(target_date):
+    if isinstance(target_date, str):
+        target_ordinal = parse_date_ordinal(target_date)
+        if target_ordinal is None:
+            return 999
+    else:
+        target_ordinal = target_date.toordinal()
+    return target_ordinal - datetime.now().date().toordinal()
+
+
+def format_date_readable(date_str):
+    try:
+        date_obj = datetime.strptime(date_str, '%Y-%m-%d')
+        return date_obj.strftime("%B %d, %Y")
+    except:
+        return date_str
+
+
+def get_subject_color(subject_name):
+    colors = ['#667eea', '#764ba2', '#f093fb', '#f5576c', '#4facfe', '#00f2fe']
+    return colors[hash(subject_name) % len(colors)]
+
+
+def get_difficulty_badge(difficulty):
+    difficulty = difficulty.lower()
+    if difficulty in ['easy', 'beginner']:
+        return "🟢 Easy"
+    elif difficulty in ['medium', 'intermediate']:
+        return "🟡 Medium" 
+    else:
+        return "🔴 Hard"